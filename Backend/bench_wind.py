@@ -0,0 +1,173 @@
+# Offline benchmark of the wind processing stages.
+"""
+Builds synthetic HRRR-shaped 10 m wind (1799 x 1059 Lambert Conformal grid with
+2-D lat/lon, same projection constants as the real CONUS grid) and times each
+stage of fetch_RTwind / validate_wind / wind_pipeline without touching the
+network. Every stage records its best-of-N wall time (tracemalloc off) and the
+peak traced allocation (tracemalloc, includes NumPy buffers) from one extra
+traced run. The process peak RSS is reported once for the whole benchmark.
+
+Usage:
+  python Backend/bench_wind.py [--repeat 3] [--res 0.03] [--out bench_wind.json]
+Without --out the JSON report goes to stdout, so runs can be diffed across commits.
+"""
+# %%
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import contextlib
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+import fetch_RTwind
+import validate_wind
+import wind_pyramid
+import regrid_wind
+from regrid_wind import lambert_latlon, lambert_xy, target_grid, build_weights, get_weights, apply_wind
+from wind_format import write_wind_bin, write_wind_png
+
+# HRRR CONUS grid definition (as grid_def_from_attrs returns it)
+HRRR_GRID = {
+    "nx": 1799, "ny": 1059, "dx_m": 3000.0, "dy_m": 3000.0,
+    "lov": 262.5, "latin1": 38.5, "latin2": 38.5,
+    "lat1": 21.138123, "lon1": 237.280472, "j_pos": 1,
+}
+
+
+def synthetic_hrrr(g=HRRR_GRID, seed=0):
+    # -> (u, v, lat2d, lon2d) on the Lambert grid; smooth flow + noise, float32 like cfgrib
+    x1, y1 = lambert_xy(g["lat1"], g["lon1"], g)
+    jj, ii = np.mgrid[0:g["ny"], 0:g["nx"]]
+    lat2d, lon2d = lambert_latlon(x1 + ii * g["dx_m"], y1 + jj * g["dy_m"], g)
+    rng = np.random.default_rng(seed)
+    u = 8 * np.sin(np.radians(lat2d) * 6) + rng.normal(0, 1.5, lat2d.shape)
+    v = 6 * np.cos(np.radians(lon2d) * 4) + rng.normal(0, 1.5, lat2d.shape)
+    return u.astype(np.float32), v.astype(np.float32), lat2d, lon2d
+
+
+def _maxrss_mb():
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r / (1024 * 1024) if sys.platform == "darwin" else r / 1024  # bytes on macOS, KiB on Linux
+
+
+def timed(name, fn, repeat, results):
+    # Best-of-N wall time untraced (tracemalloc slows allocation-heavy code),
+    # then one separate traced run for the allocation peak
+    walls = []
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        walls.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    results.append({
+        "stage": name,
+        "wall_s": round(min(walls), 6),
+        "wall_s_all": [round(w, 6) for w in walls],
+        "peak_alloc_mb": round(peak / 2**20, 2),
+    })
+    print(f"[BENCH] {name:<18} {min(walls) * 1000:9.1f} ms  peak {peak / 2**20:8.1f} MB", file=sys.stderr)
+    return out
+
+
+def git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(repeat=3, res=fetch_RTwind.GRID_RES_DEG):
+    results = []
+    work = tempfile.mkdtemp(prefix="bench_wind_")
+    try:
+        u_src, v_src, _, _ = timed("synthetic_fields", lambda: synthetic_hrrr(), 1, results)
+        dst = target_grid(fetch_RTwind.CA_W, fetch_RTwind.CA_S, fetch_RTwind.CA_E, fetch_RTwind.CA_N, res)
+
+        # regrid: cold build (first run ever), warm load from the on-disk cache, per-run gather
+        timed("regrid_build", lambda: build_weights(HRRR_GRID, dst), repeat, results)
+        cache_dir = os.path.join(work, "cache")
+        get_weights(HRRR_GRID, dst, cache_dir=cache_dir)
+        def warm_load():
+            regrid_wind._MEMO.clear()
+            return get_weights(HRRR_GRID, dst, cache_dir=cache_dir)
+        weights = timed("regrid_load_cached", warm_load, repeat, results)
+        u, v = timed("regrid_apply", lambda: apply_wind(u_src, v_src, weights),
+                     repeat, results)
+        meta = fetch_RTwind.build_meta(dst, datetime.utcnow())
+
+        # legacy JSON path
+        doc = timed("list_conversion", lambda: fetch_RTwind.build_doc(u, v, meta), repeat, results)
+        json_path = os.path.join(work, "wind_ca_latest.json")
+        def dump():
+            with open(json_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(doc, separators=(",", ":")))
+        timed("json_dump", dump, repeat, results)
+        doc = timed("json_reload", lambda: validate_wind.load_json(json_path), repeat, results)
+        timed("stats_2d", lambda: (validate_wind.stats_2d(doc["u10"]), validate_wind.stats_2d(doc["v10"])),
+              repeat, results)
+        timed("to_velocity_json", lambda: validate_wind.to_velocity_json(doc), repeat, results)
+
+        # in-memory pipeline path
+        timed("validate_arrays", lambda: validate_wind.validate_arrays(u, v, meta), repeat, results)
+        timed("write_bin", lambda: write_wind_bin(os.path.join(work, "w.bin"), u, v, meta), repeat, results)
+        timed("write_png", lambda: write_wind_png(os.path.join(work, "w.png"), u, v, meta), repeat, results)
+        timed("pyramid", lambda: wind_pyramid.write_pyramid(work, u, v, meta), repeat, results)
+
+        sizes = {name: os.path.getsize(os.path.join(work, name))
+                 for name in ("wind_ca_latest.json", "w.bin", "w.png") if os.path.exists(os.path.join(work, name))}
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    return {
+        "commit": git_rev(),
+        "created": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "source_grid": [HRRR_GRID["ny"], HRRR_GRID["nx"]],
+        "target_grid": [dst["ny"], dst["nx"]],
+        "repeat": repeat,
+        "peak_rss_mb": round(_maxrss_mb(), 1),  # whole process, not per stage
+        "file_bytes": sizes,
+        "stages": results,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Offline benchmark of the wind pipeline stages")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--res", type=float, default=fetch_RTwind.GRID_RES_DEG, help="target grid spacing (deg)")
+    ap.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = ap.parse_args(argv)
+
+    # stage chatter ([INFO]/[WRITE]) goes to stderr so stdout stays pure JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args.repeat, args.res)
+    print(f"[BENCH] process peak RSS {report['peak_rss_mb']:.1f} MB", file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print("[OK] wrote", args.out, file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
+# %%
@@ -0,0 +1,224 @@
+# Concurrent Earth Engine table-export scheduler with status polling, retries and a manifest.
+"""
+Jobs are {"name", "collection", "prefix"} (optionally "file_format", default
+GeoJSON, and "version"). The scheduler keeps up to `max_concurrent` ee.batch
+tasks running (default MAX_CONCURRENT, env EE_MAX_CONCURRENT, kept well under
+the Earth Engine task quota), polls their status with exponential backoff
+(reset whenever a task changes state), resubmits FAILED/CANCELLED tasks up to `max_retries` times and writes
+a JSON manifest after every state change:
+
+  {"jobs": {name: {"state", "prefix", "version", "uri", "task_id", "attempts", "error",
+                   "destination_uris", "updated"}}}
+
+Jobs already COMPLETED in the manifest (same name, prefix and version) are
+skipped, so a re-run resumes an interrupted batch. A job whose content grows
+(e.g. the month in progress) keeps its name and prefix and bumps "version";
+it is then exported again over the same object.
+
+The Earth Engine module is injected (`ee_module`), so FakeEE below can stand
+in for local runs without credentials; the GCS side of merge_tiles() goes
+through read/write callables for the same reason (storage_backend's
+backend.read / backend.put in production).
+"""
+# %%
+import os
+import json
+import time
+from datetime import datetime, timezone
+
+DONE_STATES = ("COMPLETED", "FAILED", "CANCELLED")
+MAX_CONCURRENT = int(os.environ.get("EE_MAX_CONCURRENT", "3"))
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class ExportScheduler:
+    def __init__(self, ee_module, bucket, max_concurrent=MAX_CONCURRENT, max_retries=2, poll_s=10.0, poll_max_s=120.0,
+                 manifest_path=None, reset=False, sleep=time.sleep):
+        self.ee = ee_module
+        self.bucket = bucket
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_retries = max_retries
+        self.poll_s = poll_s
+        self.poll_max_s = poll_max_s
+        self.manifest_path = manifest_path
+        self.sleep = sleep
+        self.manifest = {"bucket": bucket, "jobs": {}}
+        if manifest_path and os.path.exists(manifest_path) and not reset:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+
+    # ---- manifest ----
+    def _record(self, job, **fields):
+        entry = self.manifest["jobs"].setdefault(job["name"], {"prefix": job["prefix"], "attempts": 0})
+        entry.update(fields, version=job.get("version"), updated=_now())
+        self.save()
+
+    def save(self):
+        if self.manifest_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+            tmp = self.manifest_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.manifest_path)
+
+    def is_done(self, job):
+        entry = self.manifest["jobs"].get(job["name"])
+        return bool(entry and entry.get("state") == "COMPLETED" and entry.get("prefix") == job["prefix"]
+                    and entry.get("version") == job.get("version"))
+
+    def output_uri(self, job):
+        ext = job.get("file_format", "GeoJSON").lower()
+        return f"gs://{self.bucket}/{job['prefix']}.{ext}"
+
+    # ---- tasks ----
+    def _start(self, job):
+        task = self.ee.batch.Export.table.toCloudStorage(
+            collection=job["collection"],
+            description=job["name"],
+            bucket=self.bucket,
+            fileNamePrefix=job["prefix"],
+            fileFormat=job.get("file_format", "GeoJSON"),
+        )
+        task.start()
+        attempts = self.manifest["jobs"].get(job["name"], {}).get("attempts", 0) + 1
+        task_id = getattr(task, "id", None)
+        self._record(job, state="SUBMITTED", task_id=task_id, attempts=attempts, error=None)
+        print(f"[INFO] export started: {job['name']} (attempt {attempts}, task {task_id})")
+        return task
+
+    def run(self, jobs):
+        """
+        Run all jobs to completion (or until retries run out).
+        Returns {name: manifest entry} for the given jobs.
+        """
+        pending = [j for j in jobs if not self.is_done(j)]
+        for j in jobs:
+            if self.is_done(j):
+                print(f"[INFO] export already done, skipping: {j['name']}")
+        running = {}  # name -> (job, task)
+        tries = {}  # submissions in this run; retries are budgeted per run, not per manifest lifetime
+        delay = self.poll_s
+        while pending or running:
+            changed = False
+            while pending and len(running) < self.max_concurrent:
+                job = pending.pop(0)
+                tries[job["name"]] = tries.get(job["name"], 0) + 1
+                running[job["name"]] = (job, self._start(job))
+                changed = True
+
+            for name, (job, task) in list(running.items()):
+                status = task.status()
+                state = status.get("state", "UNKNOWN")
+                entry = self.manifest["jobs"].get(name, {})
+                if state not in DONE_STATES:
+                    if entry.get("state") != state:
+                        self._record(job, state=state)
+                        changed = True
+                    continue
+                del running[name]
+                changed = True
+                if state == "COMPLETED":
+                    uri = self.output_uri(job)
+                    self._record(job, state="COMPLETED", uri=uri, error=None,
+                                 destination_uris=status.get("destination_uris"))
+                    print(f"[OK] export done: {name} -> {uri}")
+                elif tries[name] <= self.max_retries:
+                    self._record(job, state="RETRY", error=status.get("error_message"))
+                    print(f"[WARN] export {state.lower()}: {name}: {status.get('error_message')} (retrying)")
+                    pending.append(job)
+                else:
+                    self._record(job, state=state, error=status.get("error_message"))
+                    print(f"[FAIL] export {state.lower()}: {name}: {status.get('error_message')}")
+
+            if running:
+                # back off while nothing moves, poll quickly again after any change
+                delay = self.poll_s if changed else min(delay * 2, self.poll_max_s)
+                self.sleep(delay)
+        return {j["name"]: self.manifest["jobs"].get(j["name"]) for j in jobs}
+
+
+# ---------------- merge ----------------
+def merge_tiles(paths, read_blob, write_blob, dest, id_key="id", transform=None):
+    """
+    Concatenate the features of exported GeoJSON tiles into one FeatureCollection.
+    Features appearing in two tiles (same id on a shared edge) are kept once;
+    id_key=None keeps everything. transform(feature) -> feature or None (drop)
+    is applied before writing.
+    read_blob(path) -> bytes, write_blob(path, bytes). Returns the feature count.
+    """
+    features, seen = [], set()
+    for path in paths:
+        gj = json.loads(read_blob(path))
+        for feat in gj.get("features", []):
+            if transform is not None:
+                feat = transform(feat)
+                if feat is None:
+                    continue
+            fid = feat.get(id_key) if id_key else None
+            if fid is not None:
+                if fid in seen:
+                    continue
+                seen.add(fid)
+            features.append(feat)
+    write_blob(dest, json.dumps({"type": "FeatureCollection", "features": features},
+                                separators=(",", ":")).encode("utf-8"))
+    print(f"[WRITE] merged {len(paths)} tiles ({len(features)} features) -> {dest}")
+    return len(features)
+
+
+def blob_path(uri, bucket):
+    prefix = f"gs://{bucket}/"
+    return uri[len(prefix):] if uri.startswith(prefix) else uri
+
+
+# ---------------- local fake ----------------
+class FakeTask:
+    def __init__(self, config, script):
+        self.config = config
+        self.id = f"FAKE_{config['description']}_{id(self):x}"
+        self._states = list(script)
+
+    def start(self):
+        pass
+
+    def status(self):
+        state = self._states.pop(0) if len(self._states) > 1 else self._states[0]
+        out = {"state": state, "id": self.id}
+        if state == "FAILED":
+            out["error_message"] = "fake failure"
+        return out
+
+
+class FakeEE:
+    """
+    Minimal stand-in for the `ee` module's batch export API.
+    script(description, attempt) -> list of states the task walks through.
+    """
+
+    def __init__(self, script=None):
+        self.started = []
+        self._attempts = {}
+        self._script = script or (lambda desc, attempt: ["READY", "RUNNING", "COMPLETED"])
+        fake = self
+
+        class _Table:
+            @staticmethod
+            def toCloudStorage(collection=None, description=None, bucket=None, fileNamePrefix=None,
+                               fileFormat=None, **kwargs):
+                n = fake._attempts[description] = fake._attempts.get(description, 0) + 1
+                task = FakeTask({"description": description, "bucket": bucket, "prefix": fileNamePrefix,
+                                 "format": fileFormat}, fake._script(description, n))
+                fake.started.append(task)
+                return task
+
+        class _Export:
+            table = _Table
+
+        class _Batch:
+            Export = _Export
+
+        self.batch = _Batch
+# %%
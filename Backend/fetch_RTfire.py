@@ -6,13 +6,16 @@ import os
 import json
 import requests
 import xarray as xr
-from google.cloud import storage
 from datetime import datetime, timedelta, timezone
+from ee_export import ExportScheduler, merge_tiles, blob_path, MAX_CONCURRENT
+from storage_backend import get_backend, bucket_name
+from reverse_geocode import AdminIndex, INDEX_PATH, feature_tagger
 
 ee.Initialize(project='canvas-radio-444702-k2') ## initialize GEE with a exist project
-storage_client = storage.Client()
-# set GCS bucket
-BUCKET_NAME = "wildfire-monitor-data"
+# set GCS bucket (WILDFIRE_STORAGE, see storage_backend.py); EE exports land at the bucket root
+BUCKET_NAME = bucket_name()
+backend = get_backend(f"gs://{BUCKET_NAME}")
+EXPORT_MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "ee_exports", "rt_fire_manifest.json")
 
 # %% set parameters
 time_window_hours = 72  
@@ -25,15 +28,9 @@ end_time_str = now.strftime('%Y-%m-%d')
 timestamp = now.strftime('%Y%m%d')
 
 # %% fetch real-time fire data, using VIIRS
-## define coundaries and administrative datasets
+## define coundaries
 us = ee.FeatureCollection("TIGER/2018/States")
-
-# CA counties
-counties = ee.FeatureCollection("TIGER/2018/Counties")\
-             .filter(ee.Filter.eq('STATEFP', '06'))
-# CA cities
-cities = ee.FeatureCollection("TIGER/2018/Places") \
-    .filter(ee.Filter.eq('STATEFP', '06'))
+# county / city are tagged offline while the tiles are merged (reverse_geocode.AdminIndex)
 
 # %% try different dataset
 suomi_viirs = ee.ImageCollection("NASA/LANCE/SNPP_VIIRS/C2") \
@@ -67,44 +64,39 @@ else:
         ee.Geometry.Rectangle([-100, 42, -80, 50])    # Midwest
     ]
 
-    def attach_admin_info(feature):
-        county = counties.filterBounds(feature.geometry()).first()
-        city = cities.filterBounds(feature.geometry()).first()
-        return feature \
-            .set('county_name', ee.Algorithms.If(county, county.get('NAME'), None)) \
-            .set('city_name', ee.Algorithms.If(city, city.get('NAME'), None))
-    
-    #timestamp = datetime.now().strftime("%Y%m%d")
-    #all_features = []
-
-
-    # fetch data
+    # one export job per tile; the scheduler runs them concurrently, polls and retries
+    jobs = []
     for i, tile in enumerate(tiles):
-        print(f"Exporting tile {i+1}/{len(tiles)}...")
-
-    # reduce raster data to vectors
-    fire_vectors = merged_image.reduceToVectors(
-        reducer=ee.Reducer.countEvery(),
-        geometry=tile,
-        geometryType='centroid',
-        scale=1000,
-        maxPixels=1e13
-    )
-    fire_vectors_with_address = fire_vectors.map(attach_admin_info)
-
-    # define file path on GCS
-    file_name = f"RT_fire_data/fires_tile_{i+1}_{timestamp}.geojson"
-
-    # export to Google Cloud Storage directly
-    task = ee.batch.Export.table.toCloudStorage(
-        collection=fire_vectors,
-        description=f"RT_fire_export_tile_{i+1}_{timestamp}",
-        bucket=BUCKET_NAME,
-        fileFormat="GeoJSON",
-        path=file_name
-    )
-    task.start()
-
-    print(f"Tile {i+1} export started.")
+        # reduce raster data to vectors
+        fire_vectors = merged_image.reduceToVectors(
+            reducer=ee.Reducer.countEvery(),
+            geometry=tile,
+            geometryType='centroid',
+            scale=1000,
+            maxPixels=1e13
+        )
+        jobs.append({
+            "name": f"RT_fire_export_tile_{i+1}_{timestamp}",
+            "collection": fire_vectors,
+            # tiles go to their own prefix; the map reads the merged file from RT_fire_data/
+            "prefix": f"RT_fire_tiles/fires_tile_{i+1}_{timestamp}",
+        })
+
+    # concurrency is capped by EE_MAX_CONCURRENT (Earth Engine task quota), not by the tile count
+    scheduler = ExportScheduler(ee, BUCKET_NAME, max_concurrent=MAX_CONCURRENT, manifest_path=EXPORT_MANIFEST)
+    results = scheduler.run(jobs)
+
+# %% merge the exported tiles into one GeoJSON
+    done = [r["uri"] for r in results.values() if r and r.get("state") == "COMPLETED"]
+    if len(done) < len(jobs):
+        print(f"[WARN] {len(jobs) - len(done)} tile export(s) failed, see {EXPORT_MANIFEST}")
+    if done:
+        try:
+            tag = feature_tagger(AdminIndex())
+        except FileNotFoundError:
+            print(f"[WARN] {INDEX_PATH} missing (reverse_geocode.py build), county/city not tagged")
+            tag = None
+        merge_tiles([blob_path(u, BUCKET_NAME) for u in done], backend.read, backend.put,
+                    f"RT_fire_data/fires_merged_tiled_{timestamp}.geojson", transform=tag)
 
 # %%
@@ -3,16 +3,19 @@
 # %%
 # %%
 import os
-import math
 import json
-import shutil
-import tempfile
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
 import numpy as np
 import xarray as xr
 import requests
 
+from wind_format import write_wind_bin, write_wind_png
+from grib_cache import GribCache
+from regrid_wind import grid_def_from_attrs, target_grid, get_weights, apply_wind
+
 # ---------------- config ----------------
 # Califorlia bbox（W,S,E,N）
 CA_W, CA_S, CA_E, CA_N = -125.0, 32.0, -113.0, 42.5
@@ -25,150 +28,282 @@ N = CA_N
 # Output JSON path
 OUT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Data", "Wind")
 OUT_JSON = os.path.join(OUT_DIR, "wind_ca_latest.json")
+OUT_BIN = os.path.join(OUT_DIR, "wind_ca_latest.bin")   # int16 quantized u/v (see wind_format.py)
+OUT_PNG = os.path.join(OUT_DIR, "wind_ca_latest.png")   # u/v texture + .png.json header
+OUT_CUBE = os.path.join(OUT_DIR, "wind_ca_cube.bin")    # (time, y, x) forecast cube, same format
+
+HRRR_BASE = "https://noaa-hrrr-bdp-pds.s3.amazonaws.com"
+# GRIB messages we actually use, as "<variable>:<level>" in the .idx inventory
+UV10_FIELDS = ("UGRD:10 m above ground", "VGRD:10 m above ground")
+# Output grid spacing in degrees (~3 km, close to native HRRR)
+GRID_RES_DEG = 0.03
+
+
+def hrrr_url(date_str, hour_str, fhour=0, base=HRRR_BASE):
+    # U/V@10m of HRRR F00 (analysis/reporting time) by default
+    return f"{base}/hrrr.{date_str}/conus/hrrr.t{hour_str}z.wrfsfcf{fhour:02d}.grib2"
+
 
-# Select the current UTC offset by a few hours to avoid the "latest file has not been generated" window
-now = datetime.utcnow() - timedelta(hours=4)
-date_str = now.strftime("%Y%m%d")
-hour_str = now.strftime("%H")
+def find_latest_cycle(max_fhour=0, now=None, lookback_h=6, base=HRRR_BASE, timeout=10):
+    """
+    Newest cycle whose wrfsfcf<max_fhour> inventory already exists, probed with
+    cheap HEAD requests on the .idx (newest first). Returns a naive UTC datetime.
+    """
+    now = now or datetime.utcnow()
+    cycle = now.replace(minute=0, second=0, microsecond=0)
+    with requests.Session() as sess:
+        for _ in range(lookback_h + 1):
+            url = hrrr_url(cycle.strftime("%Y%m%d"), cycle.strftime("%H"), max_fhour, base) + ".idx"
+            try:
+                if sess.head(url, timeout=timeout).status_code == 200:
+                    print("[INFO] latest cycle:", cycle.strftime("%Y-%m-%d %HZ"), f"(f{max_fhour:02d} available)")
+                    return cycle
+            except requests.RequestException as e:
+                print(f"[WARN] HEAD failed {url}: {e}")
+            cycle -= timedelta(hours=1)
+    raise RuntimeError(f"no HRRR cycle with f{max_fhour:02d} in the last {lookback_h}h")
 
-# U/V@10m of HRRR F00 (analysis/reporting time)
-base_url = f"https://noaa-hrrr-bdp-pds.s3.amazonaws.com/hrrr.{date_str}/conus/hrrr.t{hour_str}z.wrfsfcf00.grib2"
-print("[INFO] Downloading:", base_url)
 
-# ---------------- download ----------------
-tmpdir = tempfile.mkdtemp()
-grib_path = os.path.join(tmpdir, f"hrrr_{date_str}_{hour_str}.grib2")
+# ---------------- .idx inventory ----------------
+def read_idx(idx_url, timeout=30):
+    """
+    Parse a GRIB2 .idx sidecar into a list of dicts:
+      {"num", "offset", "var", "level", "fcst"}
+    Lines look like: 71:45638812:d=2025080812:UGRD:10 m above ground:anl:
+    """
+    r = requests.get(idx_url, timeout=timeout)
+    if r.status_code != 200:
+        raise RuntimeError(f"Failed to download idx: {r.status_code} {idx_url}")
+    entries = []
+    for line in r.text.splitlines():
+        parts = line.split(":")
+        if len(parts) < 6:
+            continue
+        entries.append({
+            "num": parts[0],
+            "offset": int(parts[1]),
+            "var": parts[3],
+            "level": parts[4],
+            "fcst": parts[5],
+        })
+    return entries
+
+
+def find_byte_ranges(entries, fields=UV10_FIELDS):
+    """
+    Return [(start, end_or_None), ...] for the requested "<var>:<level>" fields,
+    in inventory order. A message ends one byte before the next one starts;
+    the last message in the file runs to EOF (end=None).
+    """
+    wanted = set(fields)
+    ranges, found = [], set()
+    for i, e in enumerate(entries):
+        key = f"{e['var']}:{e['level']}"
+        if key not in wanted or key in found:
+            continue
+        end = entries[i + 1]["offset"] - 1 if i + 1 < len(entries) else None
+        ranges.append((e["offset"], end))
+        found.add(key)
+    missing = wanted - found
+    if missing:
+        raise KeyError(f"fields not found in idx: {sorted(missing)}")
+    return ranges
+
+
+def download_fields(grib_url, out_path, fields=UV10_FIELDS, timeout=60):
+    """
+    Fetch only the GRIB messages for `fields` via HTTP Range requests and
+    concatenate them into `out_path` (GRIB2 messages are self-contained, so the
+    result is a valid GRIB file that cfgrib can open).
+    """
+    ranges = find_byte_ranges(read_idx(grib_url + ".idx", timeout=timeout), fields)
+    total = 0
+    with requests.Session() as sess, open(out_path, "wb") as f:
+        for start, end in ranges:
+            rng = f"bytes={start}-{'' if end is None else end}"
+            r = sess.get(grib_url, headers={"Range": rng}, stream=True, timeout=timeout)
+            # 206 = partial content; a 200 would mean the server ignored Range
+            if r.status_code != 206:
+                raise RuntimeError(f"Range request failed: {r.status_code} {rng} {grib_url}")
+            for chunk in r.iter_content(1 << 15):
+                f.write(chunk)
+                total += len(chunk)
+    print(f"[INFO] fetched {len(ranges)} messages, {total} bytes ->", out_path)
+    return out_path
 
-r = requests.get(base_url, stream=True, timeout=60)
-if r.status_code != 200:
-    raise RuntimeError(f"Failed to download HRRR: {r.status_code} {base_url}")
-with open(grib_path, "wb") as f:
-    for chunk in r.iter_content(1 << 15):
-        f.write(chunk)
-print("[INFO] Saved to:", grib_path)
 
 # ---------------- open GRIB ----------------
-# HRRR is a Lambert Conformal grid, and cfgrib gives 2D latitude/longitude
-ds = xr.open_dataset(
-    grib_path,
-    engine="cfgrib",
-    backend_kwargs={"filter_by_keys": {"typeOfLevel": "heightAboveGround", "level": 10}},
-)
-
-for cand in ("u10", "u"):
-    if cand in ds:
-        uvar = cand
-        break
-else:
-    raise KeyError("U-wind at 10 m not found (u10/u)")
-
-for cand in ("v10", "v"):
-    if cand in ds:
-        vvar = cand
-        break
-else:
-    raise KeyError("V-wind at 10 m not found (v10/v)")
-
-# Latitude and longitude coordinate names (cfgrib usually gives 2D 'latitude'/'longitude')
-lat2d = ds["latitude"]
-lon2d = ds["longitude"]
-
-# longitude 0–360 -> -180–180
-lon2d = xr.where(lon2d > 180, lon2d - 360, lon2d)
-
-# ---------------- crop to California bbox ----------------
-mask = (lat2d >= CA_S) & (lat2d <= CA_N) & (lon2d >= CA_W) & (lon2d <= CA_E)
-# Use where+drop to clip along the y/x dimensions
-u_raw = ds[uvar].where(mask)
-v_raw = ds[vvar].where(mask)
-#The longitude and latitude after synchronous clipping (the dimension name is consistent with the wind farm)
-lat_raw = lat2d.where(mask)
-lon_raw = lon2d.where(mask)
-
-for dim0, dim1 in ((u_raw.dims[0], u_raw.dims[1]),):
-    u_raw  = u_raw.dropna(dim=dim0, how="all").dropna(dim=dim1, how="all")
-    v_raw  = v_raw.dropna(dim=dim0, how="all").dropna(dim=dim1, how="all")
-    lat_raw = lat_raw.dropna(dim=dim0, how="all").dropna(dim=dim1, how="all")
-    lon_raw = lon_raw.dropna(dim=dim0, how="all").dropna(dim=dim1, how="all")
-
-# Count non-empty points to ensure that they are not all empty
-valid_u = int(np.isfinite(u_raw.values).sum())
-valid_v = int(np.isfinite(v_raw.values).sum())
-print(f"[INFO] valid counts: U={valid_u}, V={valid_v}")
-if valid_u == 0 or valid_v == 0:
-    raise RuntimeError("Cropped HRRR wind is empty — check bbox / hour / projection.")
-
-# ---------------- reorder to (row: north->south, col: west->east) ----------------
-# Sort by the average latitude of each row (descending: north -> south), and by the average longitude of each column (ascending: west -> east)
-lat_mean_by_row = np.nanmean(lat_raw.values, axis=1)
-lon_mean_by_col = np.nanmean(lon_raw.values, axis=0)
-row_idx = np.argsort(-lat_mean_by_row)
-col_idx = np.argsort(lon_mean_by_col)
-
-u_sorted = u_raw.isel({u_raw.dims[0]: row_idx, u_raw.dims[1]: col_idx})
-v_sorted = v_raw.isel({v_raw.dims[0]: row_idx, v_raw.dims[1]: col_idx})
-lat_sorted = lat_raw.isel({lat_raw.dims[0]: row_idx, lat_raw.dims[1]: col_idx})
-lon_sorted = lon_raw.isel({lon_raw.dims[0]: row_idx, lon_raw.dims[1]: col_idx})
-
-# 再次剔除四周“全 null”的行/列（双保险）
-keep_rows = np.where(np.any(np.isfinite(u_sorted.values), axis=1))[0]
-keep_cols = np.where(np.any(np.isfinite(u_sorted.values), axis=0))[0]
-u_sorted   = u_sorted.isel({u_sorted.dims[0]: keep_rows,   u_sorted.dims[1]: keep_cols})
-v_sorted   = v_sorted.isel({v_sorted.dims[0]: keep_rows,   v_sorted.dims[1]: keep_cols})
-lat_sorted = lat_sorted.isel({lat_sorted.dims[0]: keep_rows, lat_sorted.dims[1]: keep_cols})
-lon_sorted = lon_sorted.isel({lon_sorted.dims[0]: keep_rows, lon_sorted.dims[1]: keep_cols})
-
-ny, nx = u_sorted.shape
-
-
-# bbox（W,S,E,N）
-west = float(np.nanmin(lon_sorted.values))
-east = float(np.nanmax(lon_sorted.values))
-south = float(np.nanmin(lat_sorted.values))
-north = float(np.nanmax(lat_sorted.values))
-
-dx = float((east  - west ) / (nx - 1)) if nx > 1 else 0.0
-dy = float((north - south) / (ny - 1)) if ny > 1 else 0.0
-
-print("[INFO] bbox=", [west, south, east, north], " nx,ny=", nx, ny, " dx,dy=", dx, dy)
+def open_uv(grib_path):
+    # HRRR is a Lambert Conformal grid, and cfgrib gives 2D latitude/longitude
+    # indexpath="" stops cfgrib from dropping its own .idx files into the GRIB cache
+    ds = xr.open_dataset(
+        grib_path,
+        engine="cfgrib",
+        backend_kwargs={"filter_by_keys": {"typeOfLevel": "heightAboveGround", "level": 10},
+                        "indexpath": ""},
+    )
+
+    for cand in ("u10", "u"):
+        if cand in ds:
+            uvar = cand
+            break
+    else:
+        raise KeyError("U-wind at 10 m not found (u10/u)")
+
+    for cand in ("v10", "v"):
+        if cand in ds:
+            vvar = cand
+            break
+    else:
+        raise KeyError("V-wind at 10 m not found (v10/v)")
+    return ds, uvar, vvar
+
+
+# ---------------- regrid to regular lat/lon ----------------
+def regrid_uv(ds, uvar, vvar, res=GRID_RES_DEG, method="bilinear"):
+    # Weights from the (fixed) HRRR Lambert grid are cached on disk, so this is one gather per field;
+    # HRRR u/v are grid-relative and are rotated to east/north with the cached angle
+    src = grid_def_from_attrs(ds[uvar].attrs)
+    dst = target_grid(CA_W, CA_S, CA_E, CA_N, res)
+    weights = get_weights(src, dst, method)
+    u, v = apply_wind(ds[uvar].values, ds[vvar].values, weights)
+
+    # Count non-empty points to ensure that they are not all empty
+    valid_u = int(np.isfinite(u).sum())
+    valid_v = int(np.isfinite(v).sum())
+    print(f"[INFO] valid counts: U={valid_u}, V={valid_v}")
+    if valid_u == 0 or valid_v == 0:
+        raise RuntimeError("Regridded HRRR wind is empty — check bbox / hour / projection.")
+
+    print("[INFO] bbox=", dst["bbox"], " nx,ny=", dst["nx"], dst["ny"], " dx,dy=", dst["dx"], dst["dy"])
+    return u, v, dst
+
 
 # ---------------- convert to lists with nulls ----------------
 def to_list_with_null(a: np.ndarray):
-    # 先把非有限值转换成 np.nan，再转列表，最后把 nan 变成 None（JSON 里是 null）
-    arr = np.where(np.isfinite(a), a, np.nan).tolist()
-    return [
-        [
-            None if (x is None or (isinstance(x, float) and math.isnan(x))) else float(x)
-            for x in row
-        ]
-        for row in arr
-    ]
-
-u10 = to_list_with_null(u_sorted.values)
-v10 = to_list_with_null(v_sorted.values)
+    # 非有限值直接在 object 数组里换成 None（JSON 里是 null），不再逐元素 Python 循环
+    out = np.asarray(a, dtype=np.float64).astype(object)
+    out[~np.isfinite(np.asarray(a, dtype=np.float64))] = None
+    return out.tolist()
+
 
 # ---------------- build JSON document ----------------
-doc = {
-    "meta": {
-        "bbox": [west, south, east, north],
-        "nx": int(nx),
-        "ny": int(ny),
-        "dx": dx,
-        "dy": dy,
+def build_meta(grid, when):
+    return {
+        **grid,
         "units": "m/s",
-        "timestamp": now.replace(tzinfo=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "timestamp": when.replace(tzinfo=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
         "grid_origin": "upper-left"
-    },
-    "u10": u10,
-    "v10": v10
-}
-
-# ---------------- write ----------------
-os.makedirs(OUT_DIR, exist_ok=True)
-with open(OUT_JSON, "w", encoding="utf-8") as f:
-    json.dump(doc, f, separators=(",", ":"))
-
-print("[OK] wrote:", OUT_JSON)
-print("       bbox=", doc["meta"]["bbox"])
-print("       nx,ny=", doc["meta"]["nx"], doc["meta"]["ny"], " dx,dy=", doc["meta"]["dx"], doc["meta"]["dy"])
-# %%
\ No newline at end of file
+    }
+
+
+def build_doc(u, v, meta):
+    return {"meta": meta, "u10": to_list_with_null(u), "v10": to_list_with_null(v)}
+
+
+def fetch_hour(cycle, fhour=0, base=HRRR_BASE, cache=None):
+    """
+    Download (or reuse from the GRIB cache) + decode + regrid one forecast hour.
+    Returns (u, v, grid) with u/v as 2-D float32 arrays (NaN = null).
+    """
+    date_str = cycle.strftime("%Y%m%d")
+    hour_str = cycle.strftime("%H")
+    base_url = hrrr_url(date_str, hour_str, fhour, base)
+    cache = cache or GribCache()
+
+    def download(path):
+        print("[INFO] Downloading (byte ranges):", base_url)
+        download_fields(base_url, path)
+
+    grib_path = cache.fetch(date_str, hour_str, fhour, UV10_FIELDS, download)
+    ds, uvar, vvar = open_uv(grib_path)
+    try:
+        u, v, grid = regrid_uv(ds, uvar, vvar)
+    finally:
+        ds.close()
+    return u, v, grid
+
+
+def fetch_latest(base=HRRR_BASE):
+    """
+    Latest available HRRR F00 10 m wind.
+    Returns (u, v, meta) with u/v as 2-D float32 arrays (NaN = null).
+    """
+    cycle = find_latest_cycle(0, base=base)
+    u, v, grid = fetch_hour(cycle, 0, base)
+    return u, v, build_meta(grid, cycle)
+
+
+def fetch_cube(fhours=range(0, 19), max_workers=4, base=HRRR_BASE):
+    """
+    All `fhours` of the newest cycle that has the last one, fetched concurrently
+    (bounded pool) and stacked into (nt, ny, nx) arrays.
+    Returns (u, v, meta, extra) where extra = {"ref_time", "forecast_hours", "times"}.
+    """
+    fhours = sorted(fhours)
+    cycle = find_latest_cycle(fhours[-1], base=base)
+    # one shared cache; evicting once after the pool keeps workers from racing on the same files
+    cache = GribCache(auto_evict=False)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(lambda fh: fetch_hour(cycle, fh, base, cache), fhours))
+    cache.evict()
+
+    grid = results[0][2]
+    u = np.stack([r[0] for r in results])
+    v = np.stack([r[1] for r in results])
+    fmt = "%Y-%m-%dT%H:%M:%SZ"
+    extra = {
+        "ref_time": cycle.strftime(fmt),
+        "forecast_hours": fhours,
+        "times": [(cycle + timedelta(hours=fh)).strftime(fmt) for fh in fhours],
+    }
+    return u, v, build_meta(grid, cycle), extra
+
+
+def write_outputs(u, v, meta, out_dir=OUT_DIR, write_json=True):
+    # wind_ca_latest.json (optional) + compact .bin/.png
+    os.makedirs(out_dir, exist_ok=True)
+    out_json = os.path.join(out_dir, os.path.basename(OUT_JSON))
+    out_bin = os.path.join(out_dir, os.path.basename(OUT_BIN))
+    out_png = os.path.join(out_dir, os.path.basename(OUT_PNG))
+    if write_json:
+        with open(out_json, "w", encoding="utf-8") as f:
+            # dumps() uses the C encoder; json.dump() to a file falls back to the pure-Python one
+            f.write(json.dumps(build_doc(u, v, meta), separators=(",", ":")))
+        print("[OK] wrote:", out_json)
+
+    write_wind_bin(out_bin, u, v, meta)
+    write_wind_png(out_png, u, v, meta)
+    print("       compact:", out_bin, out_png)
+
+
+def parse_hours(spec):
+    # "0-18" -> [0..18], "0,3,6" -> [0,3,6]
+    if "-" in spec:
+        lo, hi = spec.split("-", 1)
+        return list(range(int(lo), int(hi) + 1))
+    return [int(h) for h in spec.split(",")]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fetch HRRR 10 m wind for California")
+    ap.add_argument("--hours", help="forecast-hour range for the animated cube, e.g. 0-18")
+    ap.add_argument("--workers", type=int, default=4, help="concurrent forecast-hour downloads")
+    args = ap.parse_args(argv)
+
+    if args.hours:
+        u, v, meta, extra = fetch_cube(parse_hours(args.hours), args.workers)
+        os.makedirs(OUT_DIR, exist_ok=True)
+        write_wind_bin(OUT_CUBE, u, v, meta, extra=extra)
+        print("[OK] wrote cube:", OUT_CUBE, " shape=", u.shape, " hours=", extra["forecast_hours"])
+        return
+
+    u, v, meta = fetch_latest()
+    write_outputs(u, v, meta)
+    print("       bbox=", meta["bbox"])
+    print("       nx,ny=", meta["nx"], meta["ny"], " dx,dy=", meta["dx"], meta["dy"])
+
+
+if __name__ == "__main__":
+    main()
+# %%
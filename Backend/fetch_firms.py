@@ -0,0 +1,202 @@
+# Fetch FIRMS VIIRS hotspots for CA and upsert them into per-acq_date GeoJSON partitions.
+"""
+Python replacement for scripts/fetch_firms.js:
+  - one streaming pass per source over the FIRMS area CSV (rows are never all
+    held as parsed dicts; only the per-partition feature lists are)
+  - rows go to public/data/firms_ca_<acq_date>.geojson by their own acq_date,
+    so FIRMS_DAY > 1 backfills do not copy overlapping days into each snapshot
+  - dedup on (lat, lon, acq_date, acq_time, satellite) with one key set per
+    partition, seeded from the existing file; several sources merge into the
+    same partitions
+  - a partition file is rewritten only when it gained rows
+  - firms_ca_latest.geojson holds the merged window of this run (written only
+    when its features changed)
+
+Env:
+  FIRMS_KEY      (required)
+  FIRMS_SOURCES  comma list, default VIIRS_SNPP_NRT,VIIRS_NOAA20_NRT,VIIRS_NOAA21_NRT
+                 (FIRMS_SOURCE is still honoured when FIRMS_SOURCES is unset)
+  FIRMS_DAY      1..10, default 1
+"""
+# %%
+import os
+import csv
+import json
+import time
+from datetime import datetime, timezone
+
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUT_DIR = os.path.join(REPO_ROOT, "public", "data")
+OUT_LATEST = os.path.join(OUT_DIR, "firms_ca_latest.geojson")
+CA_BBOX = "-125,32,-113,43.5"
+CSV_URL = "https://firms.modaps.eosdis.nasa.gov/api/area/csv/{key}/{source}/{bbox}/{day}"
+DEFAULT_SOURCES = ("VIIRS_SNPP_NRT", "VIIRS_NOAA20_NRT", "VIIRS_NOAA21_NRT")
+PROPS = ("acq_date", "acq_time", "confidence", "satellite", "instrument", "version",
+         "bright_ti4", "frp", "daynight")
+
+
+def dated_path(acq_date, out_dir=OUT_DIR):
+    return os.path.join(out_dir, f"firms_ca_{acq_date}.geojson")
+
+
+def typed(value):
+    # like papaparse dynamicTyping: "915" -> 915, "2.58" -> 2.58, "n" -> "n", "" -> None
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def dedup_key(lat, lon, props):
+    return (round(float(lat), 5), round(float(lon), 5), str(props.get("acq_date")),
+            int(props.get("acq_time") or 0), str(props.get("satellite")))
+
+
+def row_to_feature(row):
+    lat, lon = row.get("latitude"), row.get("longitude")
+    if not lat or not lon:
+        return None
+    props = {k: typed(row.get(k)) for k in PROPS}
+    props["acq_date"] = row.get("acq_date")  # keep ISO string
+    return {"type": "Feature", "properties": props,
+            "geometry": {"type": "Point", "coordinates": [float(lon), float(lat)]}}
+
+
+def feature_key(feat):
+    lon, lat = feat["geometry"]["coordinates"][:2]
+    return dedup_key(lat, lon, feat["properties"])
+
+
+def stream_csv(source, key, day, bbox=CA_BBOX, timeout=60, retries=3):
+    """Yield FIRMS CSV rows (dicts) for one source while the response is still downloading."""
+    url = CSV_URL.format(key=key, source=source, bbox=bbox, day=day)
+    for attempt in range(retries):
+        try:
+            with requests.get(url, stream=True, timeout=timeout) as resp:
+                resp.raise_for_status()
+                lines = (ln for ln in resp.iter_lines(decode_unicode=True) if ln)
+                yield from csv.DictReader(lines)
+            return
+        except requests.exceptions.RequestException as e:
+            print(f"[WARN] {source} attempt {attempt + 1} failed:", e)
+            if attempt < retries - 1:
+                time.sleep(1.5 * (attempt + 1))
+            else:
+                raise
+
+
+class Partition:
+    """Features of one acq_date with the dedup key set; seeded lazily from the existing file."""
+
+    def __init__(self, acq_date, out_dir=OUT_DIR):
+        self.acq_date = acq_date
+        self.path = dated_path(acq_date, out_dir)
+        self.doc = None
+        self.keys = set()
+        self.added = 0
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.doc = json.load(f)
+            for feat in self.doc.get("features", []):
+                self.keys.add(feature_key(feat))
+        else:
+            self.doc = {"type": "FeatureCollection", "features": []}
+
+    def add(self, feat):
+        k = feature_key(feat)
+        if k in self.keys:
+            return False
+        self.keys.add(k)
+        self.doc["features"].append(feat)
+        self.added += 1
+        return True
+
+
+def collection(name, features, sources, day, fetched_at):
+    return {
+        "type": "FeatureCollection",
+        "name": name,
+        "crs": {"type": "name", "properties": {"name": "EPSG:4326"}},
+        "fetched_at_utc": fetched_at,
+        "source": {"url": CSV_URL.format(key="<FIRMS_KEY>", source="{source}", bbox=CA_BBOX, day=day),
+                   "dataset": ",".join(sources), "bbox": CA_BBOX, "day_range": str(day)},
+        "features": features,
+    }
+
+
+def ingest(rows_by_source, day="1", out_dir=OUT_DIR):
+    """
+    rows_by_source: {source: iterable of CSV row dicts}.
+    Upserts the per-date partitions and the latest file. Returns {acq_date: rows_added}.
+    """
+    fetched_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+    parts, window, window_keys = {}, [], set()
+    total = 0
+    for source, rows in rows_by_source.items():
+        n = 0
+        for row in rows:
+            feat = row_to_feature(row)
+            if feat is None:
+                continue
+            n += 1
+            k = feature_key(feat)
+            if k not in window_keys:
+                window_keys.add(k)
+                window.append(feat)
+            d = feat["properties"]["acq_date"]
+            if d not in parts:
+                parts[d] = Partition(d, out_dir)
+            parts[d].add(feat)
+        total += n
+        print(f"[INFO] {source}: {n} rows")
+
+    changed = {}
+    for d, p in sorted(parts.items()):
+        if not p.added:
+            continue
+        p.doc = collection(f"FIRMS VIIRS CA ({d})", p.doc["features"], list(rows_by_source), day, fetched_at)
+        with open(p.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(p.doc, separators=(",", ":")))
+        changed[d] = p.added
+        print(f"[WRITE] {p.path} (+{p.added}, total {len(p.doc['features'])})")
+
+    latest = collection(f"FIRMS VIIRS CA (last {day} day)", window, list(rows_by_source), day, fetched_at)
+    old_features = None
+    latest_path = os.path.join(out_dir, os.path.basename(OUT_LATEST))
+    if os.path.exists(latest_path):
+        with open(latest_path, "r", encoding="utf-8") as f:
+            old_features = json.load(f).get("features")
+    if old_features != window:
+        with open(latest_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(latest, separators=(",", ":")))
+        print(f"[WRITE] {latest_path} (features={len(window)})")
+    else:
+        print("[INFO] latest unchanged")
+
+    print(f"[OK] {total} rows from {len(rows_by_source)} source(s) -> {len(window)} unique; "
+          f"partitions changed: {changed or 'none'}")
+    return changed
+
+
+def main():
+    key = os.environ.get("FIRMS_KEY")
+    if not key:
+        raise SystemExit("[FAIL] Missing FIRMS_KEY env var.")
+    spec = os.environ.get("FIRMS_SOURCES") or os.environ.get("FIRMS_SOURCE") or ",".join(DEFAULT_SOURCES)
+    sources = [s.strip() for s in spec.split(",") if s.strip()]
+    day = os.environ.get("FIRMS_DAY", "1")
+    os.makedirs(OUT_DIR, exist_ok=True)
+    ingest({s: stream_csv(s, key, day) for s in sources}, day)
+
+
+if __name__ == "__main__":
+    main()
+# %%
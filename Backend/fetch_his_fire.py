@@ -1,63 +1,180 @@
 # fetch historical fire data for fire mode
+"""
+GOES-16 FDCC fire pixels over California, backfilled in monthly chunks.
+
+Each (year, month) is one Earth Engine table export to
+  gs://<bucket>/fire_data/chunks/<year>/fire_data_<YYYY-MM>.geojson
+run through ee_export.ExportScheduler, which throttles concurrent tasks,
+retries failures and records every chunk in a local manifest
+(Data/ee_exports/his_fire_manifest.json). A rerun only resubmits chunks that
+are missing or failed. The month still in progress keeps its name and object;
+its end date is the job version, so the next day's run exports it again over
+the same object. Manifest entries (and their objects) of the chunks' year
+that no longer match a chunk, e.g. from the older per-date-range naming, are
+deleted.
+
+When every chunk of a year is complete, the chunks are merged into one
+compact per-year GeoJSON (centroids rounded to 1e-4 deg, only timestamp and
+count kept) at the path the map loads. A year is re-merged only when its
+chunk set changed.
+
+Usage:
+  python Backend/fetch_his_fire.py [--years 2019 2025] [--max-concurrent 4] [--reset]
+"""
 # %% python visualize
+import os
+import hashlib
+import argparse
+from datetime import date, datetime, timezone
+
 import ee
-import json
-import geemap
-import pandas as pd
-import geopandas as gpd
-from google.cloud import storage
 
-# %%
-ee.Initialize(project='canvas-radio-444702-k2')
-# set GCS bucket 
-BUCKET_NAME = "wildfire-monitor-data"
-
-# set CA boundary
-california = ee.FeatureCollection("TIGER/2018/States") \
-            .filter(ee.Filter.eq("NAME", "California"))
-# %% fetch GOES ABI 
-def fetch_and_store_fire_data(year):
-    # set time range
-    start_date = f"{year}-01-01"
-    end_date = f"{year}-12-31"
-
-    # get data 
+from ee_export import ExportScheduler, merge_tiles, blob_path
+from storage_backend import get_backend, bucket_name
+
+# set GCS bucket (WILDFIRE_STORAGE, see storage_backend.py); EE exports land at the bucket root
+BUCKET_NAME = bucket_name()
+EE_PROJECT = "canvas-radio-444702-k2"
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "ee_exports",
+                             "his_fire_manifest.json")
+FIRST_YEAR = 2019
+YEAR_FILE = "fire_data/fire_data_{year}.geojson.geojson"  # object name js/His_fire.js loads
+COORD_DIGITS = 4
+
+
+# %% chunks
+def month_chunks(year, today=None):
+    """[(start, end)] ISO dates per month of `year`, end exclusive and clipped to today."""
+    today = today or datetime.now(timezone.utc).date()
+    chunks = []
+    for m in range(1, 13):
+        start = date(year, m, 1)
+        if start >= today:
+            break
+        end = date(year + 1, 1, 1) if m == 12 else date(year, m + 1, 1)
+        chunks.append((start.isoformat(), min(end, today).isoformat()))
+    return chunks
+
+
+def chunk_job(california, start, end):
+    # GOES ABI fire pixels in [start, end) -> centroid features with a timestamp
     fires = ee.ImageCollection("NOAA/GOES/16/FDCC") \
-        .filterDate(start_date, end_date) \
+        .filterDate(start, end) \
         .filterBounds(california) \
-        .select(["Area"])  # 
+        .select(["Area"])
 
     # convert raster to vector
     def extract_fire_features(image):
         timestamp = ee.Date(image.get("system:time_start")).format("YYYY-MM-dd HH:mm:ss")
-        single_band = image.select("Area")
-
-        fire_pixels = single_band.reduceToVectors(
+        return image.select("Area").reduceToVectors(
             geometry=california.geometry(),
             scale=2000,  # 2km
             geometryType="centroid",
             reducer=ee.Reducer.countEvery()
         ).map(lambda feature: feature.set("timestamp", timestamp))  # add time info
 
-        return fire_pixels
+    year, month = start[:4], start[:7]
+    return {
+        "name": f"fire_data_export_{month}",
+        "collection": fires.map(extract_fire_features).flatten(),
+        "prefix": f"fire_data/chunks/{year}/fire_data_{month}",
+        "version": end,  # only changes for the month in progress
+    }
+
 
-    fire_features = fires.map(extract_fire_features).flatten()
+def chunk_year(entry):
+    # "fire_data/chunks/<year>/..." -> "<year>"
+    parts = entry.get("prefix", "").split("/")
+    return parts[2] if len(parts) > 3 and parts[1] == "chunks" else None
 
-    # save path
-    file_name = f"fire_data/fire_data_{year}.geojson"
-    print(f" Exporting {year} fire data to {file_name}...")
 
-    # export to GCS
-    task = ee.batch.Export.table.toCloudStorage(
-        collection=fire_features,
-        description=f"fire_data_export_{year}",
-        bucket=BUCKET_NAME,
-        fileFormat="GeoJSON",
-        path=file_name
-    )
-    task.start()
-    print(f" {year} Done! ")
+def prune_superseded(scheduler, jobs_by_year, backend):
+    # drop manifest entries of the given years that match no current chunk, and their exported objects
+    current = {j["name"] for jobs in jobs_by_year.values() for j in jobs}
+    years = {str(y) for y in jobs_by_year}
+    stale = [name for name, entry in scheduler.manifest["jobs"].items()
+             if name not in current and chunk_year(entry) in years]
+    for name in stale:
+        entry = scheduler.manifest["jobs"].pop(name)
+        if entry.get("uri"):
+            backend.delete(blob_path(entry["uri"], BUCKET_NAME))
+    if stale:
+        scheduler.save()
+        print(f"[INFO] removed {len(stale)} superseded chunk(s): {stale}")
 
-# loop 2019 to 2025
-for year in range(2019, 2026):
-    fetch_and_store_fire_data(year)
+
+# %% merge
+def compact_feature(feat):
+    geom = feat.get("geometry") or {}
+    if geom.get("type") != "Point":
+        return None
+    props = feat.get("properties") or {}
+    lon, lat = geom["coordinates"][:2]
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [round(lon, COORD_DIGITS), round(lat, COORD_DIGITS)]},
+        "properties": {"timestamp": props.get("timestamp"), "count": props.get("count")},
+    }
+
+
+def merge_years(scheduler, jobs_by_year, backend):
+    """Merge each fully exported year into YEAR_FILE; skips years whose chunk set is unchanged."""
+    merged = scheduler.manifest.setdefault("merged", {})
+    for year, jobs in sorted(jobs_by_year.items()):
+        if not jobs:
+            print(f"[WARN] {year}: no monthly chunks, merge skipped")
+            continue
+        missing = [j["name"] for j in jobs if not scheduler.is_done(j)]
+        if missing:
+            print(f"[WARN] {year}: {len(missing)} chunk(s) not exported, merge skipped: {missing}")
+            continue
+        sig = hashlib.sha1("|".join(f"{j['name']}@{j['version']}" for j in jobs).encode("utf-8")).hexdigest()
+        if merged.get(str(year)) == sig:
+            print(f"[INFO] {year}: merged file up to date")
+            continue
+        paths = [blob_path(scheduler.manifest["jobs"][j["name"]]["uri"], BUCKET_NAME) for j in jobs]
+        # reduceToVectors ids repeat across images, so nothing is deduplicated by id
+        merge_tiles(paths, backend.read, backend.put, YEAR_FILE.format(year=year), id_key=None,
+                    transform=compact_feature)
+        merged[str(year)] = sig
+        scheduler.save()
+
+
+# %%
+def main(argv=None):
+    this_year = datetime.now(timezone.utc).year
+    ap = argparse.ArgumentParser(description="Resumable monthly GOES fire backfill to GCS")
+    ap.add_argument("--years", nargs=2, type=int, default=[FIRST_YEAR, this_year], metavar=("FIRST", "LAST"))
+    ap.add_argument("--max-concurrent", type=int, default=4)
+    ap.add_argument("--max-retries", type=int, default=2)
+    ap.add_argument("--manifest", default=MANIFEST_PATH)
+    ap.add_argument("--reset", action="store_true", help="forget the manifest and resubmit every chunk")
+    ap.add_argument("--no-merge", action="store_true")
+    args = ap.parse_args(argv)
+    first, last = args.years
+    if first > last or last > this_year:
+        ap.error(f"--years: need FIRST <= LAST <= {this_year} (future years have nothing to export)")
+
+    ee.Initialize(project=EE_PROJECT)
+    # set CA boundary
+    california = ee.FeatureCollection("TIGER/2018/States") \
+        .filter(ee.Filter.eq("NAME", "California"))
+
+    jobs_by_year = {}
+    for year in range(args.years[0], args.years[1] + 1):
+        jobs_by_year[year] = [chunk_job(california, s, e) for s, e in month_chunks(year)]
+    jobs = [j for year_jobs in jobs_by_year.values() for j in year_jobs]
+    print(f"[INFO] {len(jobs)} monthly chunks for {args.years[0]}-{args.years[1]}")
+
+    scheduler = ExportScheduler(ee, BUCKET_NAME, max_concurrent=args.max_concurrent,
+                                max_retries=args.max_retries, manifest_path=args.manifest, reset=args.reset)
+    backend = get_backend(f"gs://{BUCKET_NAME}")
+    prune_superseded(scheduler, jobs_by_year, backend)
+    scheduler.run(jobs)
+    if not args.no_merge:
+        merge_years(scheduler, jobs_by_year, backend)
+
+
+if __name__ == "__main__":
+    main()
+# %%
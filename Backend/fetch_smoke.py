@@ -1,47 +1,83 @@
 # %%
+"""
+AirNow PM2.5 for California, ingested hourly into a columnar per-day store.
+
+  --mode daily (default)   the original job: yesterday (CA time) as one compact
+                           JSON upload to smoke_contours/<YYYYMMDD>_PM25_data.json
+  --mode hourly            ask AirNow only for the UTC hours after the local
+                           high-water mark (minus LOOKBACK_HOURS, since sites
+                           report late), upsert them and publish the latest hour
+                           (scheduled by .github/workflows/auto-smoke.yml)
+
+Store (STORE_DIR, default Data/airnow/):
+  pm25_YYYY-MM-DD.npz  one partition per UTC day, rows sorted by (hour, site):
+      site : uint16 index into sites.json    hour : uint8 UTC hour
+      pm25 : float32 raw concentration       aqi  : int16 (-1 = missing)
+      category : uint8 AQI category (0 = missing)
+    (site, hour) is unique; a re-fetched row replaces the stored one
+  sites.json           [{"id", "name", "agency", "lat", "lon"}], append-only
+  state.json           {"hwm": "YYYY-MM-DDTHH"} newest UTC hour ingested
+
+Latest-hour artifact (public/data/airnow_latest.json, also uploaded to
+smoke_contours/airnow_latest.json): every site's newest reading within
+LATEST_WINDOW_HOURS of the newest hour, as parallel arrays.
+"""
 import requests
 import time
 import os
 import json
 import shutil
+import argparse
 import tempfile
-from datetime import datetime,timedelta
-from google.cloud import storage
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from storage_backend import get_backend, CACHE_STATIC
+
 # configration
-API_KEY = '2900B648-68DC-4DA9-8912-108C4DC5B87A'
+API_KEY = os.environ.get("AIRNOW_API_KEY") or '2900B648-68DC-4DA9-8912-108C4DC5B87A'  # empty CI secret -> default
 BBOX    = '-124.48,32.53,-114.13,42.01'
 SRS     = 'EPSG:4326'
 PARAMS  = 'PM25'                                # Pollutant
-BUCKET_NAME = "wildfire-monitor-data"
 DEST_FOLDER = 'smoke_contours'
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORE_DIR = os.path.join(REPO_ROOT, "Data", "airnow")
+LATEST_PATH = os.path.join(REPO_ROOT, "public", "data", "airnow_latest.json")
+LOOKBACK_HOURS = 2        # re-ask the last hours already ingested; late sites fill in
+FIRST_RUN_HOURS = 24      # no high-water mark yet
+MAX_BACKLOG_HOURS = 72    # never ask for more than this in one run
+LATEST_WINDOW_HOURS = 3
+
+COLUMNS = {"site": np.uint16, "hour": np.uint8, "pm25": np.float32, "aqi": np.int16, "category": np.uint8}
+HOUR_FMT = "%Y-%m-%dT%H"
+
+
 # %% fetch data
-def fetch_smoke_data():
-    now_ca = datetime.now(ZoneInfo("America/Los_Angeles"))
-    yesterday_ca = now_ca - timedelta(days=1)
-    date_str = yesterday_ca.strftime("%Y-%m-%d")
-    start = f"{date_str}T00"
-    end   = f"{date_str}T23"
+def fetch_airnow(start, end):
+    """AirNow observations for UTC hours start..end ("YYYY-MM-DDTHH", inclusive)."""
     url = (
         "https://www.airnowapi.org/aq/data/"
         f"?startDate={start}"
         f"&endDate={end}"
-        f"&parameters=PM25"
+        f"&parameters={PARAMS}"
         f"&BBOX={BBOX}"
-        f"&dataType=A"               # AQI 
+        f"&dataType=B"               # AQI + concentration
         f"&format=application/json"
         f"&verbose=1"
         f"&monitorType=0"            # 0=Permanent monitors
         f"&includerawconcentration=1"
         f"&API_KEY={API_KEY}"
     )
-    print(f"[DEBUG] CA now: {now_ca} → fetching for: {date_str}")
-    
     for attempt in range(3):
         try:
             resp = requests.get(url, timeout=60)
             resp.raise_for_status()
-            return resp.json()
+            data = resp.json()
+            if not isinstance(data, list):
+                raise RuntimeError(f"Unexpected payload type: {type(data)}")
+            return data
         except requests.exceptions.RequestException as e:
             print(f"[WARN] attempt {attempt+1} failed:", e)
             if attempt < 2:
@@ -50,28 +86,184 @@ def fetch_smoke_data():
                 raise
 
 
-# %% upload to GCS
-def upload_file_to_gcs(local_path, bucket_name, dest_blob):
-    client = storage.Client()
-    bucket = client.bucket(bucket_name)
-    blob   = bucket.blob(dest_blob)
-    blob.upload_from_filename(local_path, content_type='application/json')
-    print(f"[{datetime.utcnow()}] Uploaded file → gs://{bucket_name}/{dest_blob}")
+def fetch_smoke_data():
+    # yesterday in CA time, whole day
+    now_ca = datetime.now(ZoneInfo("America/Los_Angeles"))
+    date_str = (now_ca - timedelta(days=1)).strftime("%Y-%m-%d")
+    print(f"[DEBUG] CA now: {now_ca} → fetching for: {date_str}")
+    return fetch_airnow(f"{date_str}T00", f"{date_str}T23")
+
+
+# %% columnar store
+def _number(v, default):
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return default
+    return default if v < -900 else v  # AirNow uses -999 for missing
+
+
+def site_id(rec):
+    return str(rec.get("IntlAQSCode") or rec.get("FullAQSCode") or f"{rec.get('Latitude')},{rec.get('Longitude')}")
+
+
+def load_sites(store_dir):
+    path = os.path.join(store_dir, "sites.json")
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-def main():
-    # fetch data
-    data = fetch_smoke_data()
 
-    if not isinstance(data, list):
-        raise RuntimeError(f"Unexpected payload type: {type(data)}")
-    count = len(data)
-    print(f"[{datetime.utcnow()}] Fetched {count} records from AirNow API.")
-    if count > 0:
-        sample = data[:3] 
-        print("Sample record keys:", list(sample[0].keys()))
-        print("First record:", json.dumps(sample[0], ensure_ascii=False, indent=2))
+def save_json(path, obj):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def records_to_columns(records, sites):
+    """AirNow records -> {day: column dict}; new sites are appended to `sites`."""
+    lookup = {s["id"]: i for i, s in enumerate(sites)}
+    rows = {}
+    for rec in records:
+        if rec.get("Parameter", PARAMS).replace(".", "") != PARAMS or not rec.get("UTC"):
+            continue
+        sid = site_id(rec)
+        if sid not in lookup:
+            lookup[sid] = len(sites)
+            sites.append({"id": sid, "name": rec.get("SiteName"), "agency": rec.get("AgencyName"),
+                          "lat": rec.get("Latitude"), "lon": rec.get("Longitude")})
+        day, hour = rec["UTC"][:10], int(rec["UTC"][11:13])
+        conc = _number(rec.get("RawConcentration"), np.nan)
+        if np.isnan(conc):
+            conc = _number(rec.get("Value"), np.nan)
+        rows.setdefault(day, []).append((lookup[sid], hour, conc, _number(rec.get("AQI"), -1),
+                                         int(_number(rec.get("Category"), 0))))
+    out = {}
+    for day, rs in rows.items():
+        arr = list(zip(*rs))
+        out[day] = {k: np.array(arr[i], dtype=t) for i, (k, t) in enumerate(COLUMNS.items())}
+    return out
+
+
+def partition_path(store_dir, day):
+    return os.path.join(store_dir, f"pm25_{day}.npz")
+
+
+def load_partition(store_dir, day):
+    path = partition_path(store_dir, day)
+    if not os.path.exists(path):
+        return {k: np.empty(0, dtype=t) for k, t in COLUMNS.items()}
+    with np.load(path) as z:
+        return {k: z[k] for k in COLUMNS}
+
+
+def upsert_day(store_dir, day, new):
+    """Merge new rows into one day; (site, hour) keeps the newest fetch. Returns the number of new rows."""
+    old = load_partition(store_dir, day)
+    both = {k: np.concatenate([old[k], new[k]]).astype(t) for k, t in COLUMNS.items()}
+    key = both["hour"].astype(np.int64) * 65536 + both["site"]
+    # last occurrence wins: unique on the reversed keys
+    _, first_rev = np.unique(key[::-1], return_index=True)
+    keep = np.sort(len(key) - 1 - first_rev)
+    merged = {k: v[keep] for k, v in both.items()}
+    order = np.lexsort((merged["site"], merged["hour"]))
+    merged = {k: v[order] for k, v in merged.items()}
+    if len(old["site"]) == len(merged["site"]) and all(
+            np.array_equal(old[k], merged[k], equal_nan=(k == "pm25")) for k in COLUMNS):
+        return 0
+    tmp = partition_path(store_dir, day) + ".tmp.npz"
+    np.savez_compressed(tmp, **merged)
+    os.replace(tmp, partition_path(store_dir, day))
+    return int(len(merged["site"]) - len(old["site"]))
+
+
+def ingest(records, store_dir=STORE_DIR):
+    """Upsert AirNow records into the store; returns (newest UTC hour seen or None, {day: new rows})."""
+    os.makedirs(store_dir, exist_ok=True)
+    sites = load_sites(store_dir)
+    n_sites = len(sites)
+    by_day = records_to_columns(records, sites)
+    if len(sites) != n_sites:
+        save_json(os.path.join(store_dir, "sites.json"), sites)
+    changed = {day: upsert_day(store_dir, day, cols) for day, cols in sorted(by_day.items())}
+    newest = None
+    if by_day:
+        day = max(by_day)
+        newest = f"{day}T{int(by_day[day]['hour'].max()):02d}"
+    return newest, changed
+
+
+def latest_hour(store_dir=STORE_DIR, hwm=None, window=LATEST_WINDOW_HOURS):
+    """Newest reading per site within `window` hours up to hwm -> compact dict of parallel arrays."""
+    if hwm is None:
+        return None
+    end = datetime.strptime(hwm, HOUR_FMT)
+    start = end - timedelta(hours=window - 1)
+    sites = load_sites(store_dir)
+    best = {}
+    for day in sorted({start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")}):
+        cols = load_partition(store_dir, day)
+        if not len(cols["site"]):
+            continue
+        stamp = np.array([f"{day}T{h:02d}" for h in cols["hour"]])
+        ok = (stamp >= start.strftime(HOUR_FMT)) & (stamp <= hwm) & np.isfinite(cols["pm25"])
+        for i in np.flatnonzero(ok):  # rows are hour-sorted, so later rows overwrite
+            best[int(cols["site"][i])] = (stamp[i], float(cols["pm25"][i]), int(cols["aqi"][i]))
+    ids = sorted(best)
+    return {
+        "hour": hwm, "parameter": PARAMS, "unit": "UG/M3",
+        "lat": [sites[i]["lat"] for i in ids], "lon": [sites[i]["lon"] for i in ids],
+        "pm25": [round(best[i][1], 1) for i in ids], "aqi": [best[i][2] for i in ids],
+        "age_h": [int((end - datetime.strptime(best[i][0], HOUR_FMT)).total_seconds() // 3600) for i in ids],
+        "site": [sites[i]["name"] for i in ids],
+    }
+
+
+# %% modes
+def run_hourly(store_dir=STORE_DIR, latest_path=LATEST_PATH, upload=True, now=None):
+    state_path = os.path.join(store_dir, "state.json")
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    now = (now or datetime.now(timezone.utc)).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+    hwm = state.get("hwm")
+    if hwm:
+        start = datetime.strptime(hwm, HOUR_FMT) - timedelta(hours=LOOKBACK_HOURS - 1)
     else:
+        start = now - timedelta(hours=FIRST_RUN_HOURS)
+    start = max(start, now - timedelta(hours=MAX_BACKLOG_HOURS))
+    if start > now:
+        print(f"[INFO] up to date (hwm {hwm})")
+        return state
+    print(f"[INFO] fetching {start.strftime(HOUR_FMT)} .. {now.strftime(HOUR_FMT)} UTC (hwm {hwm})")
+    records = fetch_airnow(start.strftime(HOUR_FMT), now.strftime(HOUR_FMT))
+    newest, changed = ingest(records, store_dir)
+    print(f"[OK] {len(records)} records, new rows per day: {changed or 'none'}")
+
+    if newest and (not hwm or newest > hwm):
+        state["hwm"] = newest
+        save_json(state_path, state)
+    latest = latest_hour(store_dir, state.get("hwm"))
+    if latest is not None:
+        save_json(latest_path, latest)
+        print(f"[WRITE] latest hour {latest['hour']}: {len(latest['pm25'])} sites -> {latest_path}")
+        if upload:
+            status = get_backend().put(f"{DEST_FOLDER}/airnow_latest.json", latest_path)
+            print(f"[OK] airnow_latest.json {status}")
+    return state
+
+
+def run_daily(store_dir=STORE_DIR):
+    # fetch data
+    data = fetch_smoke_data()
+    print(f"[{datetime.utcnow()}] Fetched {len(data)} records from AirNow API.")
+    if not data:
         print(" Warning: fetched empty data array!")
+    ingest(data, store_dir)
 
     # temporary json file
     temp_dir = tempfile.mkdtemp(prefix='smoke_')
@@ -80,18 +272,33 @@ def main():
         tmp_file = os.path.join(temp_dir, filename)
 
         with open(tmp_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
         print(f"[{datetime.utcnow()}] Wrote data to {tmp_file}")
 
         # upload to GCS
         dest_blob = f"{DEST_FOLDER}/{filename}"
-        upload_file_to_gcs(tmp_file, BUCKET_NAME, dest_blob)
+        status = get_backend().put(dest_blob, tmp_file, cache_control=CACHE_STATIC)
+        print(f"[{datetime.utcnow()}] {status} → {dest_blob}")
 
     finally:
         # clean temp_file
         shutil.rmtree(temp_dir)
         print(f"[{datetime.utcnow()}] Removed temporary dir {temp_dir}")
 
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="AirNow PM2.5 ingestion for California")
+    ap.add_argument("--mode", choices=("hourly", "daily"), default="daily")
+    ap.add_argument("--store", default=STORE_DIR)
+    ap.add_argument("--latest", default=LATEST_PATH)
+    ap.add_argument("--no-upload", action="store_true", help="hourly: keep the latest-hour file local")
+    args = ap.parse_args(argv)
+    if args.mode == "daily":
+        run_daily(args.store)
+    else:
+        run_hourly(args.store, args.latest, upload=not args.no_upload)
+
+
 if __name__ == '__main__':
 
     main()
@@ -0,0 +1,354 @@
+# Incremental fire-event clustering of FIRMS detections across days.
+"""
+Each day's detections (from the firms_archive) are clustered with a
+grid-bucketed DBSCAN: points are bucketed into EPS_KM cells on a local
+equirectangular projection, so neighbour search only compares a cell with its
+8 neighbours. Day clusters are then linked into event tracks: a cluster joins
+an event whose last cluster (bbox grown by LINK_KM) it touches within
+MAX_GAP_DAYS; a cluster touching several events merges them.
+
+Each event carries start/end date, per-day detections, FRP and area
+(detections snapped to ~375 m VIIRS pixels), the cumulative footprint growth
+and the centroid path.
+
+Incremental: the track state is checkpointed REPROCESS_DAYS before the newest
+archive day (late rows can still land in the last partitions, see
+fetch_firms.py). A run restores the checkpoint and only clusters the days
+after it. Only events that can still be linked keep their per-day pixels in
+the checkpoint; closed events are kept as their published summary while they
+are within --recent-days and dropped after that.
+
+Files:
+  $FIRE_EVENTS_STATE (default .firms_cache/fire_events_state.json)
+                              checkpoint, not committed; CI keeps it in the
+                              actions cache. Missing -> re-cluster the archive.
+  public/data/fire_events.json   event summaries for the frontend
+
+Usage:
+  python Backend/fire_events.py [--rebuild] [--min-days 1] [--recent-days 60]
+"""
+# %%
+import os
+import json
+import copy
+import argparse
+
+import numpy as np
+
+import firms_archive
+from firms_archive import ARCHIVE_DIR, REPO_ROOT, day_number, day_string
+
+STATE_PATH = os.environ.get("FIRE_EVENTS_STATE",
+                            os.path.join(REPO_ROOT, ".firms_cache", "fire_events_state.json"))
+OUT_PATH = os.path.join(firms_archive.SRC_DIR, "fire_events.json")
+EPS_KM = 2.0          # DBSCAN neighbourhood radius
+MIN_SAMPLES = 1       # 1 = every detection belongs to a cluster (single-pixel fires kept)
+LINK_KM = 3.0         # cross-day link distance between cluster bboxes
+MAX_GAP_DAYS = 2      # an event may skip a day (clouds, orbit gaps)
+REPROCESS_DAYS = 2
+RECENT_DAYS = 60      # published events must have burned within this many days (0 = all)
+PIXEL_DEG = 0.0034    # ~375 m footprint cell
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320
+
+
+# ---------------- per-day clustering ----------------
+def project_km(lat, lon, lat0):
+    return (np.asarray(lon, dtype=np.float64) * KM_PER_DEG_LON * np.cos(np.radians(lat0)),
+            np.asarray(lat, dtype=np.float64) * KM_PER_DEG_LAT)
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def dbscan_grid(lat, lon, eps_km=EPS_KM, min_samples=MIN_SAMPLES):
+    """
+    DBSCAN over points in degrees; neighbours are found via eps-sized grid cells.
+    Returns int labels (-1 = noise, only possible when min_samples > 1).
+    """
+    n = len(lat)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    x, y = project_km(lat, lon, float(np.mean(lat)))
+    cx = np.floor(x / eps_km).astype(np.int64)
+    cy = np.floor(y / eps_km).astype(np.int64)
+    buckets = {}
+    for i, key in enumerate(zip(cx.tolist(), cy.tolist())):
+        buckets.setdefault(key, []).append(i)
+    buckets = {k: np.array(v) for k, v in buckets.items()}
+
+    # neighbour pairs (i < j) within eps, one cell block at a time
+    pairs_i, pairs_j = [], []
+    for (bx, by), a in buckets.items():
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                b = buckets.get((bx + dx, by + dy))
+                if b is None:
+                    continue
+                d2 = (x[a, None] - x[None, b]) ** 2 + (y[a, None] - y[None, b]) ** 2
+                ii, jj = np.nonzero(d2 <= eps_km * eps_km)
+                ii, jj = a[ii], b[jj]
+                keep = ii < jj
+                pairs_i.append(ii[keep])
+                pairs_j.append(jj[keep])
+    pi = np.concatenate(pairs_i) if pairs_i else np.empty(0, dtype=np.int64)
+    pj = np.concatenate(pairs_j) if pairs_j else np.empty(0, dtype=np.int64)
+
+    degree = np.bincount(np.concatenate([pi, pj]), minlength=n) + 1  # counts itself
+    core = degree >= min_samples
+
+    parent = list(range(n))
+    for i, j in zip(pi[core[pi] & core[pj]].tolist(), pj[core[pi] & core[pj]].tolist()):
+        ri, rj = _find(parent, i), _find(parent, j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    roots = np.array([_find(parent, i) for i in range(n)])
+
+    labels = np.where(core, roots, -1)
+    # border points join the cluster of any core neighbour
+    for i, j in zip(pi.tolist(), pj.tolist()):
+        if core[i] and not core[j] and labels[j] < 0:
+            labels[j] = roots[i]
+        elif core[j] and not core[i] and labels[i] < 0:
+            labels[i] = roots[j]
+    _, labels_c = np.unique(labels[labels >= 0], return_inverse=True)
+    out = np.full(n, -1, dtype=np.int64)
+    out[labels >= 0] = labels_c
+    return out
+
+
+def pixel_keys(lat, lon):
+    return (np.floor(np.asarray(lat) / PIXEL_DEG).astype(np.int64) * 1_000_000
+            + np.floor(np.asarray(lon) / PIXEL_DEG).astype(np.int64))
+
+
+def pixel_area_km2(n_pixels, lat):
+    side_lat = PIXEL_DEG * KM_PER_DEG_LAT
+    side_lon = PIXEL_DEG * KM_PER_DEG_LON * np.cos(np.radians(lat))
+    return float(n_pixels * side_lat * side_lon)
+
+
+def day_clusters(cols, eps_km=EPS_KM, min_samples=MIN_SAMPLES):
+    # one day's column dict -> list of cluster summaries
+    lat = cols["lat"].astype(np.float64)
+    lon = cols["lon"].astype(np.float64)
+    frp = np.nan_to_num(cols["frp"].astype(np.float64))
+    labels = dbscan_grid(lat, lon, eps_km, min_samples)
+    out = []
+    for c in range(labels.max() + 1 if len(labels) else 0):
+        m = labels == c
+        pix = np.unique(pixel_keys(lat[m], lon[m]))
+        clat, clon = float(lat[m].mean()), float(lon[m].mean())
+        out.append({
+            "n": int(m.sum()),
+            "frp": round(float(frp[m].sum()), 2),
+            "frp_max": round(float(frp[m].max()), 2),
+            "area_km2": round(pixel_area_km2(len(pix), clat), 3),
+            "lat": round(clat, 5), "lon": round(clon, 5),
+            "bbox": [round(float(lon[m].min()), 5), round(float(lat[m].min()), 5),
+                     round(float(lon[m].max()), 5), round(float(lat[m].max()), 5)],
+            "pixels": pix.tolist(),
+        })
+    return out
+
+
+# ---------------- cross-day linking ----------------
+def _bbox_touch(a, b, km):
+    lat0 = (a[1] + a[3] + b[1] + b[3]) / 4
+    dlat = km / KM_PER_DEG_LAT
+    dlon = km / (KM_PER_DEG_LON * np.cos(np.radians(lat0)))
+    return not (a[2] + dlon < b[0] or b[2] + dlon < a[0] or a[3] + dlat < b[1] or b[3] + dlat < a[1])
+
+
+def new_state():
+    # events: open tracks with per-day pixels; closed: {id: summary} of finished events
+    return {"version": 2, "through": None, "next_id": 1, "events": {}, "closed": {}}
+
+
+def add_day(state, date, clusters, link_km=LINK_KM, max_gap=MAX_GAP_DAYS):
+    """Link one day's clusters into the event tracks (state is updated in place)."""
+    dnum = day_number(date)
+    events = state["events"]
+    active = [eid for eid, ev in events.items() if dnum - day_number(ev["end"]) <= max_gap]
+    for cl in clusters:
+        hits = [eid for eid in active if eid in events and _bbox_touch(events[eid]["last_bbox"], cl["bbox"], link_km)]
+        if not hits:
+            eid = str(state["next_id"])
+            state["next_id"] += 1
+            events[eid] = {"id": int(eid), "start": date, "end": date, "days": [], "last_bbox": cl["bbox"]}
+            active.append(eid)
+        else:
+            # several tracks reached by one cluster -> merge into the oldest
+            hits.sort(key=lambda e: (events[e]["start"], int(e)))
+            eid = hits[0]
+            for other in hits[1:]:
+                _merge(events[eid], events.pop(other))
+        _append(events[eid], date, cl)
+    state["through"] = date
+
+
+def _fold(a, d):
+    # add day record d into a (same date); centroid weighted by detections
+    n = a["n"] + d["n"]
+    a["lat"] = round((a["lat"] * a["n"] + d["lat"] * d["n"]) / n, 5)
+    a["lon"] = round((a["lon"] * a["n"] + d["lon"] * d["n"]) / n, 5)
+    a["n"] = n
+    a["frp"] = round(a["frp"] + d["frp"], 2)
+    a["frp_max"] = max(a["frp_max"], d["frp_max"])
+    a["pixels"] = sorted(set(a["pixels"]).union(d["pixels"]))
+    a["area_km2"] = round(pixel_area_km2(len(a["pixels"]), a["lat"]), 3)
+
+
+def _union_bbox(b, c):
+    return [min(b[0], c[0]), min(b[1], c[1]), max(b[2], c[2]), max(b[3], c[3])]
+
+
+def _append(ev, date, cl):
+    day = {"date": date, **{k: cl[k] for k in ("n", "frp", "frp_max", "area_km2", "lat", "lon", "pixels")}}
+    if ev["days"] and ev["days"][-1]["date"] == date:
+        # second cluster of the same event on this day
+        _fold(ev["days"][-1], day)
+        ev["last_bbox"] = _union_bbox(ev["last_bbox"], cl["bbox"])
+    else:
+        ev["days"].append(day)
+        ev["last_bbox"] = cl["bbox"]
+    ev["end"] = max(ev["end"], date)
+
+
+def _merge(dst, src):
+    by_date = {d["date"]: d for d in dst["days"]}
+    for d in src["days"]:
+        if d["date"] in by_date:
+            _fold(by_date[d["date"]], d)
+        else:
+            by_date[d["date"]] = d
+    dst["days"] = [by_date[k] for k in sorted(by_date)]
+    if src["end"] > dst["end"]:
+        dst["last_bbox"] = src["last_bbox"]
+    elif src["end"] == dst["end"]:
+        dst["last_bbox"] = _union_bbox(dst["last_bbox"], src["last_bbox"])
+    dst["start"] = min(dst["start"], src["start"])
+    dst["end"] = max(dst["end"], src["end"])
+
+
+def summarize(ev):
+    # public summary; cumulative footprint = union of the daily ~375 m pixels so far
+    days = ev["days"]
+    lat = float(np.mean([d["lat"] for d in days]))
+    seen, growth = set(), []
+    for d in days:
+        seen.update(d["pixels"])
+        growth.append(round(pixel_area_km2(len(seen), lat), 3))
+    return {
+        "id": ev["id"],
+        "start": ev["start"],
+        "end": ev["end"],
+        "n_days": len(days),
+        "detections": int(sum(d["n"] for d in days)),
+        "total_frp": round(sum(d["frp"] for d in days), 2),
+        "max_frp": max(d["frp_max"] for d in days),
+        "footprint_km2": growth[-1],
+        "bbox": ev["last_bbox"],
+        "days": [{k: d[k] for k in ("date", "n", "frp", "area_km2")} for d in days],
+        "footprint_growth_km2": growth,
+        "path": [[d["lon"], d["lat"]] for d in days],
+    }
+
+
+def prune(state, recent_days=RECENT_DAYS, max_gap=MAX_GAP_DAYS):
+    """
+    Summarize events that no later day can link to (ended more than max_gap days
+    before state["through"]) and drop their pixels; closed summaries older than
+    recent_days are dropped as well (0 = keep them all).
+    """
+    through = day_number(state["through"])
+    for eid in [e for e, ev in state["events"].items() if through + 1 - day_number(ev["end"]) > max_gap]:
+        state["closed"][eid] = summarize(state["events"].pop(eid))
+    if recent_days:
+        cutoff = day_string(through - recent_days)
+        state["closed"] = {e: s for e, s in state["closed"].items() if s["end"] > cutoff}
+    return state
+
+
+# ---------------- driver ----------------
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return new_state()
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("version") != new_state()["version"]:
+        print(f"[WARN] old fire-event state format in {path}, re-clustering")
+        return new_state()
+    return state
+
+
+def save_json(path, obj):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json.dumps(obj, separators=(",", ":")))
+    os.replace(tmp, path)
+
+
+def update(archive_dir=ARCHIVE_DIR, state_path=STATE_PATH, out_path=OUT_PATH, rebuild=False, min_days=1,
+           recent_days=RECENT_DAYS):
+    """
+    Cluster the archive days after the checkpoint, re-checkpoint REPROCESS_DAYS
+    before the newest day and write the event summaries. Returns the summaries.
+    """
+    manifest = firms_archive.load_manifest(archive_dir)
+    months = sorted(manifest["months"])
+    if not months:
+        print("[WARN] empty FIRMS archive")
+        return []
+    state = new_state() if rebuild else load_state(state_path)
+    start = f"{months[0]}-01" if not state["through"] else day_string(day_number(state["through"]) + 1)
+    cols = firms_archive.load_range(start, firms_archive.month_end(months[-1]), archive_dir)
+    days = np.unique(cols["acq_date"])
+    if not len(days):
+        print("[INFO] no new FIRMS days since", state["through"])
+    checkpoint = None
+    if len(days):
+        # last day that can no longer change -> checkpoint after it
+        freeze_k = int(np.searchsorted(days, days[-1] - REPROCESS_DAYS, side="right")) - 1
+        bounds = np.searchsorted(cols["acq_date"], np.append(days, days[-1] + 1))
+    for k, d in enumerate(days):
+        day_cols = {key: v[bounds[k]:bounds[k + 1]] for key, v in cols.items()}
+        add_day(state, day_string(d), day_clusters(day_cols))
+        if k == freeze_k:
+            checkpoint = copy.deepcopy(state)
+    if checkpoint is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+        save_json(state_path, prune(checkpoint, recent_days))
+    if len(days):
+        print(f"[INFO] clustered {len(days)} day(s) {day_string(days[0])}..{day_string(days[-1])}"
+              + (f"; checkpoint through {checkpoint['through']}" if checkpoint else ""))
+
+    cutoff = day_string(day_number(state["through"]) - recent_days) if recent_days else ""
+    events = [summarize(ev) for ev in state["events"].values()] + list(state["closed"].values())
+    events = [e for e in events if e["n_days"] >= min_days and e["end"] > cutoff]
+    events.sort(key=lambda e: (e["end"], e["total_frp"]), reverse=True)
+    save_json(out_path, {"through": state["through"], "count": len(events), "events": events})
+    print(f"[WRITE] {len(events)} events -> {os.path.abspath(out_path)}")
+    return events
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Incremental FIRMS fire-event clustering")
+    ap.add_argument("--archive", default=ARCHIVE_DIR)
+    ap.add_argument("--state", default=STATE_PATH)
+    ap.add_argument("--out", default=OUT_PATH)
+    ap.add_argument("--rebuild", action="store_true", help="ignore the checkpoint and re-cluster everything")
+    ap.add_argument("--min-days", type=int, default=1, help="only publish events seen on at least N days")
+    ap.add_argument("--recent-days", type=int, default=RECENT_DAYS,
+                    help="only publish events active in the last N days (0 = all)")
+    args = ap.parse_args(argv)
+    update(args.archive, args.state, args.out, args.rebuild, args.min_days, args.recent_days)
+
+
+if __name__ == "__main__":
+    main()
+# %%
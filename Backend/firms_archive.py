@@ -0,0 +1,304 @@
+# Columnar FIRMS archive compacted from the daily GeoJSON snapshots.
+"""
+public/data/firms_ca_YYYY-MM-DD.geojson  ->  public/data/firms_archive/
+  - firms_YYYY-MM.npz   one partition per month (by acq_date), typed columns:
+        lat, lon, frp, bright_ti4 : float32
+        acq_date                  : int32 days since 1970-01-01
+        acq_time                  : int16 HHMM (UTC)
+        confidence, daynight,
+        satellite                 : uint8 codes (see CODES; 255 = unknown)
+        file_id                   : uint16 source snapshot (manifest["files"][name]["id"])
+    rows sorted by (acq_date, acq_time)
+  - manifest.json       source files (sha1/rows/months) + per-month row counts
+
+Incremental: only new or changed snapshots are parsed; the months they touch
+are rewritten (rows from a changed snapshot's previous version are dropped
+via file_id first). load_range() reads any date range as NumPy arrays.
+
+Usage:
+  python Backend/firms_archive.py [--src public/data] [--out public/data/firms_archive] [--rebuild]
+"""
+# %%
+import os
+import re
+import json
+import hashlib
+import argparse
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(REPO_ROOT, "public", "data")
+ARCHIVE_DIR = os.path.join(SRC_DIR, "firms_archive")
+MANIFEST = "manifest.json"
+DAILY_RE = re.compile(r"^firms_ca_(\d{4}-\d{2}-\d{2})\.geojson$")
+PARTITION_RE = re.compile(r"^firms_\d{4}-\d{2}\.npz$")
+
+# string property -> uint8 code (index in the list); 255 = missing/unknown
+CODES = {
+    "confidence": ["l", "n", "h"],
+    "daynight": ["N", "D"],
+    "satellite": ["N", "1", "2", "Terra", "Aqua"],  # SNPP, NOAA-20, NOAA-21, MODIS
+}
+UNKNOWN = 255
+
+COLUMNS = {
+    "lat": np.float32, "lon": np.float32, "frp": np.float32, "bright_ti4": np.float32,
+    "acq_date": np.int32, "acq_time": np.int16,
+    "confidence": np.uint8, "daynight": np.uint8, "satellite": np.uint8,
+    "file_id": np.uint16,
+}
+
+
+# ---------------- encode / decode ----------------
+def day_number(s):
+    # "YYYY-MM-DD" -> days since epoch
+    return int(np.datetime64(s, "D").astype(np.int64))
+
+
+def day_string(n):
+    return str(np.datetime64(int(n), "D"))
+
+
+def month_end(month):
+    # "YYYY-MM" -> ISO date of its last day
+    return str((np.datetime64(month, "M") + 1).astype("datetime64[D]") - 1)
+
+
+def month_of(day_num):
+    return str(np.datetime64(int(day_num), "D").astype("datetime64[M]"))
+
+
+def _code(table, value):
+    try:
+        return table.index(str(value))
+    except ValueError:
+        return UNKNOWN
+
+
+def decode(column, codes):
+    # uint8 codes -> object array of the original strings (None for unknown)
+    table = np.array(CODES[column] + [None] * (256 - len(CODES[column])), dtype=object)
+    return table[codes]
+
+
+def empty_columns():
+    return {k: np.empty(0, dtype=t) for k, t in COLUMNS.items()}
+
+
+def concat(parts):
+    parts = [p for p in parts if len(p["lat"])]
+    if not parts:
+        return empty_columns()
+    return {k: np.concatenate([p[k] for p in parts]).astype(t, copy=False) for k, t in COLUMNS.items()}
+
+
+def take(cols, idx):
+    return {k: v[idx] for k, v in cols.items()}
+
+
+def rows_from_properties(rows, file_id=0):
+    """
+    rows: iterable of (lat, lon, props) with FIRMS property names.
+    Returns a column dict (unsorted).
+    """
+    rows = list(rows)
+    n = len(rows)
+    cols = {k: np.empty(n, dtype=t) for k, t in COLUMNS.items()}
+    for i, (lat, lon, p) in enumerate(rows):
+        cols["lat"][i] = lat
+        cols["lon"][i] = lon
+        cols["frp"][i] = np.nan if p.get("frp") is None else float(p["frp"])
+        cols["bright_ti4"][i] = np.nan if p.get("bright_ti4") is None else float(p["bright_ti4"])
+        cols["acq_date"][i] = day_number(p["acq_date"])
+        cols["acq_time"][i] = int(p.get("acq_time") or 0)
+        for name, table in CODES.items():
+            cols[name][i] = _code(table, p.get(name))
+    cols["file_id"][:] = file_id
+    return cols
+
+
+def read_geojson(path, file_id=0):
+    with open(path, "r", encoding="utf-8") as f:
+        gj = json.load(f)
+    rows = []
+    for feat in gj.get("features", []):
+        geom = feat.get("geometry") or {}
+        if geom.get("type") != "Point":
+            continue
+        lon, lat = geom["coordinates"][:2]
+        rows.append((lat, lon, feat.get("properties") or {}))
+    return rows_from_properties(rows, file_id)
+
+
+def sort_rows(cols):
+    order = np.lexsort((cols["acq_time"], cols["acq_date"]))
+    return take(cols, order)
+
+
+# ---------------- partitions ----------------
+def partition_path(out_dir, month):
+    return os.path.join(out_dir, f"firms_{month}.npz")
+
+
+def load_partition(out_dir, month):
+    path = partition_path(out_dir, month)
+    if not os.path.exists(path):
+        return empty_columns()
+    with np.load(path) as z:
+        return {k: z[k] for k in COLUMNS}
+
+
+def save_partition(out_dir, month, cols):
+    path = partition_path(out_dir, month)
+    if len(cols["lat"]) == 0:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(tmp, **cols)
+    os.replace(tmp, path)
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"version": 1, "files": {}, "months": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(out_dir, manifest):
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def month_signature(manifest, month):
+    # changes whenever a snapshot contributing rows to the month is added or updated
+    files = sorted((name, meta["sha1"]) for name, meta in manifest["files"].items()
+                   if month in meta.get("months", []))
+    return hashlib.sha1(repr(files).encode("utf-8")).hexdigest()
+
+
+def _sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def upsert(out_dir, batches):
+    """
+    Merge new rows into the monthly partitions.
+    batches: list of (replace_file_ids, cols) — rows whose file_id is in
+    replace_file_ids are dropped from every touched month before appending.
+    Returns {month: rows}.
+    """
+    drop_ids = set()
+    new = concat([c for _, c in batches])
+    for ids, _ in batches:
+        drop_ids.update(ids)
+    manifest = load_manifest(out_dir)
+
+    months = {month_of(d) for d in np.unique(new["acq_date"])}
+    # months that hold rows from replaced snapshots must be rewritten too
+    for meta in manifest["files"].values():
+        if meta["id"] in drop_ids:
+            months.update(meta.get("months", []))
+
+    new_month = np.array([month_of(d) for d in new["acq_date"]], dtype=object) if len(new["lat"]) else None
+    counts = {}
+    for month in sorted(months):
+        old = load_partition(out_dir, month)
+        if drop_ids and len(old["lat"]):
+            old = take(old, ~np.isin(old["file_id"], list(drop_ids)))
+        add = take(new, new_month == month) if new_month is not None else empty_columns()
+        merged = sort_rows(concat([old, add]))
+        save_partition(out_dir, month, merged)
+        counts[month] = int(len(merged["lat"]))
+    return counts
+
+
+def compact(src_dir=SRC_DIR, out_dir=ARCHIVE_DIR, rebuild=False):
+    """
+    Add new/changed daily snapshots to the archive. Returns the updated manifest.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if rebuild:
+        for name in os.listdir(out_dir):
+            if PARTITION_RE.match(name) or name == MANIFEST:
+                os.remove(os.path.join(out_dir, name))
+    manifest = load_manifest(out_dir)
+    files = manifest["files"]
+    next_id = max([m["id"] for m in files.values()], default=-1) + 1
+
+    batches, changed = [], []
+    for name in sorted(os.listdir(src_dir)):
+        if not DAILY_RE.match(name):
+            continue
+        path = os.path.join(src_dir, name)
+        digest = _sha1(path)
+        prev = files.get(name)
+        if prev and prev["sha1"] == digest:
+            continue
+        fid = prev["id"] if prev else next_id
+        if not prev:
+            next_id += 1
+        cols = read_geojson(path, fid)
+        batches.append(({fid} if prev else set(), cols))
+        months = sorted({month_of(d) for d in np.unique(cols["acq_date"])})
+        changed.append((name, {"id": fid, "sha1": digest, "rows": int(len(cols["lat"])), "months": months}))
+
+    if not batches:
+        print("[INFO] archive up to date:", len(files), "snapshots")
+        return manifest
+
+    counts = upsert(out_dir, batches)
+    manifest = load_manifest(out_dir)
+    for name, meta in changed:
+        manifest["files"][name] = meta
+    for month, n in counts.items():
+        if n:
+            manifest["months"][month] = {"rows": n, "file": os.path.basename(partition_path(out_dir, month))}
+        else:
+            manifest["months"].pop(month, None)
+    save_manifest(out_dir, manifest)
+    print(f"[OK] archived {len(changed)} snapshot(s); months rewritten: {sorted(counts)}")
+    return manifest
+
+
+# ---------------- loader ----------------
+def load_range(start, end, archive_dir=ARCHIVE_DIR, columns=None):
+    """
+    Detections with start <= acq_date <= end (ISO date strings or date objects)
+    as a dict of NumPy arrays, reading only the monthly partitions in range.
+    """
+    d0, d1 = day_number(str(start)), day_number(str(end))
+    m0 = np.datetime64(str(start), "M")
+    m1 = np.datetime64(str(end), "M")
+    want = columns or list(COLUMNS)
+    parts = []
+    for m in np.arange(m0, m1 + 1):
+        path = partition_path(archive_dir, str(m))
+        if not os.path.exists(path):
+            continue
+        with np.load(path) as z:
+            days = z["acq_date"]
+            # rows are sorted by date, so the range is one contiguous slice
+            lo, hi = np.searchsorted(days, [d0, d1 + 1])
+            parts.append({k: z[k][lo:hi] for k in want})
+    if not parts:
+        return {k: np.empty(0, dtype=COLUMNS[k]) for k in want}
+    return {k: np.concatenate([p[k] for p in parts]) for k in want}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Compact daily FIRMS GeoJSON into a columnar monthly archive")
+    ap.add_argument("--src", default=SRC_DIR)
+    ap.add_argument("--out", default=ARCHIVE_DIR)
+    ap.add_argument("--rebuild", action="store_true", help="drop the archive and rebuild from all snapshots")
+    args = ap.parse_args(argv)
+    compact(args.src, args.out, args.rebuild)
+
+
+if __name__ == "__main__":
+    main()
+# %%
@@ -0,0 +1,244 @@
+# Spatial-temporal index over the FIRMS archive: "detections within R km of a point over a date range".
+"""
+Detections are bucketed by (day, grid cell) on a global lat/lon grid
+(cell = row * NCOLS + col, row/col = floor((lat + 90) / deg), floor((lon + 180) / deg))
+and stored sorted by the compound key day * NCELLS + cell, i.e. a CSR posting
+list: `keys` (unique buckets) + `starts` (offset of each bucket in the point
+columns). A query turns the radius bbox into one contiguous key range per
+(day, cell row), binary-searches those ranges and haversine-filters only the
+candidates, so cost follows the result size, not the archive size.
+
+Files:
+  public/data/firms_archive/firms_index.npz        (built from firms_archive)
+  public/data/firms_shards/index.json              {"cell_deg", "days": {date: ["row_col", ...]}}
+  public/data/firms_shards/<date>/<row>_<col>.json {"lat", "lon", "frp", "acq_time", "confidence"}
+
+Usage:
+  python Backend/firms_index.py build [--cell 0.1] [--shards public/data/firms_shards] [--shard-cell 1.0] [--shard-days 14]
+  python Backend/firms_index.py query <lat> <lon> [--radius 60] [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+# %%
+import os
+import sys
+import json
+import shutil
+import argparse
+
+import numpy as np
+
+import firms_archive
+from firms_archive import ARCHIVE_DIR, day_number, day_string
+
+INDEX_PATH = os.path.join(ARCHIVE_DIR, "firms_index.npz")
+SHARD_DIR = os.path.join(firms_archive.SRC_DIR, "firms_shards")
+CELL_DEG = 0.1
+SHARD_CELL_DEG = 1.0
+SHARD_DAYS = 14  # the progression view only looks back PROG_LAST_N_DAYS (7)
+EARTH_R_KM = 6371.0
+POINT_COLUMNS = ("lat", "lon", "frp", "acq_date", "acq_time", "confidence")
+
+
+def grid_dims(deg):
+    return int(round(180 / deg)), int(round(360 / deg))
+
+
+def cell_rc(lat, lon, deg):
+    nrows, ncols = grid_dims(deg)
+    row = np.clip(np.floor((np.asarray(lat, dtype=np.float64) + 90) / deg), 0, nrows - 1).astype(np.int64)
+    col = np.clip(np.floor((np.asarray(lon, dtype=np.float64) + 180) / deg), 0, ncols - 1).astype(np.int64)
+    return row, col
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dlat = p2 - p1
+    dlon = np.radians(np.asarray(lon2) - lon1)
+    a = np.sin(dlat / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_R_KM * np.arcsin(np.sqrt(a))
+
+
+def load_archive(archive_dir=ARCHIVE_DIR):
+    # every month listed in the manifest, as one column dict
+    months = sorted(firms_archive.load_manifest(archive_dir)["months"])
+    if not months:
+        return firms_archive.empty_columns()
+    return firms_archive.load_range(f"{months[0]}-01", firms_archive.month_end(months[-1]), archive_dir)
+
+
+class FirmsIndex:
+    def __init__(self, keys, starts, cols, cell_deg=CELL_DEG):
+        self.keys = keys        # int64, sorted unique day * NCELLS + cell
+        self.starts = starts    # int64, len(keys) + 1
+        self.cols = cols        # point columns sorted by key
+        self.cell_deg = cell_deg
+        self.nrows, self.ncols = grid_dims(cell_deg)
+        self.ncells = self.nrows * self.ncols
+
+    @classmethod
+    def build(cls, cols, cell_deg=CELL_DEG):
+        row, col = cell_rc(cols["lat"], cols["lon"], cell_deg)
+        nrows, ncols = grid_dims(cell_deg)
+        key = cols["acq_date"].astype(np.int64) * (nrows * ncols) + row * ncols + col
+        order = np.argsort(key, kind="stable")
+        key = key[order]
+        keys, starts = np.unique(key, return_index=True)
+        starts = np.append(starts, len(key)).astype(np.int64)
+        return cls(keys, starts, {k: cols[k][order] for k in POINT_COLUMNS}, cell_deg)
+
+    def save(self, path=INDEX_PATH):
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, keys=self.keys, starts=self.starts, cell_deg=np.float64(self.cell_deg),
+                            **self.cols)
+        os.replace(tmp, path)
+        print("[WRITE] index ->", os.path.abspath(path), f"({len(self.keys)} buckets, {self.starts[-1]} points)")
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with np.load(path) as z:
+            return cls(z["keys"], z["starts"], {k: z[k] for k in POINT_COLUMNS}, float(z["cell_deg"]))
+
+    def query(self, lat, lon, radius_km, start, end):
+        """
+        Detections within radius_km of (lat, lon) with start <= acq_date <= end.
+        Returns a column dict (plus "dist_km"), sorted by date/time.
+        """
+        d0, d1 = day_number(str(start)), day_number(str(end))
+        dlat = np.degrees(radius_km / EARTH_R_KM)
+        dlon = dlat / max(np.cos(np.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        r0, c0 = cell_rc(lat - dlat, lon - dlon, self.cell_deg)
+        r1, c1 = cell_rc(lat + dlat, lon + dlon, self.cell_deg)
+
+        # one contiguous key range per (day, cell row)
+        days = np.arange(d0, d1 + 1, dtype=np.int64)[:, None]
+        rows = np.arange(r0, r1 + 1, dtype=np.int64)[None, :]
+        base = days * self.ncells + rows * self.ncols
+        lo = np.searchsorted(self.keys, (base + c0).ravel(), side="left")
+        hi = np.searchsorted(self.keys, (base + c1).ravel(), side="right")
+        spans = [(self.starts[a], self.starts[b]) for a, b in zip(lo, hi) if b > a]
+        if spans:
+            idx = np.concatenate([np.arange(s, e) for s, e in spans])
+        else:
+            idx = np.empty(0, dtype=np.int64)
+
+        cand = {k: v[idx] for k, v in self.cols.items()}
+        dist = haversine_km(lat, lon, cand["lat"].astype(np.float64), cand["lon"].astype(np.float64))
+        keep = dist <= radius_km
+        out = {k: v[keep] for k, v in cand.items()}
+        out["dist_km"] = dist[keep].astype(np.float32)
+        order = np.lexsort((out["acq_time"], out["acq_date"]))
+        return {k: v[order] for k, v in out.items()}
+
+
+# ---------------- frontend shards ----------------
+def _round_list(a, nd):
+    return [round(float(x), nd) for x in a]
+
+
+def shard_payload(cols):
+    return {
+        "lat": _round_list(cols["lat"], 5),
+        "lon": _round_list(cols["lon"], 5),
+        "frp": [None if not np.isfinite(x) else round(float(x), 2) for x in cols["frp"]],
+        "acq_time": [int(x) for x in cols["acq_time"]],
+        "confidence": firms_archive.decode("confidence", cols["confidence"]).tolist(),
+    }
+
+
+def export_shards(cols, out_dir=SHARD_DIR, cell_deg=SHARD_CELL_DEG, keep_days=SHARD_DAYS):
+    """
+    Write one small JSON per (day, cell) the frontend can fetch directly, plus
+    index.json listing the occupied cells per day. Only the last keep_days days
+    (relative to the newest detection) are kept; older day folders are pruned.
+    Files whose content did not change are left alone so the daily commit only
+    carries new days.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if keep_days and len(cols["acq_date"]):
+        recent = cols["acq_date"] > cols["acq_date"].max() - keep_days
+        cols = {k: v[recent] for k, v in cols.items()}
+    row, col = cell_rc(cols["lat"], cols["lon"], cell_deg)
+    order = np.lexsort((col, row, cols["acq_date"]))
+    day, row, col = cols["acq_date"][order], row[order], col[order]
+    sorted_cols = {k: cols[k][order] for k in POINT_COLUMNS}
+
+    bucket = np.stack([day, row, col], axis=1)
+    cut = np.flatnonzero(np.any(np.diff(bucket, axis=0) != 0, axis=1)) + 1
+    bounds = np.concatenate([[0], cut, [len(day)]]) if len(day) else np.array([0])
+
+    listing, written = {}, 0
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        date = day_string(day[a])
+        name = f"{row[a]}_{col[a]}"
+        listing.setdefault(date, []).append(name)
+        text = json.dumps(shard_payload({k: v[a:b] for k, v in sorted_cols.items()}), separators=(",", ":"))
+        path = os.path.join(out_dir, date, name + ".json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                if f.read() == text:
+                    continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        written += 1
+
+    for name in os.listdir(out_dir):
+        path = os.path.join(out_dir, name)
+        if os.path.isdir(path) and name not in listing:
+            shutil.rmtree(path)
+        elif os.path.isdir(path):
+            for shard in os.listdir(path):
+                if shard[:-len(".json")] not in listing[name]:
+                    os.remove(os.path.join(path, shard))
+
+    with open(os.path.join(out_dir, "index.json"), "w", encoding="utf-8") as f:
+        f.write(json.dumps({"cell_deg": cell_deg, "days": listing}, separators=(",", ":")))
+    print(f"[WRITE] shards -> {os.path.abspath(out_dir)} ({written} updated, "
+          f"{sum(len(v) for v in listing.values())} total)")
+    return listing
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="FIRMS spatial-temporal index")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--archive", default=ARCHIVE_DIR)
+    b.add_argument("--cell", type=float, default=CELL_DEG)
+    b.add_argument("--shards", help="also export per-day/per-cell JSON shards to this directory")
+    b.add_argument("--shard-cell", type=float, default=SHARD_CELL_DEG)
+    b.add_argument("--shard-days", type=int, default=SHARD_DAYS, help="days kept in the shard export (0 = all)")
+    q = sub.add_parser("query")
+    q.add_argument("lat", type=float)
+    q.add_argument("lon", type=float)
+    q.add_argument("--radius", type=float, default=60.0, help="km")
+    q.add_argument("--start")
+    q.add_argument("--end")
+    q.add_argument("--index", default=INDEX_PATH)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        cols = load_archive(args.archive)
+        FirmsIndex.build(cols, args.cell).save(os.path.join(args.archive, os.path.basename(INDEX_PATH)))
+        if args.shards:
+            export_shards(cols, args.shards, args.shard_cell, args.shard_days)
+        return
+
+    idx = FirmsIndex.load(args.index)
+    if not args.end and not len(idx.keys):
+        raise SystemExit("[FAIL] empty index; pass --end")
+    # default: the last 7 days present in the index
+    end = args.end or day_string(idx.keys[-1] // idx.ncells)
+    start = args.start or day_string(day_number(end) - 6)
+    res = idx.query(args.lat, args.lon, args.radius, start, end)
+    feats = [{"lat": round(float(la), 5), "lon": round(float(lo), 5), "acq_date": day_string(d),
+              "acq_time": int(t), "frp": None if not np.isfinite(fr) else round(float(fr), 2),
+              "dist_km": round(float(dk), 2)}
+             for la, lo, d, t, fr, dk in zip(res["lat"], res["lon"], res["acq_date"], res["acq_time"],
+                                             res["frp"], res["dist_km"])]
+    json.dump({"start": start, "end": end, "radius_km": args.radius, "count": len(feats), "points": feats},
+              sys.stdout, indent=1)
+    print()
+
+
+if __name__ == "__main__":
+    main()
+# %%
@@ -0,0 +1,302 @@
+# Daily / weekly / monthly FIRMS detection-density and FRP rasters on a fixed CA grid.
+"""
+Per archive day, a 2-D histogram of detections on the FIRMS CA bbox at GRID_RES
+degrees (rows north -> south, like the wind grid):
+  count (uint16), frp_sum (float32), frp_max (float32)
+
+Weekly (ISO week) and monthly rasters are rolled up from the cached daily
+rasters (sum / sum / max), never from the points. Everything is incremental:
+  - only days in archive months whose snapshots changed are re-histogrammed,
+    and a daily raster is rewritten only when its content hash changes
+  - a week/month is rebuilt only when the hash list of its dailies changes
+
+Retention (KEEP_DAYS, counted back from the newest day): dailies older than
+90 days and weeklies older than a year are deleted, monthlies are kept. A
+week/month that starts before the daily window is frozen once built, since
+its dailies are no longer all there to roll up again.
+
+The rasters are not committed. --publish pushes them through storage_backend
+and deletes the pruned ones there too; CI keeps the local tree in the
+actions cache. Closed periods go out with CACHE_STATIC; open ones (any
+day/week/month reaching into the last OPEN_DAYS archive days, which later runs
+still rewrite) and index.json with CACHE_LIVE.
+
+Files (public/data/firms_rasters/):
+  daily/<YYYY-MM-DD>.npz, weekly/<YYYY-Www>.npz, monthly/<YYYY-MM>.npz
+  <period>/<key>_count.png, <key>_frp.png   colourized overlays (log scale, transparent = 0)
+  index.json   {"grid", "months": {month: archive sig}, "daily"/"weekly"/"monthly": {key: {"sig", "count_max", ...}}}
+
+Usage:
+  python Backend/firms_rasters.py [--out public/data/firms_rasters] [--rebuild]
+                                  [--keep-daily 90] [--keep-weekly 371] [--keep-monthly 0] [--publish [URL]]
+"""
+# %%
+import os
+import json
+import shutil
+import hashlib
+import argparse
+from datetime import date
+
+import numpy as np
+
+import firms_archive
+from firms_archive import ARCHIVE_DIR, day_string, month_signature
+from wind_format import write_png
+
+RASTER_DIR = os.path.join(firms_archive.SRC_DIR, "firms_rasters")
+CA_W, CA_S, CA_E, CA_N = -125.0, 32.0, -113.0, 43.5  # FIRMS fetch bbox
+GRID_RES = 0.05
+PERIODS = ("weekly", "monthly")
+KEEP_DAYS = {"daily": 90, "weekly": 371, "monthly": 0}  # 0 = keep all
+OPEN_DAYS = 2  # NRT detections for the newest day and the one before still arrive
+
+# dark red -> orange -> yellow -> white; alpha ramps in so sparse cells stay visible
+RAMP_POS = np.array([0.0, 0.35, 0.7, 1.0])
+RAMP_RGBA = np.array([
+    [128, 0, 0, 140],
+    [230, 60, 0, 200],
+    [255, 190, 0, 230],
+    [255, 255, 220, 255],
+], dtype=np.float64)
+
+
+def grid_spec(res=GRID_RES):
+    nx = int(round((CA_E - CA_W) / res))
+    ny = int(round((CA_N - CA_S) / res))
+    return {"bbox": [CA_W, CA_S, CA_E, CA_N], "res": res, "nx": nx, "ny": ny, "origin": "upper-left"}
+
+
+def day_raster(lat, lon, frp, grid):
+    """Vectorized 2-D histogram of one day's points -> (count, frp_sum, frp_max), rows north first."""
+    nx, ny, res = grid["nx"], grid["ny"], grid["res"]
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    frp = np.nan_to_num(np.asarray(frp, dtype=np.float64), nan=0.0)
+    # cell indices once; the histograms then bin on them so all three layers agree on edges
+    row = np.floor((CA_N - lat) / res)
+    col = np.floor((lon - CA_W) / res)
+    inside = (row >= 0) & (row < ny) & (col >= 0) & (col < nx)
+    row, col, frp = row[inside], col[inside], frp[inside]
+    rng = [[0, ny], [0, nx]]
+    count, _, _ = np.histogram2d(row, col, bins=[ny, nx], range=rng)
+    frp_sum, _, _ = np.histogram2d(row, col, bins=[ny, nx], range=rng, weights=frp)
+    frp_max = np.zeros((ny, nx))
+    np.maximum.at(frp_max, (row.astype(np.int64), col.astype(np.int64)), frp)
+    return count.astype(np.uint16), frp_sum.astype(np.float32), frp_max.astype(np.float32)
+
+
+def raster_hash(r):
+    h = hashlib.sha1()
+    for k in ("count", "frp_sum", "frp_max"):
+        h.update(np.ascontiguousarray(r[k]).tobytes())
+    return h.hexdigest()
+
+
+def colourize(a, vmax):
+    # log-scaled ramp; 0 stays fully transparent
+    a = np.asarray(a, dtype=np.float64)
+    t = np.log1p(a) / np.log1p(vmax) if vmax > 0 else np.zeros_like(a)
+    rgba = np.stack([np.interp(t, RAMP_POS, RAMP_RGBA[:, c]) for c in range(4)], axis=-1)
+    rgba[a <= 0] = 0
+    return np.rint(rgba).astype(np.uint8)
+
+
+def save_raster(out_dir, period, key, r):
+    """Write <period>/<key>.npz + the two PNG overlays; returns the index entry."""
+    d = os.path.join(out_dir, period)
+    os.makedirs(d, exist_ok=True)
+    tmp = os.path.join(d, f"{key}.tmp.npz")
+    np.savez_compressed(tmp, **r)
+    os.replace(tmp, os.path.join(d, f"{key}.npz"))
+    count_max = int(r["count"].max())
+    frp_max = float(r["frp_sum"].max())
+    write_png(os.path.join(d, f"{key}_count.png"), colourize(r["count"], count_max))
+    write_png(os.path.join(d, f"{key}_frp.png"), colourize(r["frp_sum"], frp_max))
+    return {"count_max": count_max, "count_total": int(r["count"].sum(dtype=np.int64)),
+            "frp_sum_max": round(frp_max, 2), "frp_max": round(float(r["frp_max"].max()), 2)}
+
+
+def load_raster(out_dir, period, key):
+    with np.load(os.path.join(out_dir, period, f"{key}.npz")) as z:
+        return {k: z[k] for k in ("count", "frp_sum", "frp_max")}
+
+
+def remove_raster(out_dir, period, key):
+    # -> removed paths relative to out_dir
+    removed = []
+    for suffix in (".npz", "_count.png", "_frp.png"):
+        path = os.path.join(out_dir, period, key + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+            removed.append(f"{period}/{key}{suffix}")
+    return removed
+
+
+def rollup(out_dir, keys):
+    # sum of counts / FRP, max of max FRP over cached daily rasters
+    acc = None
+    for k in keys:
+        r = load_raster(out_dir, "daily", k)
+        if acc is None:
+            acc = {"count": r["count"].astype(np.uint32), "frp_sum": r["frp_sum"].astype(np.float64),
+                   "frp_max": r["frp_max"].copy()}
+        else:
+            acc["count"] += r["count"]
+            acc["frp_sum"] += r["frp_sum"]
+            np.maximum(acc["frp_max"], r["frp_max"], out=acc["frp_max"])
+    return {"count": np.minimum(acc["count"], np.iinfo(np.uint32).max).astype(np.uint32),
+            "frp_sum": acc["frp_sum"].astype(np.float32), "frp_max": acc["frp_max"]}
+
+
+def period_key(period, day):
+    if period == "monthly":
+        return day[:7]
+    y, w, _ = date.fromisoformat(day).isocalendar()
+    return f"{y}-W{w:02d}"
+
+
+def period_start(period, key):
+    # first day (ISO) of a raster key
+    if period == "daily":
+        return key
+    if period == "monthly":
+        return f"{key}-01"
+    y, w = key.split("-W")
+    return date.fromisocalendar(int(y), int(w), 1).isoformat()
+
+
+def period_end(period, key):
+    # last day (ISO) of a raster key
+    if period == "daily":
+        return key
+    if period == "monthly":
+        return firms_archive.month_end(key)
+    return day_string(firms_archive.day_number(period_start(period, key)) + 6)
+
+
+def cutoff(newest, days):
+    # keys starting before this day fall outside a `days` window ("" = keep all)
+    return day_string(firms_archive.day_number(newest) - days + 1) if days and newest else ""
+
+
+def build(archive_dir=ARCHIVE_DIR, out_dir=RASTER_DIR, res=GRID_RES, rebuild=False, keep_days=None):
+    """Update the rasters; returns (index, removed file paths relative to out_dir)."""
+    keep_days = {**KEEP_DAYS, **(keep_days or {})}
+    grid = grid_spec(res)
+    index_path = os.path.join(out_dir, "index.json")
+    index = None
+    if not rebuild and os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    removed = []
+    if index is None or index.get("grid") != grid:
+        for period in ("daily",) + PERIODS:
+            for key in (index or {}).get(period, {}):
+                removed += [f"{period}/{key}{sfx}" for sfx in (".npz", "_count.png", "_frp.png")]
+        shutil.rmtree(out_dir, ignore_errors=True)
+        index = {"grid": grid, "months": {}, "daily": {}, "weekly": {}, "monthly": {}}
+    os.makedirs(out_dir, exist_ok=True)
+
+    # 1) daily rasters for archive months whose snapshots changed
+    manifest = firms_archive.load_manifest(archive_dir)
+    changed_days = 0
+    for month in sorted(manifest["months"]):
+        sig = month_signature(manifest, month)
+        if index["months"].get(month) == sig:
+            continue
+        cols = firms_archive.load_partition(archive_dir, month)
+        days, starts = np.unique(cols["acq_date"], return_index=True)
+        bounds = np.append(starts, len(cols["acq_date"]))
+        present = set()
+        for k, d in enumerate(days):
+            key = day_string(d)
+            present.add(key)
+            sl = slice(bounds[k], bounds[k + 1])
+            count, frp_sum, frp_max = day_raster(cols["lat"][sl], cols["lon"][sl], cols["frp"][sl], grid)
+            r = {"count": count, "frp_sum": frp_sum, "frp_max": frp_max}
+            h = raster_hash(r)
+            if index["daily"].get(key, {}).get("sig") == h:
+                continue
+            index["daily"][key] = {"sig": h, **save_raster(out_dir, "daily", key, r)}
+            changed_days += 1
+        for key in [k for k in index["daily"] if k.startswith(month) and k not in present]:
+            removed += remove_raster(out_dir, "daily", key)
+            index["daily"].pop(key)
+            changed_days += 1
+        index["months"][month] = sig
+
+    # 2) period rollups from the cached dailies; periods reaching before the daily window are frozen
+    newest = max(index["daily"], default=None)
+    daily_from = cutoff(newest, keep_days["daily"])
+    frozen = lambda period, key: key in index[period] and period_start(period, key) < daily_from
+    rebuilt = {p: 0 for p in PERIODS}
+    for period in PERIODS:
+        members = {}
+        for day in sorted(index["daily"]):
+            members.setdefault(period_key(period, day), []).append(day)
+        for key in [k for k in index[period] if k not in members and not frozen(period, k)]:
+            removed += remove_raster(out_dir, period, key)
+            index[period].pop(key)
+        for key, days in sorted(members.items()):
+            if frozen(period, key):
+                continue
+            sig = hashlib.sha1("|".join(index["daily"][d]["sig"] for d in days).encode("utf-8")).hexdigest()
+            if index[period].get(key, {}).get("sig") == sig:
+                continue
+            index[period][key] = {"sig": sig, "days": len(days), **save_raster(out_dir, period, key, rollup(out_dir, days))}
+            rebuilt[period] += 1
+
+    # 3) retention
+    pruned = 0
+    for period in ("daily",) + PERIODS:
+        since = cutoff(newest, keep_days[period])
+        for key in [k for k in index[period] if period_start(period, k) < since]:
+            removed += remove_raster(out_dir, period, key)
+            index[period].pop(key)
+            pruned += 1
+
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"), sort_keys=True)
+    print(f"[OK] rasters: {changed_days} daily, {rebuilt['weekly']} weekly, {rebuilt['monthly']} monthly updated, "
+          f"{pruned} pruned -> {os.path.abspath(out_dir)}")
+    # a rebuilt tree can rewrite the same paths; only report files that are really gone
+    return index, [r for r in removed if not os.path.exists(os.path.join(out_dir, *r.split("/")))]
+
+
+def publish_rasters(out_dir, removed, url=None):
+    # push the raster tree (unchanged objects skipped) and delete pruned rasters from storage
+    import storage_backend
+    (_, dest, cache), = [e for e in storage_backend.CYCLE if e[0] == "public/data/firms_rasters"]
+    with open(os.path.join(out_dir, "index.json"), "r", encoding="utf-8") as f:
+        open_from = cutoff(max(json.load(f)["daily"], default=None), OPEN_DAYS)
+
+    def live(rel):
+        # <period>/<key>.npz, <key>_count.png, <key>_frp.png; open periods are still rewritten
+        period, name = rel.split("/", 1)
+        return period_end(period, name.split(".")[0].split("_")[0]) >= open_from
+
+    storage_backend.publish_dir(out_dir, dest, removed, url, cache, live=live)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="FIRMS density / FRP rasters per day, week and month")
+    ap.add_argument("--archive", default=ARCHIVE_DIR)
+    ap.add_argument("--out", default=RASTER_DIR)
+    ap.add_argument("--res", type=float, default=GRID_RES, help="grid spacing (deg)")
+    ap.add_argument("--rebuild", action="store_true")
+    for period, days in KEEP_DAYS.items():
+        ap.add_argument(f"--keep-{period}", type=int, default=days, metavar="DAYS",
+                        help=f"delete {period} rasters older than DAYS (0 = keep all)")
+    ap.add_argument("--publish", nargs="?", const="", metavar="URL",
+                    help="push the rasters through storage_backend (default WILDFIRE_STORAGE)")
+    args = ap.parse_args(argv)
+    keep = {period: getattr(args, f"keep_{period}") for period in KEEP_DAYS}
+    _, removed = build(args.archive, args.out, args.res, args.rebuild, keep)
+    if args.publish is not None:
+        publish_rasters(args.out, removed, args.publish)
+
+
+if __name__ == "__main__":
+    main()
+# %%
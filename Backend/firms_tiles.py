@@ -0,0 +1,245 @@
+# z/x/y tiles of the FIRMS archive for viewport loading.
+"""
+Web-Mercator (slippy map) tiles, one tile set per month so every tile carries
+a time dimension (day of month per row) without growing with the archive:
+
+  public/data/firms_tiles/<YYYY-MM>/<z>/<x>/<y>.json
+    z >= POINT_ZOOM  points:     {"d": [day], "lat", "lon", "frp", "t": [HHMM], "c": [confidence]}
+    z <  POINT_ZOOM  aggregated: {"bins": BINS, "d": [day], "b": [bin = row * BINS + col],
+                                  "n": [count], "fmax": [max FRP]}
+  public/data/firms_tiles/index.json
+    {"minzoom", "maxzoom", "point_zoom", "bins",
+     "months": {"YYYY-MM": {"sig": ..., "tiles": {"z": ["x/y", ...]}}}}
+
+The client picks the months overlapping its date range, the zoom (clamped to
+maxzoom, higher zooms reuse maxzoom tiles) and the x/y in the viewport, and
+fetches only tiles listed in the index.
+
+Re-tiling is incremental: a month is re-tiled only when the set of archive
+snapshots feeding it changed (sha1s from the archive manifest), and within it
+only tile files whose bytes differ are rewritten; vanished tiles are removed.
+
+The tiles are not committed. --publish pushes them through storage_backend
+(unchanged objects are skipped by hash) and deletes the vanished ones there
+too; CI keeps the local tile tree in the actions cache so re-tiling stays
+incremental.
+
+Usage:
+  python Backend/firms_tiles.py [--out public/data/firms_tiles] [--minzoom 4] [--maxzoom 8] [--rebuild]
+                                [--publish [URL]]
+"""
+# %%
+import os
+import json
+import shutil
+import argparse
+
+import numpy as np
+
+import firms_archive
+from firms_archive import ARCHIVE_DIR, CODES, day_number, month_signature
+
+TILE_DIR = os.path.join(firms_archive.SRC_DIR, "firms_tiles")
+MINZOOM = 4
+MAXZOOM = 8
+POINT_ZOOM = 8
+BINS = 32
+
+
+def tile_xy(lat, lon, z):
+    # fractional tile coordinates (x to the east, y to the south)
+    n = 2.0 ** z
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -85.0511, 85.0511)
+    fx = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0 * n
+    fy = (1.0 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2.0 * n
+    return fx, fy
+
+
+def _groups(keys):
+    # sorted unique keys + slice bounds of each group in the key-sorted order
+    order = np.argsort(keys, kind="stable")
+    uniq, starts = np.unique(keys[order], return_index=True)
+    return order, uniq, np.append(starts, len(keys))
+
+
+def point_tiles(cols, z, day0):
+    fx, fy = tile_xy(cols["lat"], cols["lon"], z)
+    tx, ty = fx.astype(np.int64), fy.astype(np.int64)
+    order, uniq, bounds = _groups(tx * (1 << z) + ty)
+    conf = np.array(CODES["confidence"] + [""] * (256 - len(CODES["confidence"])), dtype=object)
+    out = {}
+    for k, key in enumerate(uniq):
+        idx = order[bounds[k]:bounds[k + 1]]
+        idx = idx[np.lexsort((cols["acq_time"][idx], cols["acq_date"][idx]))]
+        frp = cols["frp"][idx]
+        out[(int(key >> z), int(key & ((1 << z) - 1)))] = {
+            "d": (cols["acq_date"][idx] - day0 + 1).tolist(),
+            "lat": np.round(cols["lat"][idx].astype(np.float64), 5).tolist(),
+            "lon": np.round(cols["lon"][idx].astype(np.float64), 5).tolist(),
+            "frp": [None if not np.isfinite(f) else round(float(f), 2) for f in frp],
+            "t": cols["acq_time"][idx].tolist(),
+            "c": conf[cols["confidence"][idx]].tolist(),
+        }
+    return out
+
+
+def aggregate_tiles(cols, z, day0, bins=BINS):
+    fx, fy = tile_xy(cols["lat"], cols["lon"], z)
+    tx, ty = fx.astype(np.int64), fy.astype(np.int64)
+    bx = np.minimum(((fx - tx) * bins).astype(np.int64), bins - 1)
+    by = np.minimum(((fy - ty) * bins).astype(np.int64), bins - 1)
+    day = (cols["acq_date"] - day0 + 1).astype(np.int64)
+    frp = np.nan_to_num(cols["frp"].astype(np.float64), nan=0.0)
+
+    # one row per (tile, day, bin): count + max FRP
+    tile = tx * (1 << z) + ty
+    key = (tile * 32 + day) * (bins * bins) + by * bins + bx
+    uniq, inv, count = np.unique(key, return_inverse=True, return_counts=True)
+    fmax = np.zeros(len(uniq))
+    np.maximum.at(fmax, inv, frp)
+
+    u_tile = uniq // (32 * bins * bins)
+    u_day = (uniq // (bins * bins)) % 32
+    u_bin = uniq % (bins * bins)
+    out = {}
+    _, starts = np.unique(u_tile, return_index=True)
+    bounds = np.append(starts, len(uniq))
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        t = int(u_tile[a])
+        out[(t >> z, t & ((1 << z) - 1))] = {
+            "bins": bins,
+            "d": u_day[a:b].tolist(),
+            "b": u_bin[a:b].tolist(),
+            "n": count[a:b].tolist(),
+            "fmax": np.round(fmax[a:b], 2).tolist(),
+        }
+    return out
+
+
+def build_month(cols, month, minzoom=MINZOOM, maxzoom=MAXZOOM, point_zoom=POINT_ZOOM):
+    # -> {(z, x, y): payload}
+    day0 = day_number(f"{month}-01")
+    tiles = {}
+    for z in range(minzoom, maxzoom + 1):
+        make = point_tiles if z >= point_zoom else aggregate_tiles
+        for (x, y), payload in make(cols, z, day0).items():
+            tiles[(z, x, y)] = payload
+    return tiles
+
+
+def tile_files(root, out_dir):
+    # tile paths under root, relative to out_dir with "/" separators
+    out = []
+    for dirpath, _, names in os.walk(root):
+        out += [os.path.relpath(os.path.join(dirpath, n), out_dir).replace(os.sep, "/")
+                for n in names if n != "index.json"]
+    return sorted(out)
+
+
+def write_month(out_dir, month, tiles):
+    # write changed tiles, drop vanished ones; -> (written, removed paths, listing)
+    root = os.path.join(out_dir, month)
+    written, keep = 0, set()
+    for (z, x, y), payload in sorted(tiles.items()):
+        path = os.path.join(root, str(z), str(x), f"{y}.json")
+        keep.add(path)
+        text = json.dumps(payload, separators=(",", ":"))
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                if f.read() == text:
+                    continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        written += 1
+
+    removed = []
+    for dirpath, _, names in os.walk(root, topdown=False):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            if path not in keep:
+                os.remove(path)
+                removed.append(os.path.relpath(path, out_dir).replace(os.sep, "/"))
+        if dirpath != root and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+
+    listing = {}
+    for z, x, y in sorted(tiles):
+        listing.setdefault(str(z), []).append(f"{x}/{y}")
+    return written, removed, listing
+
+
+def load_index(out_dir):
+    path = os.path.join(out_dir, "index.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def retile(archive_dir=ARCHIVE_DIR, out_dir=TILE_DIR, minzoom=MINZOOM, maxzoom=MAXZOOM,
+           point_zoom=POINT_ZOOM, rebuild=False):
+    """Re-tile changed months; returns (re-tiled months, removed tile paths relative to out_dir)."""
+    manifest = firms_archive.load_manifest(archive_dir)
+    index = None if rebuild else load_index(out_dir)
+    layout = {"minzoom": minzoom, "maxzoom": maxzoom, "point_zoom": point_zoom, "bins": BINS}
+    removed = []
+    if index is None or any(index.get(k) != v for k, v in layout.items()):
+        if os.path.isdir(out_dir):
+            removed += tile_files(out_dir, out_dir)
+            shutil.rmtree(out_dir)
+        index = {**layout, "months": {}}
+    os.makedirs(out_dir, exist_ok=True)
+
+    for month in sorted(set(index["months"]) - set(manifest["months"])):
+        removed += tile_files(os.path.join(out_dir, month), out_dir)
+        shutil.rmtree(os.path.join(out_dir, month), ignore_errors=True)
+        index["months"].pop(month)
+
+    done = []
+    for month in sorted(manifest["months"]):
+        sig = month_signature(manifest, month)
+        if index["months"].get(month, {}).get("sig") == sig:
+            continue
+        cols = firms_archive.load_partition(archive_dir, month)
+        tiles = build_month(cols, month, minzoom, maxzoom, point_zoom)
+        written, gone, listing = write_month(out_dir, month, tiles)
+        removed += gone
+        index["months"][month] = {"sig": sig, "tiles": listing}
+        done.append(month)
+        print(f"[WRITE] tiles {month}: {len(tiles)} tiles, {written} written, {len(gone)} removed")
+
+    with open(os.path.join(out_dir, "index.json"), "w", encoding="utf-8") as f:
+        f.write(json.dumps(index, separators=(",", ":")))
+    print(f"[OK] re-tiled months: {done or 'none'}")
+    # a rebuilt tree can rewrite the same paths; only report tiles that are really gone
+    return done, sorted(set(removed) - set(tile_files(out_dir, out_dir)))
+
+
+def publish_tiles(out_dir, removed, url=None):
+    # push the tile tree (unchanged objects skipped) and delete vanished tiles from storage
+    import storage_backend
+    (_, dest, cache), = [e for e in storage_backend.CYCLE if e[0] == "public/data/firms_tiles"]
+    storage_backend.publish_dir(out_dir, dest, removed, url, cache)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Tile the FIRMS archive into per-month z/x/y JSON tiles")
+    ap.add_argument("--archive", default=ARCHIVE_DIR)
+    ap.add_argument("--out", default=TILE_DIR)
+    ap.add_argument("--minzoom", type=int, default=MINZOOM)
+    ap.add_argument("--maxzoom", type=int, default=MAXZOOM)
+    ap.add_argument("--point-zoom", type=int, default=POINT_ZOOM,
+                    help="zooms >= this carry raw points, lower zooms are aggregated")
+    ap.add_argument("--rebuild", action="store_true")
+    ap.add_argument("--publish", nargs="?", const="", metavar="URL",
+                    help="push the tiles through storage_backend (default WILDFIRE_STORAGE)")
+    args = ap.parse_args(argv)
+    _, removed = retile(args.archive, args.out, args.minzoom, args.maxzoom, args.point_zoom, args.rebuild)
+    if args.publish is not None:
+        publish_tiles(args.out, removed, args.publish)
+
+
+if __name__ == "__main__":
+    main()
+# %%
@@ -0,0 +1,109 @@
+# On-disk cache of trimmed HRRR GRIB files + content hashing of derived grids.
+"""
+Trimmed GRIBs (see fetch_RTwind.download_fields) are cached under
+  <WIND_CACHE_DIR>/grib/hrrr_<date>_<cycle>z_f<fh>_<fieldhash>.grib2
+keyed by (date, cycle, forecast hour, fields). A hit refreshes the file's
+mtime, and eviction drops files older than `max_age_h` and then the least
+recently used ones until the cache is under `max_bytes`. Eviction is
+serialized within the process and tolerates files another process (or a
+concurrent forecast-hour worker) removed first; fetch_cube turns per-fetch
+eviction off (auto_evict=False) and evicts once after its pool finishes.
+
+grid_hash() fingerprints the derived u/v grid + meta so the pipeline can skip
+rewriting (and committing) outputs when the cycle did not change anything.
+"""
+# %%
+import os
+import time
+import hashlib
+import threading
+
+import numpy as np
+
+from regrid_wind import CACHE_DIR
+
+GRIB_CACHE_DIR = os.path.join(CACHE_DIR, "grib")
+MAX_BYTES = int(os.environ.get("WIND_CACHE_MAX_MB", "512")) * 1024 * 1024
+MAX_AGE_H = float(os.environ.get("WIND_CACHE_MAX_AGE_H", "48"))
+_EVICT_LOCK = threading.Lock()
+
+
+class GribCache:
+    def __init__(self, root=GRIB_CACHE_DIR, max_bytes=MAX_BYTES, max_age_h=MAX_AGE_H, auto_evict=True):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_h = max_age_h
+        self.auto_evict = auto_evict
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, date_str, hour_str, fhour, fields):
+        fkey = hashlib.sha1("|".join(sorted(fields)).encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.root, f"hrrr_{date_str}_{hour_str}z_f{fhour:02d}_{fkey}.grib2")
+
+    def fetch(self, date_str, hour_str, fhour, fields, download):
+        """
+        Return the cached file for the key, calling download(tmp_path) on a miss.
+        The download goes to a temp name and is renamed into place when complete.
+        """
+        path = self.path(date_str, hour_str, fhour, fields)
+        try:
+            os.utime(path)  # hit: mark as recently used
+            print("[INFO] GRIB cache hit:", path)
+            return path
+        except FileNotFoundError:
+            pass
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            download(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        if self.auto_evict:
+            self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        # Age-based first, then LRU (oldest mtime) until under max_bytes
+        with _EVICT_LOCK:
+            now = time.time()
+            files = []
+            for name in os.listdir(self.root):
+                p = os.path.join(self.root, name)
+                if not name.endswith(".grib2"):
+                    continue
+                try:
+                    st = os.stat(p)
+                    if p != keep and (now - st.st_mtime) / 3600.0 > self.max_age_h:
+                        os.remove(p)
+                        print("[INFO] GRIB cache evict (age):", name)
+                        continue
+                except FileNotFoundError:
+                    continue  # removed by another process meanwhile
+                files.append((st.st_mtime, st.st_size, p))
+
+            total = sum(size for _, size, _ in files)
+            for _, size, p in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                if p == keep:
+                    continue
+                try:
+                    os.remove(p)
+                    print("[INFO] GRIB cache evict (size):", os.path.basename(p))
+                except FileNotFoundError:
+                    pass
+                total -= size
+            return total
+
+
+def grid_hash(u, v, meta):
+    # sha256 over shape, meta and the float32 bytes (NaN canonicalized)
+    h = hashlib.sha256()
+    h.update(repr(sorted(meta.items())).encode("utf-8"))
+    for a in (u, v):
+        a = np.ascontiguousarray(a, dtype=np.float32)
+        h.update(repr(a.shape).encode("utf-8"))
+        h.update(np.where(np.isnan(a), np.float32(np.nan), a).tobytes())
+    return h.hexdigest()
+# %%
@@ -0,0 +1,235 @@
+# Sliceable binary store of the yearly GOES fire exports for historical mode.
+"""
+fire_data/fire_data_<year>.geojson(.geojson)  ->  <out>/fire_<year>.bin + fire_<year>.json
+
+fire_<year>.bin   fixed 8-byte little-endian records, sorted by (day, cell, minute):
+    x, y    uint16  position quantized over BBOX (0..QMAX, y north -> south)
+    minute  uint16  minute of day (UTC)
+    count   uint16  pixel count from reduceToVectors
+fire_<year>.json  {"year", "n", "record", "bbox", "qmax", "grid",
+                   "days": [record offset of Jan 1 .. Dec 31, end],   day-of-year CSR
+                   "cells": {doy: [cell, start, n, cell, start, n, ...]}, coarse grid per day
+                   "source_sha1"}
+
+A day is one contiguous byte range (days[d-1] .. days[d]) and, inside it,
+each GRID_RES cell is a contiguous sub-range, so a client can fetch a day,
+a week (consecutive days) or a bbox on a day with HTTP Range requests
+instead of downloading the whole year. HisFireStore below slices the same
+files locally via np.memmap.
+
+Usage:
+  python Backend/his_fire_store.py build --year 2024 [--src <geojson>] [--upload]
+  python Backend/his_fire_store.py slice --year 2024 --start 2024-08-01 --end 2024-08-07 [--bbox W S E N]
+"""
+# %%
+import os
+import json
+import hashlib
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+from storage_backend import get_backend, bucket_name, publish, artifact, CACHE_LIVE, CACHE_STATIC
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORE_DIR = os.path.join(REPO_ROOT, "Data", "his_fire")
+SOURCE_OBJECT = "fire_data/fire_data_{year}.geojson.geojson"  # merged by fetch_his_fire.py
+STORE_PREFIX = "fire_data/store"
+BBOX = (-125.0, 32.0, -113.0, 43.5)  # W, S, E, N
+QMAX = 65535  # ~18 m x ~18 m steps over BBOX, well below the 2 km GOES pixel
+GRID_RES = 1.0
+
+RECORD = np.dtype([("x", "<u2"), ("y", "<u2"), ("minute", "<u2"), ("count", "<u2")])
+
+
+def grid_spec(res=GRID_RES):
+    w, s, e, n = BBOX
+    return {"res": res, "nx": int(np.ceil((e - w) / res)), "ny": int(np.ceil((n - s) / res))}
+
+
+def cell_of(lat, lon, grid):
+    w, _, _, n = BBOX
+    row = np.clip(((n - lat) / grid["res"]).astype(np.int64), 0, grid["ny"] - 1)
+    col = np.clip(((lon - w) / grid["res"]).astype(np.int64), 0, grid["nx"] - 1)
+    return row * grid["nx"] + col
+
+
+# ---------------- build ----------------
+def read_export(raw):
+    """GeoJSON bytes -> (lon, lat, datetime64[m], count) arrays."""
+    gj = json.loads(raw)
+    lon, lat, ts, cnt = [], [], [], []
+    for feat in gj.get("features", []):
+        geom = feat.get("geometry") or {}
+        props = feat.get("properties") or {}
+        if geom.get("type") != "Point" or not props.get("timestamp"):
+            continue
+        x, y = geom["coordinates"][:2]
+        lon.append(x)
+        lat.append(y)
+        ts.append(props["timestamp"].replace(" ", "T"))
+        cnt.append(props.get("count") or 1)
+    return (np.array(lon, dtype=np.float64), np.array(lat, dtype=np.float64),
+            np.array(ts, dtype="datetime64[m]"), np.array(cnt, dtype=np.int64))
+
+
+def build_store(raw, year, out_dir=STORE_DIR, res=GRID_RES):
+    """Write fire_<year>.bin/.json from one yearly export; returns the index (None if unchanged)."""
+    digest = hashlib.sha1(raw).hexdigest()
+    index_path = os.path.join(out_dir, f"fire_{year}.json")
+    grid = grid_spec(res)
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        if old.get("source_sha1") == digest and old.get("grid") == grid:
+            print(f"[INFO] {year}: store up to date")
+            return None
+
+    lon, lat, ts, cnt = read_export(raw)
+    w, s, e, n = BBOX
+    jan1 = np.datetime64(f"{year}-01-01", "D")
+    day = (ts.astype("datetime64[D]") - jan1).astype(np.int64)  # 0-based day of year
+    ndays = int((np.datetime64(f"{year + 1}-01-01", "D") - jan1).astype(np.int64))
+    keep = (lon >= w) & (lon <= e) & (lat >= s) & (lat <= n) & (day >= 0) & (day < ndays)
+    lon, lat, ts, cnt, day = lon[keep], lat[keep], ts[keep], cnt[keep], day[keep]
+    minute = (ts - ts.astype("datetime64[D]")).astype(np.int64)
+    cell = cell_of(lat, lon, grid)
+
+    order = np.lexsort((minute, cell, day))
+    rec = np.empty(len(order), dtype=RECORD)
+    rec["x"] = np.rint((lon[order] - w) / (e - w) * QMAX)
+    rec["y"] = np.rint((n - lat[order]) / (n - s) * QMAX)
+    rec["minute"] = minute[order]
+    rec["count"] = np.minimum(cnt[order], np.iinfo(np.uint16).max)
+    day, cell = day[order], cell[order]
+
+    # day CSR, then per-day runs of equal cells
+    days = np.searchsorted(day, np.arange(ndays + 1)).tolist()
+    cells = {}
+    if len(rec):
+        starts = np.flatnonzero(np.r_[True, (day[1:] != day[:-1]) | (cell[1:] != cell[:-1])])
+        lens = np.diff(np.r_[starts, len(rec)])
+        for st, ln in zip(starts.tolist(), lens.tolist()):
+            cells.setdefault(str(int(day[st]) + 1), []).extend([int(cell[st]), st, ln])
+
+    os.makedirs(out_dir, exist_ok=True)
+    tmp = os.path.join(out_dir, f"fire_{year}.bin.tmp")
+    rec.tofile(tmp)
+    os.replace(tmp, os.path.join(out_dir, f"fire_{year}.bin"))
+    index = {
+        "year": year, "n": int(len(rec)),
+        "record": {"size": RECORD.itemsize, "fields": list(RECORD.names), "type": "uint16", "endian": "little"},
+        "bbox": list(BBOX), "qmax": QMAX, "grid": grid,
+        "days": days, "cells": cells, "source_sha1": digest,
+    }
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    print(f"[WRITE] {year}: {len(rec)} detections, {len(cells)} days -> {os.path.abspath(out_dir)}")
+    return index
+
+
+# ---------------- slice ----------------
+class HisFireStore:
+    def __init__(self, year, store_dir=STORE_DIR):
+        with open(os.path.join(store_dir, f"fire_{year}.json"), "r", encoding="utf-8") as f:
+            self.index = json.load(f)
+        path = os.path.join(store_dir, f"fire_{year}.bin")
+        self.rec = np.memmap(path, dtype=RECORD, mode="r") if self.index["n"] else np.empty(0, dtype=RECORD)
+        self.year = year
+        self.jan1 = np.datetime64(f"{year}-01-01", "D")
+
+    def _doy(self, d):
+        return int((np.datetime64(str(d), "D") - self.jan1).astype(np.int64)) + 1
+
+    def _ranges(self, doy0, doy1, bbox):
+        days = self.index["days"]
+        doy0, doy1 = max(doy0, 1), min(doy1, len(days) - 1)
+        if bbox is None:
+            return [(days[doy0 - 1], days[doy1])] if doy1 >= doy0 else []
+        grid = self.index["grid"]
+        w, s, e, n = bbox
+        r0, c0 = divmod(int(cell_of(np.array([n]), np.array([w]), grid)[0]), grid["nx"])
+        r1, c1 = divmod(int(cell_of(np.array([s]), np.array([e]), grid)[0]), grid["nx"])
+        out = []
+        for doy in range(doy0, doy1 + 1):
+            runs = self.index["cells"].get(str(doy), [])
+            for k in range(0, len(runs), 3):
+                r, c = divmod(runs[k], grid["nx"])
+                if r0 <= r <= r1 and c0 <= c <= c1:
+                    out.append((runs[k + 1], runs[k + 1] + runs[k + 2]))
+        return out
+
+    def decode(self, rec, doy):
+        # records + 1-based day of year per row -> lon, lat, time, count
+        w, s, e, n = self.index["bbox"]
+        q = float(self.index["qmax"])
+        day = self.jan1 + (np.asarray(doy, dtype=np.int64) - 1).astype("timedelta64[D]")
+        return {
+            "lon": w + rec["x"] / q * (e - w),
+            "lat": n - rec["y"] / q * (n - s),
+            "time": day.astype("datetime64[m]") + rec["minute"].astype("timedelta64[m]"),
+            "count": rec["count"].astype(np.int64),
+        }
+
+    def slice(self, start, end=None, bbox=None):
+        """Detections with start <= date <= end (ISO dates), optionally inside bbox (W, S, E, N)."""
+        ranges = self._ranges(self._doy(start), self._doy(end or start), bbox)
+        days = np.asarray(self.index["days"])
+        recs = [np.asarray(self.rec[a:b]) for a, b in ranges]
+        # day of each row from the day CSR (offset k belongs to day d when days[d-1] <= k < days[d])
+        doys = [np.searchsorted(days, np.arange(a, b), side="right") for a, b in ranges]
+        rec = np.concatenate(recs) if recs else np.empty(0, dtype=RECORD)
+        doy = np.concatenate(doys) if doys else np.empty(0, dtype=np.int64)
+        out = self.decode(rec, doy)
+        if bbox is not None:
+            w, s, e, n = bbox
+            m = (out["lon"] >= w) & (out["lon"] <= e) & (out["lat"] >= s) & (out["lat"] <= n)
+            out = {k: v[m] for k, v in out.items()}
+        return out
+
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Sliceable binary store for the yearly GOES fire exports")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--year", type=int, nargs="+", required=True)
+    b.add_argument("--src", help="local export path (default: read gs://<bucket>/" + SOURCE_OBJECT + ")")
+    b.add_argument("--out", default=STORE_DIR)
+    b.add_argument("--res", type=float, default=GRID_RES, help="coarse grid spacing (deg)")
+    b.add_argument("--upload", action="store_true", help=f"upload the store to gs://<bucket>/{STORE_PREFIX}/")
+    q = sub.add_parser("slice")
+    q.add_argument("--year", type=int, required=True)
+    q.add_argument("--start", required=True)
+    q.add_argument("--end")
+    q.add_argument("--bbox", type=float, nargs=4, metavar=("W", "S", "E", "N"))
+    q.add_argument("--store", default=STORE_DIR)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "slice":
+        out = HisFireStore(args.year, args.store).slice(args.start, args.end, args.bbox)
+        print(f"[OK] {len(out['lat'])} detections")
+        for i in range(min(10, len(out["lat"]))):
+            print(f"  {out['time'][i]}  {out['lat'][i]:.4f}, {out['lon'][i]:.4f}  count={out['count'][i]}")
+        return
+
+    backend = get_backend(f"gs://{bucket_name()}") if (args.upload or not args.src) else None
+    for year in args.year:
+        if args.src:
+            with open(args.src, "rb") as f:
+                raw = f.read()
+        else:
+            raw = backend.read(SOURCE_OBJECT.format(year=year))
+        build_store(raw, year, args.out, args.res)
+        if args.upload:
+            # the .bin stays uncompressed so Range requests keep working; unchanged files are skipped.
+            # The current year is rebuilt as the export grows, so its .bin and index must not be
+            # cached for a day (a stale index would point at wrong byte ranges of a newer .bin)
+            cache = CACHE_LIVE if year >= datetime.utcnow().year else CACHE_STATIC
+            publish(backend, [artifact(os.path.join(args.out, name), f"{STORE_PREFIX}/{name}", cache)
+                              for name in (f"fire_{year}.bin", f"fire_{year}.json")])
+
+if __name__ == "__main__":
+    main()
+# %%
@@ -0,0 +1,304 @@
+# Interpolated PM2.5 surface + AQI classes on a regular California grid.
+"""
+Station PM2.5 (AirNow latest hour from fetch_smoke.py, optionally PurpleAir
+GeoJSON from the proxy) -> inverse-distance-weighted surface on GRID_RES
+degrees over the CA bbox (rows north -> south).
+
+Like regrid_wind.py, the interpolation weights depend only on the station
+locations and the grid, so they are built once per station set and cached
+(keyed by a hash of both; only the stable AirNow set is cached, the newest
+CACHE_MAX sets are kept):
+  idx (ny, nx, K) int32 station indices, w (ny, nx, K) float32 IDW weights
+AirNow readings are aligned onto the full site table from fetch_smoke.py, so
+the monitor set is fixed and each hour is one gather + weighted sum over the
+station values; stations missing a value that hour are masked and the
+remaining weights renormalized. PurpleAir sensors come and go every hour, so a
+surface that includes them builds its weights fresh, with the distance blocks
+held to BLOCK_BYTES whatever the sensor count.
+Cells farther than MAX_DIST_KM from every station are left empty.
+
+Outputs (public/data/smoke/):
+  pm25_latest.npz   pm25 uint16 (0.1 ug/m3 steps, 65535 = no data), aqi_class uint8 (255 = no data)
+  pm25_latest.png   AQI-class colours (same palette as js/smoke_mode.js), transparent = no data
+  pm25_latest.json  {"bbox", "res", "nx", "ny", "hour", "stations", "classes"}
+
+Usage:
+  python Backend/pm25_surface.py [--airnow public/data/airnow_latest.json] [--purpleair sensors.geojson]
+"""
+# %%
+import os
+import json
+import hashlib
+import argparse
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from wind_format import write_png
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AIRNOW_LATEST = os.path.join(REPO_ROOT, "public", "data", "airnow_latest.json")
+AIRNOW_SITES = os.path.join(REPO_ROOT, "Data", "airnow", "sites.json")  # fetch_smoke.py site table
+OUT_DIR = os.path.join(REPO_ROOT, "public", "data", "smoke")
+CACHE_DIR = os.environ.get("PM25_CACHE_DIR", os.path.join(tempfile.gettempdir(), "wildfire_pm25_cache"))
+CA_BBOX = (-125.0, 32.0, -113.0, 43.5)  # W, S, E, N
+GRID_RES = 0.05
+K = 8
+POWER = 2.0
+MAX_DIST_KM = 100.0
+BLOCK_BYTES = 16 << 20  # one float64 cell x station distance block (peak is a few times this)
+CACHE_MAX = 4           # cached weight sets (in memory and on disk)
+NODATA = 65535
+
+# EPA PM2.5 breakpoints (same table as js/smoke_mode.js pm25ToAQI)
+PM_LO = np.array([0.0, 12.1, 35.5, 55.5, 150.5, 250.5, 350.5])
+PM_HI = np.array([12.0, 35.4, 55.4, 150.4, 250.4, 350.4, 500.4])
+AQI_LO = np.array([0, 51, 101, 151, 201, 301, 401])
+AQI_HI = np.array([50, 100, 150, 200, 300, 400, 500])
+# colour classes: AQI upper bounds and the getAqiColor() palette
+CLASS_AQI = np.array([50, 100, 150, 200, 300])
+CLASS_NAMES = ["Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy", "Very Unhealthy", "Hazardous"]
+CLASS_RGBA = np.array([
+    [0, 228, 0, 150],
+    [255, 255, 0, 150],
+    [255, 126, 0, 160],
+    [255, 0, 0, 170],
+    [143, 63, 151, 180],
+    [126, 0, 35, 190],
+], dtype=np.uint8)
+
+
+def grid_spec(res=GRID_RES, bbox=CA_BBOX):
+    w, s, e, n = bbox
+    return {"bbox": list(bbox), "res": res,
+            "nx": int(round((e - w) / res)), "ny": int(round((n - s) / res))}
+
+
+def cell_centers(grid):
+    w, _, _, n = grid["bbox"]
+    res = grid["res"]
+    lons = w + (np.arange(grid["nx"]) + 0.5) * res
+    lats = n - (np.arange(grid["ny"]) + 0.5) * res
+    return np.meshgrid(lons, lats)
+
+
+def _xy_km(lat, lon, lat0):
+    # local equirectangular projection, good enough at CA scale for neighbour ranking and IDW
+    return (np.asarray(lon, dtype=np.float64) * 111.32 * np.cos(np.radians(lat0)),
+            np.asarray(lat, dtype=np.float64) * 110.574)
+
+
+# ---------------- weights ----------------
+def weights_key(lat, lon, grid, k, power, max_dist):
+    blob = json.dumps({"st": np.round(np.c_[lat, lon], 5).tolist(), "grid": grid,
+                       "k": k, "p": power, "d": max_dist}, sort_keys=True)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def build_weights(lat, lon, grid, k=K, power=POWER, max_dist=MAX_DIST_KM):
+    """
+    k nearest stations per cell (argpartition over chunked distance blocks) and
+    their 1/d^power weights (normalized per hour in apply_weights, once the
+    stations without a value are known). A cell sitting on a station takes it alone.
+    """
+    lon2d, lat2d = cell_centers(grid)
+    lat0 = 0.5 * (grid["bbox"][1] + grid["bbox"][3])
+    gx, gy = _xy_km(lat2d.ravel(), lon2d.ravel(), lat0)
+    sx, sy = _xy_km(lat, lon, lat0)
+    k = min(k, len(sx))
+    ncell = gx.size
+    idx = np.empty((ncell, k), dtype=np.int32)
+    dist = np.empty((ncell, k), dtype=np.float64)
+    chunk = max(1, BLOCK_BYTES // (8 * len(sx)))
+    for a in range(0, ncell, chunk):
+        b = min(a + chunk, ncell)
+        d2 = (gx[a:b, None] - sx[None, :]) ** 2 + (gy[a:b, None] - sy[None, :]) ** 2
+        part = np.argpartition(d2, k - 1, axis=1)[:, :k] if k < len(sx) else np.broadcast_to(
+            np.arange(k), (b - a, k))
+        idx[a:b] = part
+        dist[a:b] = np.sqrt(np.take_along_axis(d2, part, axis=1))
+
+    with np.errstate(divide="ignore"):
+        w = 1.0 / np.maximum(dist, 1e-6) ** power
+    exact = dist < 1e-3
+    hit = exact.any(axis=1)
+    w[hit] = exact[hit]
+    valid = dist.min(axis=1) <= max_dist
+    w[~valid] = 0.0
+    shape = (grid["ny"], grid["nx"], k)
+    return {"idx": idx.reshape(shape), "w": w.astype(np.float32).reshape(shape),
+            "valid": valid.reshape(shape[:2])}
+
+
+_MEMO = OrderedDict()  # LRU, CACHE_MAX entries
+
+
+def _prune_cache(cache_dir, keep=CACHE_MAX):
+    files = [os.path.join(cache_dir, f) for f in os.listdir(cache_dir)
+             if f.startswith("pm25_idw_") and f.endswith(".npz") and ".tmp" not in f]
+    for path in sorted(files, key=os.path.getmtime, reverse=True)[keep:]:
+        os.remove(path)
+
+
+def get_weights(lat, lon, grid, k=K, power=POWER, max_dist=MAX_DIST_KM, cache_dir=CACHE_DIR, cache=True):
+    # Load cached weights for this station set + grid or build + save them; cache=False just builds
+    if not cache:
+        return build_weights(lat, lon, grid, k, power, max_dist)
+    path = os.path.join(cache_dir, f"pm25_idw_{weights_key(lat, lon, grid, k, power, max_dist)}.npz")
+    if path in _MEMO:
+        _MEMO.move_to_end(path)
+        return _MEMO[path]
+    if os.path.exists(path):
+        with np.load(path) as z:
+            weights = {"idx": z["idx"], "w": z["w"], "valid": z["valid"]}
+        os.utime(path)
+    else:
+        weights = build_weights(lat, lon, grid, k, power, max_dist)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = path + f".{os.getpid()}.tmp.npz"
+        np.savez(tmp, **weights)
+        os.replace(tmp, path)
+        _prune_cache(cache_dir)
+        print("[INFO] IDW weights cached ->", path)
+    _MEMO[path] = weights
+    while len(_MEMO) > CACHE_MAX:
+        _MEMO.popitem(last=False)
+    return weights
+
+
+def apply_weights(values, weights):
+    # gather + weighted sum; stations without a value drop out and the rest are renormalized
+    v = np.asarray(values, dtype=np.float32)
+    ok = np.isfinite(v)
+    w = weights["w"] * ok[weights["idx"]]
+    num = (np.where(ok, v, 0.0)[weights["idx"]] * w).sum(axis=-1)
+    den = w.sum(axis=-1)
+    out = np.full(den.shape, np.nan, dtype=np.float32)
+    good = weights["valid"] & (den > 0)
+    out[good] = num[good] / den[good]
+    return out
+
+
+# ---------------- AQI ----------------
+def pm25_to_aqi(pm):
+    """Vectorized EPA piecewise-linear PM2.5 -> AQI (NaN stays NaN)."""
+    pm = np.asarray(pm, dtype=np.float64)
+    x = np.clip(np.floor(np.nan_to_num(pm, nan=0.0) * 10) / 10, 0.0, PM_HI[-1])
+    seg = np.minimum(np.searchsorted(PM_HI, x, side="left"), len(PM_HI) - 1)
+    aqi = (AQI_HI[seg] - AQI_LO[seg]) / (PM_HI[seg] - PM_LO[seg]) * (x - PM_LO[seg]) + AQI_LO[seg]
+    return np.where(np.isfinite(pm), np.rint(aqi), np.nan)
+
+
+def aqi_class(aqi):
+    # 0..5 as in getAqiColor(); 255 = no data
+    aqi = np.asarray(aqi, dtype=np.float64)
+    cls = np.searchsorted(CLASS_AQI, np.nan_to_num(aqi, nan=0.0), side="left").astype(np.uint8)
+    cls[~np.isfinite(aqi)] = 255
+    return cls
+
+
+def colourize(cls):
+    rgba = np.zeros(cls.shape + (4,), dtype=np.uint8)
+    ok = cls != 255
+    rgba[ok] = CLASS_RGBA[cls[ok]]
+    return rgba
+
+
+# ---------------- stations ----------------
+def load_airnow(path):
+    with open(path, "r", encoding="utf-8") as f:
+        d = json.load(f)
+    return (np.array(d["lat"], dtype=np.float64), np.array(d["lon"], dtype=np.float64),
+            np.array(d["pm25"], dtype=np.float64), d.get("hour"))
+
+
+def align_to_sites(lat, lon, pm25, sites_path=AIRNOW_SITES):
+    """
+    Place the latest readings onto the full AirNow site table (NaN where a site
+    has no reading), so the station set, and with it the cached weights, stays
+    fixed from hour to hour.
+    """
+    if not os.path.exists(sites_path):
+        return lat, lon, pm25
+    with open(sites_path, "r", encoding="utf-8") as f:
+        sites = [s for s in json.load(f) if s.get("lat") is not None and s.get("lon") is not None]
+    pos = {(round(float(s["lat"]), 4), round(float(s["lon"]), 4)): i for i, s in enumerate(sites)}
+    all_pm = np.full(len(sites), np.nan)
+    extra = []
+    for la, lo, v in zip(lat, lon, pm25):
+        i = pos.get((round(float(la), 4), round(float(lo), 4)))
+        if i is None:
+            extra.append((la, lo, v))
+        else:
+            all_pm[i] = v
+    s_lat = np.array([s["lat"] for s in sites], dtype=np.float64)
+    s_lon = np.array([s["lon"] for s in sites], dtype=np.float64)
+    if extra:
+        ela, elo, ev = (np.array(c, dtype=np.float64) for c in zip(*extra))
+        s_lat, s_lon, all_pm = np.r_[s_lat, ela], np.r_[s_lon, elo], np.r_[all_pm, ev]
+    return s_lat, s_lon, all_pm
+
+
+def load_purpleair(path):
+    # sensors GeoJSON from proxy/ (properties.pm2_5)
+    with open(path, "r", encoding="utf-8") as f:
+        gj = json.load(f)
+    lat, lon, pm = [], [], []
+    for feat in gj.get("features", []):
+        geom = feat.get("geometry") or {}
+        val = (feat.get("properties") or {}).get("pm2_5")
+        if geom.get("type") != "Point" or val is None:
+            continue
+        lon.append(geom["coordinates"][0])
+        lat.append(geom["coordinates"][1])
+        pm.append(val)
+    return np.array(lat, dtype=np.float64), np.array(lon, dtype=np.float64), np.array(pm, dtype=np.float64)
+
+
+def build_surface(lat, lon, pm25, grid, hour=None, out_dir=OUT_DIR, name="pm25_latest", cache=True):
+    # stations ordered by position so the same set always hashes to the same weights;
+    # cache=False for station sets that change every hour (PurpleAir)
+    order = np.lexsort((lon, lat))
+    lat, lon, pm25 = lat[order], lon[order], pm25[order]
+    weights = get_weights(lat, lon, grid, cache=cache)
+    surface = apply_weights(pm25, weights)
+    cls = aqi_class(pm25_to_aqi(surface))
+
+    os.makedirs(out_dir, exist_ok=True)
+    q = np.where(np.isfinite(surface), np.clip(np.rint(surface * 10), 0, NODATA - 1), NODATA).astype(np.uint16)
+    tmp = os.path.join(out_dir, f"{name}.tmp.npz")
+    np.savez_compressed(tmp, pm25=q, aqi_class=cls)
+    os.replace(tmp, os.path.join(out_dir, f"{name}.npz"))
+    write_png(os.path.join(out_dir, f"{name}.png"), colourize(cls))
+    meta = {**grid, "hour": hour, "stations": int(np.isfinite(pm25).sum()), "pm25_scale": 0.1,
+            "nodata": NODATA, "classes": CLASS_NAMES}
+    with open(os.path.join(out_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, separators=(",", ":"))
+    print(f"[WRITE] PM2.5 surface {grid['ny']}x{grid['nx']} from {meta['stations']} stations -> {out_dir}")
+    return surface, cls
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="IDW PM2.5 surface + AQI class raster for California")
+    ap.add_argument("--airnow", default=AIRNOW_LATEST, help="latest-hour JSON from fetch_smoke.py")
+    ap.add_argument("--sites", default=AIRNOW_SITES, help="AirNow site table from fetch_smoke.py")
+    ap.add_argument("--purpleair", help="sensors GeoJSON from the PurpleAir proxy (optional)")
+    ap.add_argument("--out", default=OUT_DIR)
+    ap.add_argument("--res", type=float, default=GRID_RES)
+    args = ap.parse_args(argv)
+
+    lat, lon, pm, hour = load_airnow(args.airnow)
+    lat, lon, pm = align_to_sites(lat, lon, pm, args.sites)
+    if args.purpleair:
+        plat, plon, ppm = load_purpleair(args.purpleair)
+        lat, lon, pm = np.r_[lat, plat], np.r_[lon, plon], np.r_[pm, ppm]
+    if not len(lat):
+        print("[WARN] no stations, surface not written")
+        return
+    build_surface(lat, lon, pm, grid_spec(args.res), hour, args.out, cache=not args.purpleair)
+
+
+if __name__ == "__main__":
+    main()
+# %%
@@ -0,0 +1,187 @@
+# Regrid HRRR (Lambert Conformal) fields onto a regular lat/lon grid.
+"""
+The HRRR CONUS grid never changes, so the interpolation weights from the
+Lambert grid to our California lat/lon grid are built once (inverse projection
+of every target cell into Lambert x/y) and cached on disk, keyed by a hash of
+the source grid definition + target grid + method. Each run is then a single
+vectorized gather:  out = sum(src.ravel()[idx] * w, axis=-1)
+
+HRRR u/v are relative to the Lambert grid axes, not to east/north. The weights
+also carry cos/sin of the rotation angle alpha = n * (lon - LoV) at every target
+point, and apply_wind() turns the gathered vectors earth-relative:
+  u' = u cos(alpha) + v sin(alpha),  v' = -u sin(alpha) + v cos(alpha)
+
+Usage:
+  weights = get_weights(grid_def_from_attrs(ds[uvar].attrs), target_grid(...))
+  u_ll, v_ll = apply_wind(u_lambert, v_lambert, weights)
+  t_ll = apply_weights(scalar_lambert, weights)
+"""
+# %%
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371229.0  # HRRR shapeOfTheEarth=6
+WEIGHTS_VERSION = 2         # bump when the cached weight layout changes (2: + rotation cos/sin)
+CACHE_DIR = os.environ.get("WIND_CACHE_DIR", os.path.join(tempfile.gettempdir(), "wildfire_wind_cache"))
+
+# in-process memo so concurrent forecast-hour workers share one copy of the weights
+_MEMO = {}
+_MEMO_LOCK = threading.Lock()
+
+# cfgrib attribute -> our grid-definition key (Lambert Conformal, GRIB2 template 3.30)
+_LAMBERT_ATTRS = {
+    "GRIB_Nx": "nx",
+    "GRIB_Ny": "ny",
+    "GRIB_DxInMetres": "dx_m",
+    "GRIB_DyInMetres": "dy_m",
+    "GRIB_LoVInDegrees": "lov",
+    "GRIB_Latin1InDegrees": "latin1",
+    "GRIB_Latin2InDegrees": "latin2",
+    "GRIB_latitudeOfFirstGridPointInDegrees": "lat1",
+    "GRIB_longitudeOfFirstGridPointInDegrees": "lon1",
+    "GRIB_jScansPositively": "j_pos",
+}
+
+
+def grid_def_from_attrs(attrs):
+    # Build the (hashable) Lambert grid definition from cfgrib variable attrs
+    if attrs.get("GRIB_gridType", "lambert") != "lambert":
+        raise ValueError(f"unsupported gridType: {attrs.get('GRIB_gridType')}")
+    missing = [k for k in _LAMBERT_ATTRS if k not in attrs]
+    if missing:
+        raise KeyError(f"Lambert grid attrs missing: {missing}")
+    g = {v: float(attrs[k]) for k, v in _LAMBERT_ATTRS.items()}
+    g["nx"], g["ny"], g["j_pos"] = int(g["nx"]), int(g["ny"]), int(g["j_pos"])
+    return g
+
+
+def target_grid(west, south, east, north, res):
+    # Regular lat/lon grid, rows north->south, cols west->east; bbox snapped to whole cells
+    nx = int(round((east - west) / res)) + 1
+    ny = int(round((north - south) / res)) + 1
+    return {
+        "bbox": [float(west), float(north - (ny - 1) * res), float(west + (nx - 1) * res), float(north)],
+        "nx": nx, "ny": ny, "dx": float(res), "dy": float(res),
+    }
+
+
+# ---------------- Lambert projection (spherical) ----------------
+def _lambert_consts(g):
+    p1, p2 = np.radians(g["latin1"]), np.radians(g["latin2"])
+    if abs(p1 - p2) < 1e-10:
+        n = np.sin(p1)
+    else:
+        n = np.log(np.cos(p1) / np.cos(p2)) / np.log(np.tan(np.pi / 4 + p2 / 2) / np.tan(np.pi / 4 + p1 / 2))
+    F = np.cos(p1) * np.tan(np.pi / 4 + p1 / 2) ** n / n
+    rho0 = EARTH_RADIUS_M * F / np.tan(np.pi / 4 + p1 / 2) ** n
+    return n, F, rho0
+
+
+def lambert_xy(lat, lon, g):
+    # Forward projection lat/lon (deg) -> Lambert x/y (m)
+    n, F, rho0 = _lambert_consts(g)
+    dlon = (np.asarray(lon, dtype=np.float64) - g["lov"] + 180.0) % 360.0 - 180.0
+    rho = EARTH_RADIUS_M * F / np.tan(np.pi / 4 + np.radians(lat) / 2) ** n
+    theta = n * np.radians(dlon)
+    return rho * np.sin(theta), rho0 - rho * np.cos(theta)
+
+
+def lambert_latlon(x, y, g):
+    # Inverse projection Lambert x/y (m) -> lat/lon (deg, -180..180)
+    n, F, rho0 = _lambert_consts(g)
+    dy = rho0 - y
+    rho = np.sign(n) * np.hypot(x, dy)
+    theta = np.arctan2(np.sign(n) * x, np.sign(n) * dy)
+    lat = np.degrees(2 * np.arctan((EARTH_RADIUS_M * F / rho) ** (1 / n)) - np.pi / 2)
+    lon = (g["lov"] + np.degrees(theta / n) + 180.0) % 360.0 - 180.0
+    return lat, lon
+
+
+# ---------------- weights ----------------
+def grid_key(src, dst, method):
+    blob = json.dumps({"src": src, "dst": dst, "method": method, "version": WEIGHTS_VERSION}, sort_keys=True)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def build_weights(src, dst, method="bilinear"):
+    """
+    Returns {"idx": int32 (ny,nx,k), "w": float32 (ny,nx,k), "valid": bool (ny,nx),
+             "cos", "sin": float32 (ny,nx) of the grid -> earth wind rotation angle}
+    with k=4 (bilinear) or k=1 (nearest), indices into the flattened source grid.
+    """
+    west, south, east, north = dst["bbox"]
+    lons = west + np.arange(dst["nx"]) * dst["dx"]
+    lats = north - np.arange(dst["ny"]) * dst["dy"]
+    lon2d, lat2d = np.meshgrid(lons, lats)
+
+    x, y = lambert_xy(lat2d, lon2d, src)
+    x1, y1 = lambert_xy(src["lat1"], src["lon1"], src)
+    fi = (x - x1) / src["dx_m"]
+    fj = (y - y1) / src["dy_m"] if src["j_pos"] else (y1 - y) / src["dy_m"]
+    snx, sny = src["nx"], src["ny"]
+
+    if method == "nearest":
+        i = np.rint(fi).astype(np.int64)
+        j = np.rint(fj).astype(np.int64)
+        valid = (i >= 0) & (i < snx) & (j >= 0) & (j < sny)
+        idx = np.where(valid, j * snx + i, 0)[..., None]
+        w = valid[..., None].astype(np.float32)
+    elif method == "bilinear":
+        i0 = np.floor(fi).astype(np.int64)
+        j0 = np.floor(fj).astype(np.int64)
+        valid = (i0 >= 0) & (i0 < snx - 1) & (j0 >= 0) & (j0 < sny - 1)
+        ti, tj = fi - i0, fj - j0
+        base = np.where(valid, j0 * snx + i0, 0)
+        idx = np.stack([base, base + 1, base + snx, base + snx + 1], axis=-1)
+        w = np.stack([(1 - ti) * (1 - tj), ti * (1 - tj), (1 - ti) * tj, ti * tj], axis=-1)
+        w = np.where(valid[..., None], w, 0.0)
+        idx = np.where(valid[..., None], idx, 0)
+    else:
+        raise ValueError(f"unknown regrid method: {method}")
+
+    # angle between the grid y axis and true north at each target point
+    n, _, _ = _lambert_consts(src)
+    alpha = n * np.radians((lon2d - src["lov"] + 180.0) % 360.0 - 180.0)
+    return {"idx": idx.astype(np.int32), "w": w.astype(np.float32), "valid": valid,
+            "cos": np.cos(alpha).astype(np.float32), "sin": np.sin(alpha).astype(np.float32)}
+
+
+def get_weights(src, dst, method="bilinear", cache_dir=CACHE_DIR):
+    # Load cached weights for (src, dst, method) or build + save them
+    path = os.path.join(cache_dir, f"regrid_{grid_key(src, dst, method)}.npz")
+    with _MEMO_LOCK:
+        if path in _MEMO:
+            return _MEMO[path]
+        if os.path.exists(path):
+            with np.load(path) as z:
+                weights = {k: z[k] for k in ("idx", "w", "valid", "cos", "sin")}
+        else:
+            weights = build_weights(src, dst, method)
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = path + f".{os.getpid()}.tmp.npz"
+            np.savez(tmp, **weights)
+            os.replace(tmp, path)
+            print("[INFO] regrid weights cached ->", path)
+        _MEMO[path] = weights
+        return weights
+
+
+def apply_weights(field, weights):
+    # One vectorized gather; cells outside the source grid become NaN
+    flat = np.asarray(field, dtype=np.float32).ravel()
+    out = (flat[weights["idx"]] * weights["w"]).sum(axis=-1)
+    out[~weights["valid"]] = np.nan
+    return out
+
+
+def apply_wind(u, v, weights):
+    # Gather grid-relative u/v, then rotate them to earth-relative (east, north)
+    ug, vg = apply_weights(u, weights), apply_weights(v, weights)
+    c, s = weights["cos"], weights["sin"]
+    return ug * c + vg * s, vg * c - ug * s
+# %%
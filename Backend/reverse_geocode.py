@@ -0,0 +1,314 @@
+# Offline county / city reverse-geocoder for fire detections (replaces per-feature filterBounds in GEE).
+"""
+Built once from CA county and place polygons (GeoJSON with a NAME property,
+e.g. TIGER/2018/Counties and TIGER/2018/Places filtered to STATEFP 06; see
+export_tiger() for a one-off download through Earth Engine):
+
+  Data/admin/ca_admin_index.npz
+    per layer (county, city): ring vertices (x, y), ring -> feature offsets,
+    feature names and a uniform-grid prefilter (cell -> candidate features, CSR)
+
+Lookup of N points: each point's grid cell gives a few candidate polygons.
+Cells lying entirely inside a polygon answer directly; the remaining
+(point, candidate) pairs are grouped by polygon and tested with a vectorized
+even-odd ray cast over that polygon's edges (holes and multipolygons work
+because every ring of the feature counts crossings). Points outside every
+polygon get None.
+
+Usage:
+  python Backend/reverse_geocode.py build --counties ca_counties.geojson --places ca_places.geojson
+  python Backend/reverse_geocode.py tag public/data/firms_ca_latest.geojson [--out tagged.geojson]
+"""
+# %%
+import os
+import json
+import argparse
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN_DIR = os.path.join(REPO_ROOT, "Data", "admin")
+INDEX_PATH = os.path.join(ADMIN_DIR, "ca_admin_index.npz")
+CA_BBOX = (-125.0, 32.0, -113.0, 43.5)
+CELL_DEG = 0.1
+LAYERS = ("county", "city")
+PIP_CHUNK = 4_000_000  # max point x edge comparisons per vectorized block
+
+
+def _ray_cast(px, py, x0, y0, x1, y1):
+    """Even-odd test of points (px, py) against edges (x0, y0) -> (x1, y1); chunked over points."""
+    px, py = np.asarray(px, dtype=np.float64), np.asarray(py, dtype=np.float64)
+    hit = np.zeros(len(px), dtype=bool)
+    step = max(1, PIP_CHUNK // max(len(x0), 1))
+    for a in range(0, len(px), step):
+        qx, qy = px[a:a + step, None], py[a:a + step, None]
+        crosses = (y0 > qy) != (y1 > qy)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            xint = x0 + (qy - y0) * (x1 - x0) / (y1 - y0)
+        hit[a:a + step] = (np.count_nonzero(crosses & (qx < xint), axis=1) % 2) == 1
+    return hit
+
+
+# ---------------- build ----------------
+def _polygons(geom):
+    if geom is None:
+        return []
+    if geom["type"] == "Polygon":
+        return [geom["coordinates"]]
+    if geom["type"] == "MultiPolygon":
+        return geom["coordinates"]
+    return []
+
+
+def build_layer(features, name_key="NAME", bbox=CA_BBOX, cell=CELL_DEG):
+    """
+    features: GeoJSON features (Polygon / MultiPolygon).
+    Returns a dict of flat arrays for one layer.
+    """
+    xs, ys, ring_start, ring_feat, names, fbox = [], [], [], [], [], []
+    n = 0
+    for feat in features:
+        rings = [np.asarray(r, dtype=np.float64)[:, :2] for poly in _polygons(feat.get("geometry"))
+                 for r in poly if len(r) >= 3]
+        if not rings:
+            continue
+        fid = len(names)
+        names.append(str((feat.get("properties") or {}).get(name_key, "")))
+        allpts = np.concatenate(rings)
+        fbox.append([allpts[:, 0].min(), allpts[:, 1].min(), allpts[:, 0].max(), allpts[:, 1].max()])
+        for r in rings:
+            if not np.array_equal(r[0], r[-1]):
+                r = np.vstack([r, r[:1]])  # close the ring
+            ring_start.append(n)
+            ring_feat.append(fid)
+            xs.append(r[:, 0])
+            ys.append(r[:, 1])
+            n += len(r)
+    ring_start.append(n)
+
+    # uniform grid prefilter: every cell overlapped by a feature bbox lists that feature.
+    # A cell no edge of the feature passes through is either fully inside or fully
+    # outside it; fully-outside cells are dropped and fully-inside ones flagged so
+    # their points skip the point-in-polygon test.
+    w, s, e, nn = bbox
+    nx, ny = int(np.ceil((e - w) / cell)), int(np.ceil((nn - s) / cell))
+    cells = [[] for _ in range(nx * ny)]
+    x_all = np.concatenate(xs) if xs else np.empty(0)
+    y_all = np.concatenate(ys) if ys else np.empty(0)
+    rs, rf = np.array(ring_start), np.array(ring_feat)
+    for fid, (x0, y0, x1, y1) in enumerate(fbox):
+        c0, c1 = max(int((x0 - w) // cell), 0), min(int((x1 - w) // cell), nx - 1)
+        r0, r1 = max(int((y0 - s) // cell), 0), min(int((y1 - s) // cell), ny - 1)
+        if c0 > c1 or r0 > r1:
+            continue
+        edges = np.concatenate([np.arange(rs[r], rs[r + 1] - 1) for r in np.flatnonzero(rf == fid)])
+        ex0, ex1 = x_all[edges], x_all[edges + 1]
+        ey0, ey1 = y_all[edges], y_all[edges + 1]
+        touched = np.zeros((r1 - r0 + 1, c1 - c0 + 1), dtype=bool)
+        ec0 = np.clip(((np.minimum(ex0, ex1) - w) // cell).astype(np.int64), c0, c1) - c0
+        ec1 = np.clip(((np.maximum(ex0, ex1) - w) // cell).astype(np.int64), c0, c1) - c0
+        er0 = np.clip(((np.minimum(ey0, ey1) - s) // cell).astype(np.int64), r0, r1) - r0
+        er1 = np.clip(((np.maximum(ey0, ey1) - s) // cell).astype(np.int64), r0, r1) - r0
+        for a, b, c, d in set(zip(er0.tolist(), er1.tolist(), ec0.tolist(), ec1.tolist())):
+            touched[a:b + 1, c:d + 1] = True
+        rr, cc = np.mgrid[r0:r1 + 1, c0:c1 + 1]
+        cx = w + (cc + 0.5) * cell
+        cy = s + (rr + 0.5) * cell
+        centre_in = _ray_cast(cx.ravel(), cy.ravel(), ex0, ey0, ex1, ey1).reshape(cx.shape)
+        for (i, j), t in np.ndenumerate(touched):
+            if t or centre_in[i, j]:
+                cells[(r0 + i) * nx + (c0 + j)].append((fid, 0 if t else 1))
+    cell_start = np.cumsum([0] + [len(c) for c in cells]).astype(np.int64)
+    cell_feat = np.array([f for c in cells for f, _ in c], dtype=np.int32)
+    cell_inside = np.array([flag for c in cells for _, flag in c], dtype=np.uint8)
+
+    return {
+        "x": x_all, "y": y_all,
+        "ring_start": np.array(ring_start, dtype=np.int64), "ring_feat": np.array(ring_feat, dtype=np.int32),
+        "names": np.array(names, dtype=object), "cell_start": cell_start, "cell_feat": cell_feat,
+        "cell_inside": cell_inside,
+        "grid": np.array([w, s, cell, nx, ny], dtype=np.float64),
+    }
+
+
+def save_index(layers, path=INDEX_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    flat = {}
+    for lname, arrs in layers.items():
+        for k, v in arrs.items():
+            flat[f"{lname}_{k}"] = v.astype(str) if k == "names" else v
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(tmp, **flat)
+    os.replace(tmp, path)
+    print("[WRITE] admin index ->", os.path.abspath(path),
+          {k: len(v["names"]) for k, v in layers.items()})
+
+
+def load_geojson_features(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("features", [])
+
+
+def export_tiger(out_dir=ADMIN_DIR, ee_module=None):
+    """One-off download of CA counties / places from Earth Engine TIGER tables as GeoJSON."""
+    import requests
+    ee = ee_module
+    if ee is None:
+        import ee
+        ee.Initialize()
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for lname, asset in (("counties", "TIGER/2018/Counties"), ("places", "TIGER/2018/Places")):
+        fc = ee.FeatureCollection(asset).filter(ee.Filter.eq("STATEFP", "06"))
+        url = fc.getDownloadURL(filetype="geojson", selectors=["NAME"])
+        path = os.path.join(out_dir, f"ca_{lname}.geojson")
+        resp = requests.get(url, timeout=300)
+        resp.raise_for_status()
+        with open(path, "wb") as f:
+            f.write(resp.content)
+        paths[lname] = path
+        print("[WRITE]", path)
+    return paths
+
+
+# ---------------- lookup ----------------
+class AdminIndex:
+    def __init__(self, path=INDEX_PATH):
+        with np.load(path, allow_pickle=False) as z:
+            self.layers = {l: {k[len(l) + 1:]: z[k] for k in z.files if k.startswith(l + "_")} for l in LAYERS}
+
+    @classmethod
+    def from_layers(cls, layers):
+        obj = cls.__new__(cls)
+        obj.layers = {l: {k: (v.astype(str) if k == "names" else v) for k, v in arrs.items()}
+                      for l, arrs in layers.items()}
+        return obj
+
+    def _lookup_layer(self, L, lon, lat):
+        w, s, cell, nx, ny = L["grid"]
+        nx, ny = int(nx), int(ny)
+        col = np.floor((lon - w) / cell).astype(np.int64)
+        row = np.floor((lat - s) / cell).astype(np.int64)
+        inside = (col >= 0) & (col < nx) & (row >= 0) & (row < ny)
+        cell_id = np.where(inside, row * nx + col, 0)
+
+        # expand (point, candidate feature) pairs from the grid CSR
+        lo = np.where(inside, L["cell_start"][cell_id], 0)
+        cnt = np.where(inside, L["cell_start"][cell_id + 1] - lo, 0)
+        pt = np.repeat(np.arange(len(lon)), cnt)
+        offs = np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+        pair = np.repeat(lo, cnt) + offs
+        feat = L["cell_feat"][pair]
+
+        result = np.full(len(lon), -1, dtype=np.int64)
+        if not len(pt):
+            return result
+        # cells entirely inside a polygon need no geometry test
+        sure = L["cell_inside"][pair] == 1
+        result[pt[sure]] = feat[sure]
+        pt, feat = pt[~sure], feat[~sure]
+        if not len(pt):
+            return result
+
+        order = np.argsort(feat, kind="stable")
+        pt, feat = pt[order], feat[order]
+        fids, starts = np.unique(feat, return_index=True)
+        bounds = np.append(starts, len(feat))
+        ring_of = {}
+        for r in np.flatnonzero(np.isin(L["ring_feat"], fids)):
+            ring_of.setdefault(int(L["ring_feat"][r]), []).append(r)
+
+        x, y, rs = L["x"], L["y"], L["ring_start"]
+        for k, fid in enumerate(fids):
+            pts = pt[bounds[k]:bounds[k + 1]]
+            pts = pts[result[pts] < 0]  # already placed in another polygon
+            if not len(pts):
+                continue
+            e = np.concatenate([np.arange(rs[r], rs[r + 1] - 1) for r in ring_of[int(fid)]])
+            hit = _ray_cast(lon[pts], lat[pts], x[e], y[e], x[e + 1], y[e + 1])
+            result[pts[hit]] = fid
+        return result
+
+    def lookup(self, lat, lon):
+        """
+        Vectorized county / city for arrays of lat, lon.
+        Returns {"county": object array, "city": object array} (None where no polygon contains the point).
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        out = {}
+        for lname, L in self.layers.items():
+            idx = self._lookup_layer(L, lon, lat)
+            names = np.append(L["names"].astype(object), None)
+            out[lname] = names[np.where(idx >= 0, idx, len(L["names"]))]
+        return out
+
+
+def feature_tagger(index):
+    """merge_tiles transform: adds county_name / city_name to Point features, passes others through."""
+    def tag(ft):
+        geom = ft.get("geometry") or {}
+        if geom.get("type") == "Point":
+            lon, lat = geom["coordinates"][:2]
+            res = index.lookup([lat], [lon])
+            props = ft.setdefault("properties", {})
+            props["county_name"] = res["county"][0]
+            props["city_name"] = res["city"][0]
+        return ft
+    return tag
+
+
+def tag_geojson(path, index, out_path=None):
+    """Add county_name / city_name to every Point feature of a GeoJSON file in one batch call."""
+    with open(path, "r", encoding="utf-8") as f:
+        gj = json.load(f)
+    feats = [ft for ft in gj.get("features", []) if (ft.get("geometry") or {}).get("type") == "Point"]
+    if feats:
+        coords = np.array([ft["geometry"]["coordinates"][:2] for ft in feats], dtype=np.float64)
+        res = index.lookup(coords[:, 1], coords[:, 0])
+        for ft, county, city in zip(feats, res["county"], res["city"]):
+            props = ft.setdefault("properties", {})
+            props["county_name"] = county
+            props["city_name"] = city
+    out_path = out_path or path
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(gj, separators=(",", ":")))
+    print(f"[WRITE] tagged {len(feats)} points -> {out_path}")
+    return gj
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Offline county/city reverse-geocoding")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--counties", default=os.path.join(ADMIN_DIR, "ca_counties.geojson"))
+    b.add_argument("--places", default=os.path.join(ADMIN_DIR, "ca_places.geojson"))
+    b.add_argument("--name-key", default="NAME")
+    b.add_argument("--cell", type=float, default=CELL_DEG)
+    b.add_argument("--out", default=INDEX_PATH)
+    sub.add_parser("export-tiger", help="one-off download of the TIGER polygons through Earth Engine")
+    t = sub.add_parser("tag")
+    t.add_argument("files", nargs="+")
+    t.add_argument("--out", help="output path (single input only); default rewrites in place")
+    t.add_argument("--index", default=INDEX_PATH)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "export-tiger":
+        export_tiger()
+    elif args.cmd == "build":
+        layers = {
+            "county": build_layer(load_geojson_features(args.counties), args.name_key, cell=args.cell),
+            "city": build_layer(load_geojson_features(args.places), args.name_key, cell=args.cell),
+        }
+        save_index(layers, args.out)
+    else:
+        if args.out and len(args.files) > 1:
+            raise SystemExit("[FAIL] --out needs a single input file")
+        index = AdminIndex(args.index)
+        for path in args.files:
+            tag_geojson(path, index, args.out)
+
+
+if __name__ == "__main__":
+    main()
+# %%
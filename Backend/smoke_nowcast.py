@@ -0,0 +1,289 @@
+# Short PM2.5 nowcast: semi-Lagrangian advection of the smoke surface by HRRR wind.
+"""
+Steps the interpolated PM2.5 surface (pm25_surface.py) forward a few hours on
+the HRRR wind grid (fetch_RTwind.py, 0.03 deg nodes, rows north -> south):
+
+  per step (DT_S seconds)
+    departure point  x_d = x - dt * u(x - dt/2 * u(x))    (midpoint back-trajectory,
+                                                           wind linear in time between cube hours)
+    c(x)            <- c(x_d)                             (bilinear, edges clamped)
+    c               *= exp(-dt / DECAY_H)                 (deposition / dilution)
+    c               += dt * S                             (S: FRP-weighted FIRMS detections)
+
+Everything is whole-grid NumPy gathers, so a 3-hour run at 10-minute steps on
+the ~3 km California grid takes well under a second on one core. Semi-Lagrangian
+steps stay stable at any Courant number, so DT_S is picked for accuracy only.
+
+Wind: Data/Wind/wind_ca_cube.bin (forecast cube, `fetch_RTwind.py --hours 0-6`).
+The cube is not committed; when there is no local copy it is downloaded from
+the bucket (WIND_CUBE_URL), else the single wind_ca_latest.bin is held steady.
+
+--members N runs an ensemble of wind perturbations (speed x0.85..1.15, direction
++-15 deg; member 0 unperturbed); --workers splits the members over a process
+pool. Frames are the ensemble mean.
+
+Outputs (public/data/smoke/):
+  pm25_nowcast.npz    pm25 uint16 (hours, ny, nx), 0.1 ug/m3 steps (65535 = no data)
+  pm25_nowcast_<h>h.png  AQI-class overlay per hour (palette of pm25_surface.py)
+  pm25_nowcast.json   {"bbox", "image_bbox", "dx", "dy", "nx", "ny", "start", "times", "hours", "members", ...}
+
+Usage:
+  python Backend/smoke_nowcast.py [--hours 3] [--dt 600] [--members 1] [--workers 1]
+"""
+# %%
+import os
+import json
+import time
+import argparse
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import firms_archive
+import pm25_surface
+from wind_format import read_wind_bin, write_png
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WIND_DIR = os.path.join(REPO_ROOT, "Data", "Wind")
+WIND_CUBE = os.path.join(WIND_DIR, "wind_ca_cube.bin")
+WIND_LATEST = os.path.join(WIND_DIR, "wind_ca_latest.bin")
+WIND_CUBE_URL = os.environ.get(
+    "WIND_CUBE_URL", "https://storage.googleapis.com/wildfire-monitor-data/wind/wind_ca_cube.bin")
+SURFACE = os.path.join(pm25_surface.OUT_DIR, "pm25_latest")
+OUT_DIR = pm25_surface.OUT_DIR
+HOURS = 3
+DT_S = 600.0
+DECAY_H = 12.0
+SOURCE_HOURS = 12         # FIRMS detections this recent act as sources
+EMIT_PER_MW = 0.05        # ug/m3 per hour added to a detection's cell per MW of FRP
+M_PER_DEG = 111320.0
+ISO = "%Y-%m-%dT%H:%M:%SZ"
+
+
+# ---------------- grids ----------------
+def node_axes(meta):
+    west, _, _, north = meta["bbox"]
+    lons = west + np.arange(meta["nx"]) * meta["dx"]
+    lats = north - np.arange(meta["ny"]) * meta["dy"]
+    return lons, lats
+
+
+def sample(f, fr, fc):
+    """Bilinear sample of 2-D `f` at fractional (row, col); points are clamped onto the grid."""
+    ny, nx = f.shape
+    fr = np.clip(fr, 0, ny - 1)
+    fc = np.clip(fc, 0, nx - 1)
+    r0 = np.minimum(fr.astype(np.int64), ny - 2)
+    c0 = np.minimum(fc.astype(np.int64), nx - 2)
+    tr = (fr - r0).astype(np.float32)
+    tc = (fc - c0).astype(np.float32)
+    top = f[r0, c0] * (1 - tc) + f[r0, c0 + 1] * tc
+    bot = f[r0 + 1, c0] * (1 - tc) + f[r0 + 1, c0 + 1] * tc
+    return top * (1 - tr) + bot * tr
+
+
+def load_surface(path, meta):
+    """pm25_surface output (cell centred) resampled onto the wind nodes; no data -> 0."""
+    with open(path + ".json", "r", encoding="utf-8") as f:
+        smeta = json.load(f)
+    with np.load(path + ".npz") as z:
+        q = z["pm25"]
+    pm = np.where(q == smeta["nodata"], 0.0, q * smeta["pm25_scale"]).astype(np.float32)
+    lons, lats = node_axes(meta)
+    w, _, _, n = smeta["bbox"]
+    fr = (n - lats) / smeta["res"] - 0.5
+    fc = (lons - w) / smeta["res"] - 0.5
+    FR, FC = np.meshgrid(fr, fc, indexing="ij")
+    return sample(pm, FR, FC), smeta.get("hour")
+
+
+def load_wind():
+    """-> (u, v, hours, meta, ref_time): u/v (nt, ny, nx), hours offsets of each frame from ref_time."""
+    if not os.path.exists(WIND_CUBE) and WIND_CUBE_URL:
+        try:
+            tmp = WIND_CUBE + ".part"
+            urllib.request.urlretrieve(WIND_CUBE_URL, tmp)
+            os.replace(tmp, WIND_CUBE)
+            print("[INFO] wind cube downloaded:", WIND_CUBE_URL)
+        except OSError as e:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            print(f"[WARN] wind cube download failed ({e}); using {os.path.basename(WIND_LATEST)}")
+    path = WIND_CUBE if os.path.exists(WIND_CUBE) else WIND_LATEST
+    u, v, header = read_wind_bin(path)
+    meta = header["meta"]
+    if u.ndim == 2:
+        u, v, hours = u[None], v[None], [0]
+        ref = meta.get("timestamp")
+    else:
+        hours = header["forecast_hours"]
+        ref = header.get("ref_time", meta.get("timestamp"))
+    print(f"[INFO] wind: {os.path.basename(path)} frames={len(hours)} grid={meta['ny']}x{meta['nx']}")
+    return np.nan_to_num(u), np.nan_to_num(v), np.asarray(hours, dtype=np.float64), meta, ref
+
+
+def fire_sources(meta, now, archive_dir=firms_archive.ARCHIVE_DIR, hours=SOURCE_HOURS):
+    """Emission field (ug/m3 per second) from FIRMS detections in the last `hours`."""
+    ny, nx = meta["ny"], meta["nx"]
+    src = np.zeros(ny * nx, dtype=np.float64)
+    start = now - timedelta(hours=hours)
+    cols = firms_archive.load_range(start.date().isoformat(), now.date().isoformat(), archive_dir,
+                                    ["lat", "lon", "frp", "acq_date", "acq_time"])
+    if not len(cols["lat"]):
+        return src.reshape(ny, nx).astype(np.float32), 0
+    t = (cols["acq_date"].astype("datetime64[D]").astype("datetime64[m]")
+         + (cols["acq_time"] // 100 * 60 + cols["acq_time"] % 100).astype("timedelta64[m]"))
+    recent = (t >= np.datetime64(start.replace(tzinfo=None), "m")) & (t <= np.datetime64(now.replace(tzinfo=None), "m"))
+    west, _, _, north = meta["bbox"]
+    r = np.rint((north - cols["lat"][recent]) / meta["dy"]).astype(np.int64)
+    c = np.rint((cols["lon"][recent] - west) / meta["dx"]).astype(np.int64)
+    frp = np.nan_to_num(cols["frp"][recent].astype(np.float64), nan=0.0)
+    inside = (r >= 0) & (r < ny) & (c >= 0) & (c < nx)
+    src += np.bincount(r[inside] * nx + c[inside], weights=frp[inside], minlength=ny * nx)
+    return (src * EMIT_PER_MW / 3600.0).reshape(ny, nx).astype(np.float32), int(inside.sum())
+
+
+# ---------------- engine ----------------
+def advect(c0, u, v, wind_hours, meta, hours=HOURS, dt=DT_S, src=None, decay_h=DECAY_H,
+           t0_h=0.0, scale=1.0, rotate_deg=0.0):
+    """
+    Semi-Lagrangian run from c0; returns (hours, ny, nx) float32 frames at +1h .. +hours.
+    u/v (nt, ny, nx) m/s at wind_hours; t0_h is the start offset into that axis.
+    scale/rotate_deg perturb the wind (ensemble members).
+    """
+    ny, nx = c0.shape
+    _, lats = node_axes(meta)
+    # m/s -> grid cells/s (cols east, rows south)
+    to_col = (1.0 / (M_PER_DEG * np.cos(np.radians(lats)) * meta["dx"]))[:, None].astype(np.float32)
+    to_row = np.float32(-1.0 / (M_PER_DEG * meta["dy"]))
+    a = np.radians(rotate_deg)
+    ca, sa = np.float32(np.cos(a) * scale), np.float32(np.sin(a) * scale)
+    R, C = np.meshgrid(np.arange(ny, dtype=np.float32), np.arange(nx, dtype=np.float32), indexing="ij")
+
+    def velocity(t_h):
+        # wind linearly interpolated in time, in grid cells/s
+        k = int(np.clip(np.searchsorted(wind_hours, t_h, side="right") - 1, 0, len(wind_hours) - 1))
+        if k + 1 < len(wind_hours):
+            w = np.float32((t_h - wind_hours[k]) / (wind_hours[k + 1] - wind_hours[k]))
+            w = np.clip(w, 0, 1)
+            uu = u[k] * (1 - w) + u[k + 1] * w
+            vv = v[k] * (1 - w) + v[k + 1] * w
+        else:
+            uu, vv = u[k], v[k]
+        ur, vr = uu * ca - vv * sa, uu * sa + vv * ca
+        return ur * to_col, vr * to_row
+
+    c = c0.astype(np.float32).copy()
+    decay = np.float32(np.exp(-dt / (decay_h * 3600.0))) if decay_h else np.float32(1.0)
+    add = None if src is None else (src * np.float32(dt)).astype(np.float32)
+    steps_per_h = int(round(3600.0 / dt))
+    frames = np.empty((hours, ny, nx), dtype=np.float32)
+    t = t0_h
+    for h in range(hours):
+        for _ in range(steps_per_h):
+            vc, vr = velocity(t + dt / 7200.0)  # wind at the step midpoint
+            # midpoint back-trajectory
+            mr = R - 0.5 * dt * vr
+            mc = C - 0.5 * dt * vc
+            dr = R - dt * sample(vr, mr, mc)
+            dc = C - dt * sample(vc, mr, mc)
+            c = sample(c, dr, dc) * decay
+            if add is not None:
+                c += add
+            t += dt / 3600.0
+        frames[h] = c
+    return frames
+
+
+def _member(args):
+    c0, u, v, wind_hours, meta, kw = args
+    return advect(c0, u, v, wind_hours, meta, **kw)
+
+
+def member_params(n, seed=0):
+    # member 0 unperturbed, the rest speed x0.85..1.15 and direction +-15 deg
+    rng = np.random.default_rng(seed)
+    out = [(1.0, 0.0)]
+    for _ in range(n - 1):
+        out.append((float(rng.uniform(0.85, 1.15)), float(rng.uniform(-15.0, 15.0))))
+    return out
+
+
+def run_ensemble(c0, u, v, wind_hours, meta, members=1, workers=1, **kw):
+    jobs = [(c0, u, v, wind_hours, meta, {**kw, "scale": s, "rotate_deg": r}) for s, r in member_params(members)]
+    if workers > 1 and members > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_member, jobs))
+    else:
+        results = [_member(j) for j in jobs]
+    return np.mean(results, axis=0) if len(results) > 1 else results[0]
+
+
+# ---------------- outputs ----------------
+def write_outputs(frames, meta, start, out_dir=OUT_DIR, extra=None):
+    os.makedirs(out_dir, exist_ok=True)
+    q = np.clip(np.rint(frames * 10), 0, pm25_surface.NODATA - 1).astype(np.uint16)
+    tmp = os.path.join(out_dir, "pm25_nowcast.tmp.npz")
+    np.savez_compressed(tmp, pm25=q)
+    os.replace(tmp, os.path.join(out_dir, "pm25_nowcast.npz"))
+    for h in range(len(frames)):
+        cls = pm25_surface.aqi_class(pm25_surface.pm25_to_aqi(frames[h]))
+        cls[frames[h] < 0.05] = 255  # keep clean air transparent
+        write_png(os.path.join(out_dir, f"pm25_nowcast_{h + 1}h.png"), pm25_surface.colourize(cls))
+    w, s, e, n = meta["bbox"]
+    hx, hy = meta["dx"] / 2, meta["dy"] / 2
+    doc = {
+        "bbox": meta["bbox"], "image_bbox": [w - hx, s - hy, e + hx, n + hy],
+        "dx": meta["dx"], "dy": meta["dy"], "nx": meta["nx"], "ny": meta["ny"],
+        "start": start.strftime(ISO),
+        "times": [(start + timedelta(hours=h + 1)).strftime(ISO) for h in range(len(frames))],
+        "hours": len(frames), "pm25_scale": 0.1, "nodata": pm25_surface.NODATA, **(extra or {}),
+    }
+    with open(os.path.join(out_dir, "pm25_nowcast.json"), "w", encoding="utf-8") as f:
+        json.dump(doc, f, separators=(",", ":"))
+    print(f"[WRITE] nowcast {len(frames)}h -> {out_dir}")
+    return doc
+
+
+def _parse_time(s):
+    if not s:
+        return None
+    s = s.rstrip("Z")
+    fmt = "%Y-%m-%dT%H" if len(s) == 13 else "%Y-%m-%dT%H:%M:%S"
+    return datetime.strptime(s, fmt).replace(tzinfo=timezone.utc)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Semi-Lagrangian PM2.5 smoke nowcast")
+    ap.add_argument("--hours", type=int, default=HOURS)
+    ap.add_argument("--dt", type=float, default=DT_S, help="step (s); must divide an hour")
+    ap.add_argument("--decay-h", type=float, default=DECAY_H, help="e-folding time (h); 0 = none")
+    ap.add_argument("--no-sources", action="store_true", help="skip FIRMS emission sources")
+    ap.add_argument("--members", type=int, default=1)
+    ap.add_argument("--workers", type=int, default=1, help="process pool size for ensemble members")
+    ap.add_argument("--surface", default=SURFACE, help="pm25_surface output path without extension")
+    ap.add_argument("--out", default=OUT_DIR)
+    args = ap.parse_args(argv)
+
+    u, v, wind_hours, meta, ref = load_wind()
+    c0, pm_hour = load_surface(args.surface, meta)
+    start = _parse_time(pm_hour) or datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    ref_t = _parse_time(ref)
+    t0_h = max(0.0, (start - ref_t).total_seconds() / 3600.0) if ref_t else 0.0
+
+    src, n_src = (None, 0) if args.no_sources else fire_sources(meta, start)
+    t = time.perf_counter()
+    frames = run_ensemble(c0, u, v, wind_hours, meta, args.members, args.workers,
+                          hours=args.hours, dt=args.dt, src=src, decay_h=args.decay_h, t0_h=t0_h)
+    print(f"[OK] {args.hours}h x {args.members} member(s) on {meta['ny']}x{meta['nx']} "
+          f"in {time.perf_counter() - t:.2f}s ({n_src} fire sources)")
+    write_outputs(frames, meta, start, args.out,
+                  {"members": args.members, "dt_s": args.dt, "decay_h": args.decay_h, "fire_sources": n_src,
+                   "wind_ref_time": ref})
+
+
+if __name__ == "__main__":
+    main()
+# %%
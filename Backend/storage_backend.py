@@ -0,0 +1,344 @@
+# One storage layer for published artifacts: GCS bucket or local directory.
+"""
+  backend = get_backend()            # WILDFIRE_STORAGE, default gs://wildfire-monitor-data
+  backend = get_backend("file:///tmp/out")   # or a plain path: local filesystem (tests, dry runs)
+
+  backend.put("smoke_contours/airnow_latest.json", path_or_bytes)  # -> "uploaded" | "skipped"
+  backend.read("fire_data/x.geojson") -> bytes
+  backend.delete("fire/firms_tiles/2025-08/8/43/101.json") -> True if it existed
+  publish(backend, [artifact(src, dest), ...], max_workers=8)            # batched, concurrent
+
+Uploads are skipped when the stored object already has the same content
+(GCS: MD5, or CRC32C for composite objects; local: MD5 of the file) and the
+same content-type / cache-control; a metadata-only difference is patched in
+place. JSON/GeoJSON is stored gzip-encoded (Content-Encoding: gzip, mtime 0 so
+the same payload always hashes the same); GCS serves it decompressed to
+clients that do not accept gzip.
+
+The GCS client is created once per process and shared by all threads, with
+its HTTP connection pool sized for the upload workers.
+
+Usage:
+  python Backend/storage_backend.py publish [--dest gs://bucket | DIR] [--only wind smoke fire] [--workers 8] [--dry-run]
+"""
+# %%
+import os
+import io
+import gzip
+import base64
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_URL = os.environ.get("WILDFIRE_STORAGE", "gs://wildfire-monitor-data")
+POOL_SIZE = 16
+
+# cache-control per artifact class
+CACHE_LIVE = "public, max-age=300"          # refreshed every cycle
+CACHE_STATIC = "public, max-age=86400"      # dated / immutable-ish files
+GZIP_EXT = (".json", ".geojson")
+CONTENT_TYPES = {
+    ".json": "application/json", ".geojson": "application/geo+json", ".png": "image/png",
+    ".bin": "application/octet-stream", ".npz": "application/octet-stream",
+}
+
+
+def bucket_name(url=DEFAULT_URL):
+    # "gs://name[/prefix]" -> "name" (Earth Engine exports write to the bucket directly)
+    if not url.startswith("gs://"):
+        raise ValueError(f"not a GCS storage url: {url}")
+    return url[5:].split("/", 1)[0]
+
+
+def guess_content_type(path):
+    return CONTENT_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+
+
+def encode(data, path, gzip_json=True):
+    """-> (payload bytes, content_encoding or None); JSON gets deterministic gzip."""
+    if gzip_json and path.lower().endswith(GZIP_EXT):
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+        return buf.getvalue(), "gzip"
+    return data, None
+
+
+def _read_source(src):
+    if isinstance(src, (bytes, bytearray)):
+        return bytes(src)
+    with open(src, "rb") as f:
+        return f.read()
+
+
+# ---------------- backends ----------------
+class LocalBackend:
+    """Directory tree mirror of the bucket layout; metadata kept in <root>/.meta/."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.url = self.root
+
+    def _path(self, dest):
+        return os.path.join(self.root, *dest.split("/"))
+
+    def put(self, dest, src, content_type=None, cache_control=CACHE_LIVE, gzip_json=True):
+        payload, encoding = encode(_read_source(src), dest, gzip_json)
+        path = self._path(dest)
+        meta = f"{content_type or guess_content_type(dest)}|{encoding}|{cache_control}"
+        meta_path = os.path.join(self.root, ".meta", dest + ".txt")
+        if os.path.exists(path) and os.path.exists(meta_path):
+            with open(path, "rb") as f:
+                same = hashlib.md5(f.read()).digest() == hashlib.md5(payload).digest()
+            with open(meta_path, "r", encoding="utf-8") as f:
+                if same and f.read() == meta:
+                    return "skipped"
+        for p, data in ((path, payload), (meta_path, meta.encode("utf-8"))):
+            os.makedirs(os.path.dirname(p), exist_ok=True)
+            tmp = p + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, p)
+        return "uploaded"
+
+    def read(self, dest):
+        with open(self._path(dest), "rb") as f:
+            data = f.read()
+        meta_path = os.path.join(self.root, ".meta", dest + ".txt")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                if f.read().split("|")[1] == "gzip":
+                    return gzip.decompress(data)
+        return data
+
+    def delete(self, dest):
+        found = False
+        for p in (self._path(dest), os.path.join(self.root, ".meta", dest + ".txt")):
+            if os.path.exists(p):
+                os.remove(p)
+                found = True
+        return found
+
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def gcs_client(project=None, pool_size=POOL_SIZE):
+    """Process-wide storage.Client (thread-safe to share) with a larger HTTP connection pool."""
+    with _CLIENTS_LOCK:
+        if project not in _CLIENTS:
+            from google.cloud import storage
+            client = storage.Client(project=project)
+            http = getattr(client, "_http", None)
+            if http is not None and hasattr(http, "mount"):
+                import requests
+                adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                http.mount("https://", adapter)
+            _CLIENTS[project] = client
+        return _CLIENTS[project]
+
+
+class GCSBackend:
+    def __init__(self, bucket, prefix="", client=None):
+        self.bucket_name = bucket
+        self.prefix = prefix.strip("/")
+        self.client = client or gcs_client()
+        self.bucket = self.client.bucket(bucket)
+        self.url = f"gs://{bucket}/{self.prefix}".rstrip("/")
+
+    def _name(self, dest):
+        return f"{self.prefix}/{dest}" if self.prefix else dest
+
+    def put(self, dest, src, content_type=None, cache_control=CACHE_LIVE, gzip_json=True):
+        payload, encoding = encode(_read_source(src), dest, gzip_json)
+        ctype = content_type or guess_content_type(dest)
+        name = self._name(dest)
+        current = self.bucket.get_blob(name)  # metadata only
+        if current is not None and _same_content(current, payload):
+            if (current.content_type, current.content_encoding, current.cache_control) == (ctype, encoding, cache_control):
+                return "skipped"
+            current.content_type = ctype
+            current.content_encoding = encoding
+            current.cache_control = cache_control
+            current.patch()
+            return "patched"
+        blob = self.bucket.blob(name)
+        blob.content_encoding = encoding
+        blob.cache_control = cache_control
+        blob.upload_from_string(payload, content_type=ctype)
+        return "uploaded"
+
+    def read(self, dest):
+        # download_as_bytes undoes gzip content-encoding transparently
+        return self.bucket.blob(self._name(dest)).download_as_bytes()
+
+    def delete(self, dest):
+        from google.api_core.exceptions import NotFound
+        try:
+            self.bucket.blob(self._name(dest)).delete()
+        except NotFound:
+            return False
+        return True
+
+
+def _same_content(blob, payload):
+    if blob.size is not None and blob.size != len(payload):
+        return False
+    if blob.md5_hash:
+        return blob.md5_hash == base64.b64encode(hashlib.md5(payload).digest()).decode("ascii")
+    if blob.crc32c:  # composite objects carry no MD5
+        try:
+            import google_crc32c
+        except ImportError:
+            return False
+        crc = google_crc32c.value(payload).to_bytes(4, "big")
+        return blob.crc32c == base64.b64encode(crc).decode("ascii")
+    return False
+
+
+def get_backend(url=None):
+    url = url or DEFAULT_URL
+    if url.startswith("gs://"):
+        bucket, _, prefix = url[5:].partition("/")
+        return GCSBackend(bucket, prefix)
+    if url.startswith("file://"):
+        url = url[7:]
+    return LocalBackend(url)
+
+
+# ---------------- batched publish ----------------
+def artifact(src, dest, cache_control=CACHE_LIVE, content_type=None, gzip_json=True):
+    # src: local path or bytes; dest: object name relative to the backend root
+    return {"src": src, "dest": dest, "cache_control": cache_control,
+            "content_type": content_type, "gzip_json": gzip_json}
+
+
+def publish(backend, artifacts, max_workers=8):
+    """Upload artifact() dicts concurrently; returns {"uploaded": n, "patched": n, "skipped": n, "failed": n}."""
+    counts = {"uploaded": 0, "patched": 0, "skipped": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def one(a):
+        try:
+            status = backend.put(a["dest"], a["src"], a["content_type"], a["cache_control"], a["gzip_json"])
+        except Exception as e:
+            print(f"[FAIL] {a['dest']}: {e}")
+            status = "failed"
+        with lock:  # also keeps the worker log lines from interleaving
+            counts[status] += 1
+            if status in ("uploaded", "patched"):
+                print(f"[WRITE] {status} {backend.url}/{a['dest']}")
+        return status
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        list(pool.map(one, artifacts))
+    print(f"[OK] publish -> {backend.url}: " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+    return counts
+
+
+def remove(backend, dests, max_workers=8):
+    """Delete objects concurrently (missing ones are ignored); returns the number deleted."""
+    dests = list(dests)
+    if not dests:
+        return 0
+
+    def one(dest):
+        try:
+            return backend.delete(dest)
+        except Exception as e:
+            print(f"[FAIL] delete {dest}: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        n = sum(pool.map(one, dests))
+    print(f"[OK] removed {n}/{len(dests)} objects from {backend.url}")
+    return n
+
+
+def publish_dir(local_dir, dest, removed=(), url=None, cache_control=CACHE_LIVE, max_workers=8, live=None):
+    """
+    Mirror a generated directory: publish every file under local_dir to dest/
+    (unchanged ones skipped) and delete dest/<rel> for each relative path in removed.
+    index.json files, and files whose relative path satisfies live(rel), are always
+    published with CACHE_LIVE.
+    """
+    backend = get_backend(url or None)
+    artifacts = cycle_artifacts(root="", entries=[(os.path.abspath(local_dir), dest, cache_control)])
+    for a in artifacts:
+        rel = a["dest"][len(dest) + 1:]
+        if rel.rsplit("/", 1)[-1] == "index.json" or (live and live(rel)):
+            a["cache_control"] = CACHE_LIVE
+    counts = publish(backend, artifacts, max_workers)
+    counts["removed"] = remove(backend, [f"{dest}/{rel}" for rel in removed], max_workers)
+    return counts
+
+
+# local file or directory (relative to the repo) -> object prefix, cache-control
+CYCLE = [
+    ("Data/Wind/wind_ca_latest.bin", "wind/wind_ca_latest.bin", CACHE_LIVE),
+    ("Data/Wind/wind_ca_latest.png", "wind/wind_ca_latest.png", CACHE_LIVE),
+    ("Data/Wind/wind_ca_latest.png.json", "wind/wind_ca_latest.png.json", CACHE_LIVE),
+    ("Data/Wind/wind_ca_cube.bin", "wind/wind_ca_cube.bin", CACHE_LIVE),
+    ("Data/Wind/wind_ca_velocity.json", "wind/wind_ca_velocity.json", CACHE_LIVE),
+    ("Data/Wind/wind_ca_velocity_manifest.json", "wind/wind_ca_velocity_manifest.json", CACHE_LIVE),
+    ("Data/Wind/wind_ca_velocity_x2.json", "wind/wind_ca_velocity_x2.json", CACHE_LIVE),
+    ("Data/Wind/wind_ca_velocity_x4.json", "wind/wind_ca_velocity_x4.json", CACHE_LIVE),
+    ("Data/Wind/wind_ca_velocity_x8.json", "wind/wind_ca_velocity_x8.json", CACHE_LIVE),
+    ("Data/Wind/wind_ca_latest.stats.json", "wind/wind_ca_latest.stats.json", CACHE_LIVE),
+    ("public/data/airnow_latest.json", "smoke_contours/airnow_latest.json", CACHE_LIVE),
+    ("public/data/smoke", "smoke", CACHE_LIVE),
+    ("public/data/firms_ca_latest.geojson", "fire/firms_ca_latest.geojson", CACHE_LIVE),
+    ("public/data/fire_events.json", "fire/fire_events.json", CACHE_LIVE),
+    ("public/data/firms_tiles", "fire/firms_tiles", CACHE_LIVE),
+    ("public/data/firms_rasters", "fire/firms_rasters", CACHE_STATIC),
+]
+
+
+def cycle_artifacts(root=REPO_ROOT, entries=CYCLE):
+    """Expand CYCLE into artifact() dicts for the files that exist (directories recursively)."""
+    out = []
+    for local, dest, cache in entries:
+        path = os.path.join(root, local)
+        if os.path.isfile(path):
+            out.append(artifact(path, dest, cache))
+        elif os.path.isdir(path):
+            for dirpath, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.endswith(".tmp") or ".tmp." in name:
+                        continue
+                    full = os.path.join(dirpath, name)
+                    rel = os.path.relpath(full, path).replace(os.sep, "/")
+                    out.append(artifact(full, f"{dest}/{rel}", cache))
+    return out
+
+
+def select(groups, entries=CYCLE):
+    # CYCLE entries whose object prefix is one of `groups` ("wind", "smoke", "fire", ...)
+    return [e for e in entries if e[1].split("/", 1)[0] in groups] if groups else list(entries)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Publish wind / smoke / fire artifacts to the storage backend")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("publish")
+    p.add_argument("--dest", default=DEFAULT_URL, help="gs://bucket[/prefix] or a local directory")
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--only", nargs="+", metavar="GROUP", help="object prefixes to publish, e.g. wind smoke")
+    p.add_argument("--dry-run", action="store_true", help="list what would be published")
+    args = ap.parse_args(argv)
+
+    artifacts = cycle_artifacts(entries=select(args.only))
+    if args.dry_run:
+        for a in artifacts:
+            print(f"  {a['src']} -> {a['dest']} ({a['cache_control']})")
+        print(f"[INFO] {len(artifacts)} artifacts")
+        return
+    publish(get_backend(args.dest), artifacts, args.workers)
+
+
+if __name__ == "__main__":
+    main()
+# %%
@@ -9,19 +9,22 @@ Exit code:
   0 -> OK
   1 -> Validation/conversion failed
 Usage:
-  python Backend/validate_wind.py Wind/wind_ca_latest.json Wind [--null-threshold 0.9]
+  python Backend/validate_wind.py Wind/wind_ca_latest.json Wind [--null-threshold 0.9] [--no-pretty]
 """
 # %% 
 import json, math, sys, os, time, statistics
 from pathlib import Path
 from datetime import datetime, timezone
 
+import numpy as np
+
 CA_BBOX = (-125.0, 32.0, -113.0, 43.5)  # (W,S,E,N) loose bounds for CA
 
 def parse_args(argv):
     in_path = None  # input JSON path
     out_dir = None  # output directory for results
     null_thr = 0.9  # null ratio threshold (default 90%)
+    pretty = True   # also write the indent=2 copy
     i = 0           # argument index
     while i < len(argv):
         a = argv[i]
@@ -32,12 +35,14 @@ def parse_args(argv):
         elif a in ("--null-threshold", "-t"):
             i += 1
             null_thr = float(argv[i])
+        elif a == "--no-pretty":
+            pretty = False
         else:
             raise SystemExit(f"Unknown arg: {a}")
         i += 1
     if not in_path or not out_dir:
-        raise SystemExit("Usage: python Backend/validate_wind.py <in_json> <out_dir> [--null-threshold 0.9]")
-    return in_path, out_dir, null_thr
+        raise SystemExit("Usage: python Backend/validate_wind.py <in_json> <out_dir> [--null-threshold 0.9] [--no-pretty]")
+    return in_path, out_dir, null_thr, pretty
 
 def isclose(a,b,eps=1e-6): return abs(a-b) <= eps
 
@@ -59,22 +64,36 @@ def clean_num(x):
         pass
     return None
 
+def to_array(arr2d):
+    # nested lists (None = null) or ndarray -> float64 ndarray, NaN for null
+    if isinstance(arr2d, np.ndarray):
+        return arr2d.astype(np.float64, copy=False)
+    try:
+        return np.array(arr2d, dtype=np.float64)
+    except (TypeError, ValueError):
+        # odd cells (strings, etc.): fall back to per-cell cleaning
+        return np.array([[np.nan if (c := clean_num(x)) is None else c for x in r] for r in arr2d],
+                        dtype=np.float64)
+
+def clean_array(a):
+    # Vectorized clean_num: non-finite and absurd values (likely corrupt units) -> NaN
+    a = to_array(a)
+    with np.errstate(invalid="ignore"):
+        return np.where(np.abs(a) <= 1e3, a, np.nan)
+
 def stats_2d(arr2d):
-    vals, nnull = [], 0
-    ny = len(arr2d) if arr2d else 0
-    nx = len(arr2d[0]) if ny else 0
-    for r in arr2d:
-        for x in r:
-            v = clean_num(x)
-            if v is None:
-                nnull += 1
-            else:
-                vals.append(v)
-    if not vals:
+    return _stats_clean(clean_array(arr2d))
+
+def _stats_clean(a):
+    # one pass over an already-cleaned array
+    vals = a[~np.isnan(a)]
+    if not vals.size:
         raise ValueError("all values are null/NaN")
-    mn = min(vals); mx = max(vals); mean = sum(vals) / len(vals)
-    null_ratio = nnull / (nnull + len(vals))
-    return {"min": mn, "max": mx, "mean": mean, "null_ratio": null_ratio}
+    nnull = int(a.size - vals.size)
+    # cumsum adds left-to-right like sum() on a list, so the mean matches the old output bit-for-bit
+    mean = float(np.cumsum(vals)[-1]) / vals.size
+    null_ratio = nnull / (nnull + int(vals.size))
+    return {"min": float(vals.min()), "max": float(vals.max()), "mean": mean, "null_ratio": null_ratio}
 # %% Check metadata consistency
 def check_meta(meta, nx, ny):
     required = ["bbox","nx","ny","dx","dy","units"]
@@ -119,20 +138,32 @@ def validate_grid(doc):
     if not all(k in doc for k in ("u10","v10")):
         raise ValueError("u10/v10 missing")
     u, v = doc["u10"], doc["v10"]
-    ny, nx = len(u), len(u[0]) if u else (0,0)
-    if ny == 0 or nx == 0: raise ValueError("empty grid")
-    if any(len(row)!=nx for row in u) or any(len(row)!=nx for row in v) or len(v)!=ny:
-        raise ValueError("u/v shape mismatch")
+    if not isinstance(u, np.ndarray):
+        ny, nx = len(u), len(u[0]) if u else 0
+        if ny == 0 or nx == 0: raise ValueError("empty grid")
+        if any(len(row)!=nx for row in u) or any(len(row)!=nx for row in v) or len(v)!=ny:
+            raise ValueError("u/v shape mismatch")
     meta = doc.get("meta")
     if not meta:
         raise ValueError("meta missing")
+    return validate_arrays(to_array(u), to_array(v), meta)
+
+def validate_arrays(u, v, meta):
+    # Same checks as validate_grid, on 2-D float arrays (NaN = null)
+    if u.ndim != 2 or u.size == 0:
+        raise ValueError("empty grid")
+    if u.shape != v.shape:
+        raise ValueError("u/v shape mismatch")
+    ny, nx = u.shape
     check_meta(meta, nx, ny)
-    su = stats_2d(u); sv = stats_2d(v)
+    uc, vc = clean_array(u), clean_array(v)
+    su = _stats_clean(uc); sv = _stats_clean(vc)
 
-    # Rough check of speed limit
-    mx_speed_est = math.sqrt(max(su["max"]**2,1e-9) + max(sv["max"]**2,1e-9))
-    if speed_bad(mx_speed_est):
-        print(f"[WARN] max speed seems too high: ~{mx_speed_est:.1f} m/s")
+    # Speed limit check on the actual per-cell speed
+    speed = np.hypot(uc, vc)
+    mx_speed = float(np.nanmax(speed)) if not np.isnan(speed).all() else 0.0
+    if speed_bad(mx_speed):
+        print(f"[WARN] max speed seems too high: {mx_speed:.1f} m/s")
 
     return {
         "nx": nx, "ny": ny,
@@ -140,27 +171,70 @@ def validate_grid(doc):
         "meta": meta
     }
 
-def to_velocity_json(doc):
-    # Convert the mesh to leaflet-velocity compatible JSON (two objects: u, v)
-    meta = doc["meta"]; u = doc["u10"]; v = doc["v10"]
-    ny, nx = len(u), len(u[0])
-    west,south,east,north = meta["bbox"]
-    dx, dy = meta["dx"], meta["dy"]
-    refTime = meta.get("timestamp","")
+def flat_with_null(a):
+    # row-major flatten; non-finite -> None (null in JSON)
+    a = to_array(a)
+    out = a.ravel().astype(object)
+    out[~np.isfinite(a.ravel())] = None
+    return out.tolist()
 
-    # Flattened (row-major, rows: north->south; columns: west->east)
-    flat_u = [val if (val is None or isinstance(val,(int,float))) else None for row in u for val in row]
-    flat_v = [val if (val is None or isinstance(val,(int,float))) else None for row in v for val in row]
-    header_base = {
+def velocity_header(meta, nx, ny):
+    # leaflet-velocity header shared by the u and v objects
+    west,south,east,north = meta["bbox"]
+    return {
         "nx": nx, "ny": ny,
         "lo1": west, "la1": north,  # upper-left
         "lo2": east, "la2": south,  # lower-right
-        "dx": dx, "dy": dy,
-        "refTime": refTime
+        "dx": meta["dx"], "dy": meta["dy"],
+        "refTime": meta.get("timestamp","")
     }
+
+def to_velocity_json(doc):
+    # Convert the mesh to leaflet-velocity compatible JSON (two objects: u, v)
+    meta = doc["meta"]; u = to_array(doc["u10"]); v = to_array(doc["v10"])
+    ny, nx = u.shape
+
+    # Flattened (row-major, rows: north->south; columns: west->east)
+    flat_u = flat_with_null(u)
+    flat_v = flat_with_null(v)
+    header_base = velocity_header(meta, nx, ny)
     u_obj = {"header": {**header_base, "parameterCategory": 2, "parameterNumber": 2}, "data": flat_u}
     v_obj = {"header": {**header_base, "parameterCategory": 2, "parameterNumber": 3}, "data": flat_v}
     return [u_obj, v_obj]
+# %% Writers shared by the CLI and wind_pipeline.py
+def check_nulls(summary, null_thr):
+    if summary["u_stats"]["null_ratio"] > null_thr or summary["v_stats"]["null_ratio"] > null_thr:
+        raise ValueError(f"too many nulls (>{int(null_thr*100)}%), abort rendering")
+
+def write_stats(out_dir, summary):
+    stats_path = os.path.join(out_dir, "wind_ca_latest.stats.json")
+    stats = {
+        "nx": summary["nx"], "ny": summary["ny"],
+        "u": summary["u_stats"], "v": summary["v_stats"],
+        "timestamp": summary["meta"].get("timestamp"),
+        "units": summary["meta"].get("units"),
+        "bbox": summary["meta"].get("bbox")
+    }
+    with open(stats_path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+    print("[WRITE] stats  ->", os.path.abspath(stats_path))
+    return stats_path
+
+def write_velocity(out_dir, doc):
+    vel_path = os.path.join(out_dir, "wind_ca_velocity.json")
+    vel = to_velocity_json(doc)
+    with open(vel_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(vel, separators=(",",":")))  # C encoder (json.dump streams in pure Python)
+    print("[WRITE] vel    ->", os.path.abspath(vel_path))
+    return vel_path
+
+def write_pretty(out_dir, doc):
+    pretty_path = os.path.join(out_dir, "wind_ca_latest.pretty.json")
+    with open(pretty_path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, indent=2)
+    print("[WRITE] pretty ->", os.path.abspath(pretty_path))
+    return pretty_path
+
 # %% Main function to validate and convert wind data
 def main():
     try:
@@ -174,44 +248,23 @@ def main():
             print("       in_json =", in_json)
             print("       out_dir =", out_dir)
 
-        in_path, out_dir, null_thr = parse_args(sys.argv[1:])
+        in_path, out_dir, null_thr, pretty = parse_args(sys.argv[1:])
         if not os.path.exists(in_path):
             raise FileNotFoundError(f"input json not found: {in_path}")
         os.makedirs(out_dir, exist_ok=True)
 
         doc = load_json(in_path)
         summary = validate_grid(doc)
-
-        if summary["u_stats"]["null_ratio"] > null_thr or summary["v_stats"]["null_ratio"] > null_thr:
-            raise ValueError(f"too many nulls (>{int(null_thr*100)}%), abort rendering")
+        check_nulls(summary, null_thr)
 
         print(f"[OK] grid validated: {summary['nx']}x{summary['ny']}")
 
-        pretty_path = os.path.join(out_dir, "wind_ca_latest.pretty.json")
-        with open(pretty_path, "w", encoding="utf-8") as f:
-            json.dump(doc, f, ensure_ascii=False, indent=2)
-
-        stats_path = os.path.join(out_dir, "wind_ca_latest.stats.json")
-        stats = {
-            "nx": summary["nx"], "ny": summary["ny"],
-            "u": summary["u_stats"], "v": summary["v_stats"],
-            "timestamp": summary["meta"].get("timestamp"),
-            "units": summary["meta"].get("units"),
-            "bbox": summary["meta"].get("bbox")
-        }
-        with open(stats_path, "w", encoding="utf-8") as f:
-            json.dump(stats, f, indent=2)
-
-        vel_path = os.path.join(out_dir, "wind_ca_velocity.json")
-        vel = to_velocity_json(doc)
-        with open(vel_path, "w", encoding="utf-8") as f:
-            json.dump(vel, f, separators=(",",":"))
-
         # echo absolute paths for sanity
-        print("[WRITE] pretty ->", os.path.abspath(pretty_path))
-        print("[WRITE] stats  ->", os.path.abspath(stats_path))
-        print("[WRITE] vel    ->", os.path.abspath(vel_path))
-        print("[OK] wrote pretty/stats/velocity json")
+        if pretty:
+            write_pretty(out_dir, doc)
+        write_stats(out_dir, summary)
+        write_velocity(out_dir, doc)
+        print("[OK] wrote " + ("pretty/" if pretty else "") + "stats/velocity json")
         sys.exit(0)
 
     except Exception as e:
@@ -0,0 +1,149 @@
+# Compact on-disk formats for the wind grid (written straight from NumPy buffers).
+"""
+1) Quantized binary grid  (wind_ca_latest.bin)
+     b"WND1" | uint32 LE header length | JSON header (space-padded to 8 bytes)
+     | int16 LE u[ny*nx] | int16 LE v[ny*nx]
+   value = q * scale + offset ;  q == nodata (-32768) -> null
+   The header carries the usual `meta` (bbox/nx/ny/dx/dy/timestamp/...) plus
+   shape/dtype/scale/offset/nodata/fields/data_offset, so the data block can be
+   memory-mapped directly.
+
+2) PNG u/v texture  (wind_ca_latest.png + wind_ca_latest.png.json)
+     R = u, G = v linearly mapped to 0..255 over [min, max], A = 0 where null.
+"""
+# %%
+import json
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b"WND1"
+NODATA = -32768
+DEFAULT_SCALE = 0.01  # 1 cm/s steps, covers +-327 m/s
+
+
+def quantize(a, scale=DEFAULT_SCALE, offset=0.0):
+    a = np.asarray(a, dtype=np.float32)
+    finite = np.isfinite(a)
+    q = np.rint((np.where(finite, a, 0.0) - offset) / scale)
+    q = np.clip(q, -32767, 32767).astype("<i2")
+    q[~finite] = NODATA
+    return q
+
+
+def dequantize(q, scale, offset=0.0, nodata=NODATA):
+    out = q.astype(np.float32) * np.float32(scale) + np.float32(offset)
+    out[q == nodata] = np.nan
+    return out
+
+
+# ---------------- binary ----------------
+def write_wind_bin(path, u, v, meta, scale=DEFAULT_SCALE, offset=0.0, extra=None):
+    """
+    Write u/v (same shape; 2-D (ny,nx) or 3-D (nt,ny,nx)) as int16 plus a JSON header.
+    Returns the header dict.
+    """
+    u = np.asarray(u)
+    v = np.asarray(v)
+    if u.shape != v.shape:
+        raise ValueError("u/v shape mismatch")
+    header = {
+        "meta": meta,
+        "shape": list(u.shape),
+        "dtype": "<i2",
+        "scale": scale,
+        "offset": offset,
+        "nodata": NODATA,
+        "fields": ["u10", "v10"],
+        **(extra or {}),
+    }
+    # data_offset depends on the header length, so iterate until it is stable
+    header["data_offset"] = 0
+    while True:
+        hbytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        hlen = len(hbytes) + (-(8 + len(hbytes)) % 8)
+        if header["data_offset"] == 8 + hlen:
+            break
+        header["data_offset"] = 8 + hlen
+    hbytes = hbytes.ljust(hlen, b" ")
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", hlen))
+        f.write(hbytes)
+        f.write(quantize(u, scale, offset).tobytes())
+        f.write(quantize(v, scale, offset).tobytes())
+    return header
+
+
+def read_wind_header(path):
+    with open(path, "rb") as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"not a wind grid file: {path}")
+        (hlen,) = struct.unpack("<I", f.read(4))
+        return json.loads(f.read(hlen).decode("utf-8"))
+
+
+def read_wind_bin(path, mmap=False):
+    # Returns (u, v, header); u/v are float32 with NaN for nodata
+    header = read_wind_header(path)
+    shape = tuple(header["shape"])
+    if mmap:
+        raw = np.memmap(path, dtype=header["dtype"], mode="r", offset=header["data_offset"],
+                        shape=(2,) + shape)
+    else:
+        raw = np.fromfile(path, dtype=header["dtype"], offset=header["data_offset"]).reshape((2,) + shape)
+    scale, offset, nodata = header["scale"], header["offset"], header["nodata"]
+    return dequantize(raw[0], scale, offset, nodata), dequantize(raw[1], scale, offset, nodata), header
+
+
+# ---------------- PNG ----------------
+def _png_chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def write_png(path, rgba):
+    # Minimal RGBA8 PNG encoder (no Pillow): one zero filter byte per row, zlib'd in one go
+    rgba = np.ascontiguousarray(rgba, dtype=np.uint8)
+    h, w = rgba.shape[:2]
+    rows = np.zeros((h, 1 + w * 4), dtype=np.uint8)
+    rows[:, 1:] = rgba.reshape(h, w * 4)
+    png = (b"\x89PNG\r\n\x1a\n"
+           + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0))
+           + _png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 3))
+           + _png_chunk(b"IEND", b""))
+    with open(path, "wb") as f:
+        f.write(png)
+
+
+def _to_byte(a, lo, hi):
+    span = (hi - lo) or 1.0
+    return np.rint((np.nan_to_num(a, nan=lo) - lo) / span * 255.0).clip(0, 255).astype(np.uint8)
+
+
+def write_wind_png(path, u, v, meta):
+    """
+    Encode 2-D u/v as an RGBA texture and write the decode header next to it
+    (<path>.json). Returns the header dict.
+    """
+    u = np.asarray(u, dtype=np.float32)
+    v = np.asarray(v, dtype=np.float32)
+    valid = np.isfinite(u) & np.isfinite(v)
+    if not valid.any():
+        raise ValueError("all values are null/NaN")
+    umin, umax = float(u[valid].min()), float(u[valid].max())
+    vmin, vmax = float(v[valid].min()), float(v[valid].max())
+
+    rgba = np.zeros(u.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = _to_byte(u, umin, umax)
+    rgba[..., 1] = _to_byte(v, vmin, vmax)
+    rgba[..., 3] = np.where(valid, 255, 0)
+    write_png(path, rgba)
+
+    header = {"meta": meta, "width": int(u.shape[1]), "height": int(u.shape[0]),
+              "uMin": umin, "uMax": umax, "vMin": vmin, "vMax": vmax}
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(header, f, separators=(",", ":"))
+    return header
+# %%
@@ -0,0 +1,104 @@
+# Fetch -> validate -> publish HRRR wind in one process (no JSON round trip).
+"""
+Runs fetch_RTwind's download/regrid stage and hands the NumPy u/v arrays and
+`meta` straight to validate_wind's checks and writers:
+  - Wind/wind_ca_velocity.json      (leaflet-velocity)
+  - Wind/wind_ca_latest.stats.json  (summary stats)
+  - Wind/wind_ca_latest.bin / .png  (compact grid, see wind_format.py)
+  - Wind/wind_ca_velocity_x{2,4,8}.json + manifest (see wind_pyramid.py)
+Outputs are skipped when the derived grid hashes the same as last time
+(Wind/wind_ca_latest.hash.json); --force rewrites anyway.
+Optional:
+  --json    also write Wind/wind_ca_latest.json (nested lists)
+  --pretty  also write Wind/wind_ca_latest.pretty.json
+  --publish [URL]  push the wind artifacts through storage_backend (default
+                   WILDFIRE_STORAGE); unchanged objects are skipped
+
+Exit code:
+  0 -> OK
+  1 -> fetch/validation failed
+Usage:
+  python Backend/wind_pipeline.py [out_dir] [--null-threshold 0.9] [--json] [--pretty] [--force]
+
+validate_wind.py stays the CLI for checking an existing wind_ca_latest.json.
+"""
+# %%
+import os
+import sys
+import json
+import argparse
+
+import fetch_RTwind
+import validate_wind
+import wind_pyramid
+from grib_cache import grid_hash
+
+HASH_FILE = "wind_ca_latest.hash.json"
+
+
+def run(out_dir=fetch_RTwind.OUT_DIR, null_thr=0.9, write_json=False, pretty=False, force=False):
+    u, v, meta = fetch_RTwind.fetch_latest()
+    return publish(u, v, meta, out_dir, null_thr, write_json, pretty, force)
+
+
+def read_hash(out_dir):
+    try:
+        with open(os.path.join(out_dir, HASH_FILE), "r", encoding="utf-8") as f:
+            return json.load(f).get("sha256")
+    except (OSError, ValueError):
+        return None
+
+
+def publish(u, v, meta, out_dir, null_thr=0.9, write_json=False, pretty=False, force=False):
+    """
+    Validate in memory, then write only what was asked for; returns the validation
+    summary, or None when the grid is unchanged since the last publish.
+    """
+    digest = grid_hash(u, v, meta)
+    if not force and digest == read_hash(out_dir):
+        print("[SKIP] wind grid unchanged since last run (", digest[:12], ")")
+        return None
+
+    summary = validate_wind.validate_arrays(u, v, meta)
+    validate_wind.check_nulls(summary, null_thr)
+    print(f"[OK] grid validated: {summary['nx']}x{summary['ny']}")
+
+    fetch_RTwind.write_outputs(u, v, meta, out_dir, write_json=write_json)
+    doc = {"meta": meta, "u10": u, "v10": v}
+    validate_wind.write_stats(out_dir, summary)
+    validate_wind.write_velocity(out_dir, doc)
+    wind_pyramid.write_pyramid(out_dir, u, v, meta)
+    if pretty:
+        validate_wind.write_pretty(out_dir, fetch_RTwind.build_doc(u, v, meta))
+
+    with open(os.path.join(out_dir, HASH_FILE), "w", encoding="utf-8") as f:
+        json.dump({"ref_time": meta.get("timestamp"), "sha256": digest}, f, indent=2)
+    return summary
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fetch, validate and publish HRRR 10 m wind")
+    ap.add_argument("out_dir", nargs="?", default=fetch_RTwind.OUT_DIR)
+    ap.add_argument("--null-threshold", "-t", type=float, default=0.9)
+    ap.add_argument("--json", action="store_true", help="also write wind_ca_latest.json")
+    ap.add_argument("--pretty", action="store_true", help="also write wind_ca_latest.pretty.json")
+    ap.add_argument("--force", action="store_true", help="write outputs even if the grid is unchanged")
+    ap.add_argument("--publish", nargs="?", const="", metavar="URL",
+                    help="upload wind artifacts (gs://bucket[/prefix] or a directory; default WILDFIRE_STORAGE)")
+    args = ap.parse_args(argv)
+    try:
+        run(args.out_dir, args.null_threshold, args.json, args.pretty, args.force)
+        if args.publish is not None:
+            import storage_backend
+            wind = [(os.path.join(os.path.abspath(args.out_dir), os.path.basename(local)), dest, cache)
+                    for local, dest, cache in storage_backend.select(["wind"])]
+            storage_backend.publish(storage_backend.get_backend(args.publish or None),
+                                    storage_backend.cycle_artifacts(entries=wind))
+    except Exception as e:
+        print("[FAIL]", e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
+# %%
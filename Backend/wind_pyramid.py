@@ -0,0 +1,104 @@
+# Multi-resolution leaflet-velocity pyramid for the wind layer.
+"""
+From the full-resolution u/v grid build levels at 1/2, 1/4 and 1/8 resolution
+by NaN-aware block averaging, write each as leaflet-velocity JSON and list them
+in a manifest the frontend can pick from by zoom:
+  - Wind/wind_ca_velocity.json           (factor 1, written by validate_wind)
+  - Wind/wind_ca_velocity_x2.json, _x4, _x8
+  - Wind/wind_ca_velocity_manifest.json  {"levels": [{"factor", "file", "header"}, ...]}
+
+Usage:
+  python Backend/wind_pyramid.py Data/Wind/wind_ca_latest.bin Data/Wind
+"""
+# %%
+import os
+import sys
+import json
+
+import numpy as np
+
+import validate_wind
+from wind_format import read_wind_bin
+
+FACTORS = (1, 2, 4, 8)
+MANIFEST = "wind_ca_velocity_manifest.json"
+
+
+def block_mean(a, f):
+    # Mean of each f x f block ignoring NaN; blocks with no valid cell stay NaN.
+    # Edges are NaN-padded, so partial blocks at the east/south edge are kept.
+    a = np.asarray(a, dtype=np.float64)
+    if f == 1:
+        return a
+    ny, nx = a.shape
+    py, px = -ny % f, -nx % f
+    a = np.pad(a, ((0, py), (0, px)), constant_values=np.nan)
+    blocks = a.reshape(a.shape[0] // f, f, a.shape[1] // f, f)
+    valid = np.isfinite(blocks)
+    count = valid.sum(axis=(1, 3))
+    total = np.where(valid, blocks, 0.0).sum(axis=(1, 3))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def level_meta(meta, f, shape):
+    # Header for a level: block centres on a grid f times coarser
+    if f == 1:
+        return meta
+    west, south, east, north = meta["bbox"]
+    ny, nx = shape
+    dx, dy = meta["dx"] * f, meta["dy"] * f
+    lo1 = west + meta["dx"] * (f - 1) / 2
+    la1 = north - meta["dy"] * (f - 1) / 2
+    return {**meta, "bbox": [lo1, la1 - (ny - 1) * dy, lo1 + (nx - 1) * dx, la1],
+            "nx": int(nx), "ny": int(ny), "dx": dx, "dy": dy}
+
+
+def build_pyramid(u, v, meta, factors=FACTORS):
+    # -> [(factor, u_level, v_level, meta_level), ...]
+    levels = []
+    for f in factors:
+        ul, vl = block_mean(u, f), block_mean(v, f)
+        if f != 1:
+            # block means carry spurious digits; 1 cm/s matches the .bin quantization
+            ul, vl = np.round(ul, 2), np.round(vl, 2)
+        levels.append((f, ul, vl, level_meta(meta, f, ul.shape)))
+    return levels
+
+
+def level_file(f):
+    return "wind_ca_velocity.json" if f == 1 else f"wind_ca_velocity_x{f}.json"
+
+
+def write_pyramid(out_dir, u, v, meta, factors=FACTORS):
+    """
+    Write the coarser levels (factor 1 is validate_wind's velocity file) and the manifest.
+    Returns the manifest path.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    levels = []
+    for f, ul, vl, ml in build_pyramid(u, v, meta, factors):
+        if f != 1:
+            vel = validate_wind.to_velocity_json({"meta": ml, "u10": ul, "v10": vl})
+            with open(os.path.join(out_dir, level_file(f)), "w", encoding="utf-8") as fp:
+                fp.write(json.dumps(vel, separators=(",", ":")))
+        header = validate_wind.velocity_header(ml, ul.shape[1], ul.shape[0])
+        levels.append({"factor": f, "file": level_file(f), "header": header})
+
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path, "w", encoding="utf-8") as fp:
+        json.dump({"refTime": meta.get("timestamp", ""), "levels": levels}, fp, indent=2)
+    print("[WRITE] pyramid ->", os.path.abspath(path), [lv["factor"] for lv in levels])
+    return path
+
+
+def main():
+    if len(sys.argv) != 3:
+        raise SystemExit("Usage: python Backend/wind_pyramid.py <wind_ca_latest.bin> <out_dir>")
+    u, v, header = read_wind_bin(sys.argv[1])
+    write_pyramid(sys.argv[2], u, v, header["meta"])
+
+
+if __name__ == "__main__":
+    main()
+# %%
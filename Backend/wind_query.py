@@ -0,0 +1,211 @@
+# Batch wind point queries over the memory-mapped compact grid.
+"""
+Answers (lat, lon) batches with bilinear interpolation on
+Data/Wind/wind_ca_latest.bin (see wind_format.py), using the same meta
+conventions fetch_RTwind writes: bbox [W,S,E,N], dx/dy in degrees,
+grid_origin upper-left (row 0 = north, col 0 = west).
+
+Returns u, v (m/s), speed (m/s) and direction (deg, meteorological: where the
+wind blows FROM, 0 = north, 90 = east). Points outside the grid or touching a
+null cell come back as null.
+
+Also runs as a small HTTP endpoint next to the PurpleAir proxy (port 8787):
+  GET  /api/wind?points=lat,lon;lat,lon
+  POST /api/wind   {"points": [[lat, lon], ...]}
+  GET  /healthz
+Usage:
+  python Backend/wind_query.py [grid.bin] [--port 8788]
+  python Backend/wind_query.py --selfcheck     # edge-case regression check on a synthetic grid
+"""
+# %%
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from wind_format import read_wind_header
+
+DEFAULT_GRID = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            "Data", "Wind", "wind_ca_latest.bin")
+DEFAULT_PORT = int(os.environ.get("WIND_QUERY_PORT", "8788"))
+
+
+class WindGrid:
+    """Memory-mapped int16 u/v grid; reopened automatically when the file is replaced."""
+
+    def __init__(self, path=DEFAULT_GRID):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._open()
+
+    def _open(self):
+        st = os.stat(self.path)
+        header = read_wind_header(self.path)
+        if len(header["shape"]) != 2:
+            raise ValueError("expected a 2-D wind grid (not a forecast cube)")
+        self.header = header
+        self.meta = header["meta"]
+        self.raw = np.memmap(self.path, dtype=header["dtype"], mode="r",
+                             offset=header["data_offset"], shape=(2,) + tuple(header["shape"]))
+        self._stamp = (st.st_mtime_ns, st.st_size)
+
+    def refresh(self):
+        st = os.stat(self.path)
+        if (st.st_mtime_ns, st.st_size) != self._stamp:
+            with self._lock:
+                self._open()
+
+    def query(self, lats, lons):
+        """
+        Vectorized bilinear lookup for arrays of lats/lons.
+        Returns {"u", "v", "speed", "direction"} as float32 arrays (NaN = no data).
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        raw, meta, h = self.raw, self.meta, self.header
+        ny, nx = raw.shape[1:]
+        west, _, _, north = meta["bbox"]
+
+        fc = (lons - west) / meta["dx"]
+        fr = (north - lats) / meta["dy"]
+        # in-bounds test on the fractional position, so points past the east/south edge stay null
+        inside = (fc >= 0) & (fc <= nx - 1) & (fr >= 0) & (fr <= ny - 1)
+        # points exactly on the last row/col use the cell before it (weight 1 on the edge)
+        c0 = np.minimum(np.floor(np.where(inside, fc, 0)).astype(np.int64), nx - 2)
+        r0 = np.minimum(np.floor(np.where(inside, fr, 0)).astype(np.int64), ny - 2)
+        tc = fc - c0
+        tr = fr - r0
+
+        # gather only the 4 corners per point (shape: 2 fields x N points)
+        q00, q01 = raw[:, r0, c0], raw[:, r0, c0 + 1]
+        q10, q11 = raw[:, r0 + 1, c0], raw[:, r0 + 1, c0 + 1]
+        corners = np.stack([q00, q01, q10, q11])
+        nodata = (corners == h["nodata"]).any(axis=0)
+        vals = corners.astype(np.float32) * np.float32(h["scale"]) + np.float32(h["offset"])
+        out = ((1 - tr) * (1 - tc) * vals[0] + (1 - tr) * tc * vals[1]
+               + tr * (1 - tc) * vals[2] + tr * tc * vals[3]).astype(np.float32)
+        out[nodata | ~inside[None, :]] = np.nan
+
+        u, v = out[0], out[1]
+        speed = np.hypot(u, v)
+        direction = np.mod(270.0 - np.degrees(np.arctan2(v, u)), 360.0).astype(np.float32)
+        return {"u": u, "v": v, "speed": speed, "direction": direction}
+
+
+def _to_json_list(a, ndigits=2):
+    out = np.round(a.astype(np.float64), ndigits).astype(object)
+    out[~np.isfinite(a)] = None
+    return out.tolist()
+
+
+def query_json(grid, points):
+    # [[lat, lon], ...] -> JSON-ready dict
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    grid.refresh()
+    res = grid.query(pts[:, 0], pts[:, 1])
+    return {
+        "refTime": grid.meta.get("timestamp", ""),
+        "units": {"u": "m/s", "v": "m/s", "speed": "m/s", "direction": "deg_from"},
+        "count": int(len(pts)),
+        **{k: _to_json_list(v) for k, v in res.items()},
+    }
+
+
+def make_handler(grid):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            data = json.dumps(body, separators=(",", ":")).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/healthz":
+                return self._send(200, {"ok": True})
+            if url.path != "/api/wind":
+                return self._send(404, {"error": "not found"})
+            try:
+                spec = parse_qs(url.query).get("points", [""])[0]
+                points = [[float(x) for x in p.split(",")] for p in spec.split(";") if p]
+                if not points:
+                    return self._send(400, {"error": "points=lat,lon;lat,lon required"})
+                self._send(200, query_json(grid, points))
+            except Exception as e:
+                self._send(400, {"error": "bad request", "detail": str(e)})
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/api/wind":
+                return self._send(404, {"error": "not found"})
+            try:
+                n = int(self.headers.get("Content-Length", "0"))
+                body = json.loads(self.rfile.read(n) or b"{}")
+                self._send(200, query_json(grid, body.get("points", [])))
+            except Exception as e:
+                self._send(400, {"error": "bad request", "detail": str(e)})
+
+        def do_OPTIONS(self):
+            self.send_response(204)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+            self.send_header("Access-Control-Allow-Headers", "Content-Type")
+            self.end_headers()
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def serve(path=DEFAULT_GRID, port=DEFAULT_PORT, host="127.0.0.1"):
+    grid = WindGrid(path)
+    server = ThreadingHTTPServer((host, port), make_handler(grid))
+    print(f"[INFO] wind query API on http://{host}:{port}/api/wind  (grid: {path})")
+    server.serve_forever()
+
+
+def selfcheck():
+    """Edge cases on a synthetic grid (u = lon, v = lat); raises AssertionError on a regression."""
+    import tempfile
+    from wind_format import write_wind_bin
+    lons, lats = np.arange(0.0, 2.5, 0.5), np.arange(2.0, -0.5, -0.5)  # bbox [0, 0, 2, 2]
+    u, v = np.meshgrid(lons, lats)
+    meta = {"bbox": [0.0, 0.0, 2.0, 2.0], "dx": 0.5, "dy": 0.5, "grid_origin": "upper-left"}
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "grid.bin")
+        write_wind_bin(path, u, v, meta)
+        grid = WindGrid(path)
+        # on the edges / corners: exact values
+        r = grid.query([0.0, 2.0, 1.0, 0.0], [2.0, 0.0, 1.25, 2.0])
+        assert np.allclose(r["u"], [2.0, 0.0, 1.25, 2.0], atol=0.05), r["u"]
+        assert np.allclose(r["v"], [0.0, 2.0, 1.0, 0.0], atol=0.05), r["v"]
+        # just past the east / south / west / north edges: no data
+        r = grid.query([1.0, 1.0, -0.1, -0.4, 1.0, 2.1], [2.1, 2.49, 1.0, 1.0, -0.1, 1.0])
+        assert np.isnan(r["u"]).all(), r["u"]
+        del grid
+    print("[OK] wind_query selfcheck passed")
+
+
+def main():
+    args = sys.argv[1:]
+    if "--selfcheck" in args:
+        return selfcheck()
+    port = DEFAULT_PORT
+    if "--port" in args:
+        i = args.index("--port")
+        port = int(args[i + 1])
+        del args[i:i + 2]
+    serve(args[0] if args else DEFAULT_GRID, port)
+
+
+if __name__ == "__main__":
+    main()
+# %%
@@ -32,6 +32,7 @@ const WFIGS_QUERY =
 // 你的本地数据路径固定在 public/data/
 const FIRMS_URL   = assetUrl("public/data/firms_ca_latest.geojson");
 const CALFIRE_URL = assetUrl("public/data/calfire_incidents_latest.geojson");
+const FIRMS_SHARD_DIR = "public/data/firms_shards";
 
 function buildPerimeterUrl() {
   const p = new URLSearchParams({
@@ -752,6 +753,42 @@ async function tryFetchJSON(url){
   }catch{ return null; }
 }
 
+// cells of the shard grid (row = floor((lat+90)/deg), col = floor((lon+180)/deg)) covering the radius
+function shardCellsNear(lat, lon, radiusKm, deg){
+  const dLat = radiusKm / 111.2;
+  const dLon = dLat / Math.max(Math.cos(Math.min(Math.abs(lat) + dLat, 89.9) * Math.PI / 180), 1e-6);
+  const r0 = Math.floor((lat - dLat + 90) / deg), r1 = Math.floor((lat + dLat + 90) / deg);
+  const c0 = Math.floor((lon - dLon + 180) / deg), c1 = Math.floor((lon + dLon + 180) / deg);
+  const out = [];
+  for (let r = r0; r <= r1; r++) for (let c = c0; c <= c1; c++) out.push(`${r}_${c}`);
+  return out;
+}
+// -> [[lat, lng], ...] or null; only the shards that exist for that day are fetched
+async function fetchShardPoints(shardIndex, d, lat, lon, radiusKm){
+  const have = new Set(shardIndex.days?.[d] || []);
+  const cells = shardCellsNear(lat, lon, radiusKm, shardIndex.cell_deg).filter(c => have.has(c));
+  if (!cells.length) return null;
+  const shards = await Promise.all(cells.map(c => tryFetchJSON(assetUrl(`${FIRMS_SHARD_DIR}/${d}/${c}.json`))));
+  const pts = [];
+  for (const s of shards){
+    if (!s) continue;
+    for (let k = 0; k < s.lat.length; k++) pts.push([s.lat[k], s.lon[k]]);
+  }
+  return pts;
+}
+async function fetchDailyPoints(d){
+  const gj = await tryFetchJSON(`public/data/firms_ca_${d}.geojson`); // 你的命名
+  if (!gj || !gj.features) return null;
+  const pts = [];
+  for (const f of gj.features){
+    const gmr = f.geometry;
+    if (!gmr || gmr.type!=="Point") continue;
+    const [lng, lat] = gmr.coordinates;
+    pts.push([lat, lng]);
+  }
+  return pts;
+}
+
 let _firmsProgLayer = null;
 let _firmsProgLegend = null;
 
@@ -785,19 +822,20 @@ async function showFirmsProgressionForPerimeter(perimFeature, days=PROG_LAST_N_D
   const layerGroups = [];
   const legendItems = [];
 
+  // per-day/per-cell shards (Backend/firms_index.py); fall back to the full daily file
+  const shardIndex = await tryFetchJSON(assetUrl(`${FIRMS_SHARD_DIR}/index.json`));
+
   for (let i=dates.length-1; i>=0; i--){
     const d = dates[i];
-    const url = `public/data/firms_ca_${d}.geojson`; // 你的命名
-    const gj = await tryFetchJSON(url);
-    if (!gj || !gj.features) continue;
+    const pts = shardIndex
+      ? await fetchShardPoints(shardIndex, d, cy, cx, PROG_SEARCH_RADIUS_KM)
+      : await fetchDailyPoints(d);
+    if (!pts) continue;
 
     const color = PROG_COLORS[(dates.length-1 - i) % PROG_COLORS.length];
     const g = L.layerGroup([], { pane: "firmsPane" });
 
-    for (const f of gj.features){
-      const gmr = f.geometry;
-      if (!gmr || gmr.type!=="Point") continue;
-      const [lng, lat] = gmr.coordinates;
+    for (const [lat, lng] of pts){
       if (haversineKm(cy, cx, lat, lng) > PROG_SEARCH_RADIUS_KM) continue;
       g.addLayer(buildProgCircle(lat, lng, color));
     }
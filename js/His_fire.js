@@ -1,33 +1,89 @@
 // historical fires visualization
 
 let currentYear = null;
-let allFeatures = {};  // Cache for each year's data
+let storeIndex = {};  // Cache for each year's store index
+let dayCache = {};    // "year:day" -> features
 let currentLayer = null;
+let requestToken = 0;
+
+// binary store built by Backend/his_fire_store.py: fixed uint16 records sorted by day,
+// so one day is one byte range of fire_<year>.bin (offsets in fire_<year>.json)
+const STORE_URL = 'https://storage.googleapis.com/wildfire-monitor-data/fire_data/store';
+// yearly GeoJSON export, used when a year has no store yet
+const LEGACY_URL = 'https://storage.googleapis.com/wildfire-monitor-data/fire_data';
 
 
 export async function loadHistoricalLayer(map, year) {
   currentYear = year;
 
-  if (!allFeatures[year]) {
-    const url = `https://storage.googleapis.com/wildfire-monitor-data/fire_data/fire_data_${year}.geojson.geojson`;
-    const res = await fetch(url);
-    const data = await res.json();
-    allFeatures[year] = data.features;
+  if (!storeIndex[year]) {
+    const res = await fetch(`${STORE_URL}/fire_${year}.json`);
+    if (res.ok) {
+      storeIndex[year] = await res.json();
+    } else {
+      console.warn(`No fire store index for ${year} (HTTP ${res.status}), loading the GeoJSON export`);
+      const legacy = await fetch(`${LEGACY_URL}/fire_data_${year}.geojson.geojson`);
+      if (!legacy.ok) return;
+      storeIndex[year] = { legacy: (await legacy.json()).features };
+    }
   }
 }
 
-// display historical wildfire data on special date
-export function updateFireLayer(map, day) {
-  if (!currentYear || !allFeatures[currentYear]) return;
-
-  const features = allFeatures[currentYear].filter(f => {
+// legacy GeoJSON year: filter the whole year's features by day of year
+function legacyDay(features, day) {
+  return features.filter(f => {
     const date = new Date(f.properties.timestamp);
-    // calculate date
     const dayOfYear = Math.floor(
       (date - new Date(date.getFullYear(), 0, 0)) / (1000 * 60 * 60 * 24)
     );
-    return dayOfYear === parseInt(day);
+    return dayOfYear === day;
+  });
+}
+
+// fetch and decode the records of one day (1-based day of year)
+async function fetchDay(year, day) {
+  const key = `${year}:${day}`;
+  if (dayCache[key]) return dayCache[key];
+  const idx = storeIndex[year];
+  if (idx.legacy) return (dayCache[key] = legacyDay(idx.legacy, day));
+  const size = idx.record.size;
+  const start = idx.days[day - 1], end = idx.days[day];
+  if (start === undefined || end === undefined || end <= start) return (dayCache[key] = []);
+
+  const res = await fetch(`${STORE_URL}/fire_${year}.bin`, {
+    headers: { Range: `bytes=${start * size}-${end * size - 1}` }
   });
+  if (!res.ok) return [];
+  let buf = await res.arrayBuffer();
+  // server ignored the Range header: cut the day out of the full file
+  if (res.status === 200) buf = buf.slice(start * size, end * size);
+
+  const [w, s, e, n] = idx.bbox;
+  const q = idx.qmax;
+  const rec = new Uint16Array(buf);  // x, y, minute, count (little-endian)
+  const date = dayOfYearToDate(year, day);
+  const ymd = `${year}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`;
+  const features = [];
+  for (let i = 0; i < rec.length; i += 4) {
+    const minute = rec[i + 2];
+    const hh = String(Math.floor(minute / 60)).padStart(2, '0');
+    const mm = String(minute % 60).padStart(2, '0');
+    features.push({
+      type: 'Feature',
+      geometry: { type: 'Point', coordinates: [w + rec[i] / q * (e - w), n - rec[i + 1] / q * (n - s)] },
+      properties: { timestamp: `${ymd} ${hh}:${mm}:00`, count: rec[i + 3] }
+    });
+  }
+  return (dayCache[key] = features);
+}
+
+// display historical wildfire data on special date
+export async function updateFireLayer(map, day) {
+  if (!currentYear || !storeIndex[currentYear]) return;
+
+  const token = ++requestToken;
+  const features = await fetchDay(currentYear, parseInt(day));
+  if (token !== requestToken) return;  // slider moved on while this day was loading
     // rendering if there's data
     if (features.length > 0) {
         if (currentLayer){
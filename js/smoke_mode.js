@@ -55,6 +55,10 @@ let smokeLayerGroup = null;
 let infoControl = null;
 let legendControl = null;
 let refreshTimer = null;
+let surfaceLayer = null;
+
+// interpolated PM2.5 / AQI-class overlay from Backend/pm25_surface.py
+const SURFACE_DIR = "./public/data/smoke";
 
 // ======== 渲染 ========
 function makeMarker(feature, latlng) {
@@ -103,6 +107,24 @@ function drawSmokeLayer(map, features) {
   ).addTo(map);
 }
 
+// one image instead of one marker per sensor; missing files just leave the points
+async function addSurface(map) {
+  try {
+    const res = await fetch(`${SURFACE_DIR}/pm25_latest.json?t=${Date.now()}`, { cache: "no-store" });
+    if (!res.ok) return;
+    const meta = await res.json();
+    const [w, s, e, n] = meta.bbox;
+    if (surfaceLayer) map.removeLayer(surfaceLayer);
+    surfaceLayer = L.imageOverlay(`${SURFACE_DIR}/pm25_latest.png?t=${Date.now()}`, [[s, w], [n, e]], {
+      opacity: 0.6,
+      interactive: false,
+    }).addTo(map);
+    surfaceLayer.bringToBack();
+  } catch (err) {
+    console.warn("PM2.5 surface unavailable:", err);
+  }
+}
+
 // ======== 控件（可选） ========
 function addLegend(map) {
   if (legendControl) map.removeControl(legendControl);
@@ -180,6 +202,7 @@ export async function initSmokeMode(map, {
  * 手动刷新（被 init 或按钮调用）
  */
 export async function refreshSmokeMode(map, opts = {}) {
+  await addSurface(map);
   const url = buildSensorsGeoJSONUrl(opts);
   const resp = await fetch(url, { cache: "no-store" });
   if (!resp.ok) {
@@ -201,6 +224,7 @@ export async function refreshSmokeMode(map, opts = {}) {
 export function removeSmokeMode(map) {
   if (refreshTimer) { clearInterval(refreshTimer); refreshTimer = null; }
   if (smokeLayerGroup) { map.removeLayer(smokeLayerGroup); smokeLayerGroup = null; }
+  if (surfaceLayer) { map.removeLayer(surfaceLayer); surfaceLayer = null; }
   if (infoControl) { map.removeControl(infoControl); infoControl = null; }
   if (legendControl) { map.removeControl(legendControl); legendControl = null; }
 }
@@ -2,6 +2,9 @@
 
 let windLayer = null;
 let windCtl = null;
+let windFactor = 1;        // pyramid level currently shown (1 = full resolution)
+let windFactors = null;    // levels listed in the manifest
+let onWindZoom = null;
 
 async function fetchVelocityJson() {
   // Add a timestamp to prevent caching
@@ -11,6 +14,74 @@ async function fetchVelocityJson() {
   return res.json();
 }
 
+// Decode the compact int16 grid (Backend/wind_format.py) into leaflet-velocity [u, v] objects
+function decodeWindBin(buf) {
+  const dv = new DataView(buf);
+  const magic = String.fromCharCode(dv.getUint8(0), dv.getUint8(1), dv.getUint8(2), dv.getUint8(3));
+  if (magic !== 'WND1') throw new Error('Bad wind grid magic');
+  const hlen = dv.getUint32(4, true);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buf, 8, hlen)));
+  const { meta, shape, scale, offset, nodata } = header;
+  const n = shape[0] * shape[1];
+  const q = new Int16Array(buf, header.data_offset, 2 * n);
+  const toData = (start) => {
+    const out = new Array(n);
+    for (let i = 0; i < n; i++) {
+      const x = q[start + i];
+      out[i] = x === nodata ? null : x * scale + offset;
+    }
+    return out;
+  };
+  const [west, south, east, north] = meta.bbox;
+  const base = {
+    nx: meta.nx, ny: meta.ny,
+    lo1: west, la1: north,  // upper-left
+    lo2: east, la2: south,  // lower-right
+    dx: meta.dx, dy: meta.dy,
+    refTime: meta.timestamp || ''
+  };
+  return [
+    { header: { ...base, parameterCategory: 2, parameterNumber: 2 }, data: toData(0) },
+    { header: { ...base, parameterCategory: 2, parameterNumber: 3 }, data: toData(n) }
+  ];
+}
+
+// Prefer the compact binary grid; fall back to the velocity JSON
+async function loadWindGrid() {
+  try {
+    const res = await fetch(`./Data/Wind/wind_ca_latest.bin?t=${Date.now()}`, { cache: "no-store" });
+    if (res.ok) return decodeWindBin(await res.arrayBuffer());
+  } catch (e) {
+    console.warn('wind .bin unavailable, using JSON', e);
+  }
+  return fetchVelocityJson();
+}
+
+// Pyramid levels (Backend/wind_pyramid.py): coarse grids for statewide zooms
+async function loadWindFactors() {
+  if (windFactors) return windFactors;
+  try {
+    const res = await fetch(`./Data/Wind/wind_ca_velocity_manifest.json?t=${Date.now()}`, { cache: "no-store" });
+    windFactors = res.ok ? (await res.json()).levels.map(l => l.factor) : [1];
+  } catch (_) {
+    windFactors = [1];
+  }
+  return windFactors;
+}
+
+async function factorForZoom(z) {
+  const want = z <= 5 ? 8 : z === 6 ? 4 : z === 7 ? 2 : 1;
+  const have = await loadWindFactors();
+  return Math.max(1, ...have.filter(f => f <= want));
+}
+
+async function loadWindLevel(factor) {
+  if (factor === 1) return loadWindGrid();
+  const res = await fetch(`./Data/Wind/wind_ca_velocity_x${factor}.json?t=${Date.now()}`, { cache: "no-store" });
+  if (!res.ok) return loadWindGrid();
+  return res.json();
+}
+
 //Use Leaflet Control to make a small toolbar that only appears in wind mode
 function makeControl(map) {
   // tool only shows in wind mode
@@ -27,7 +98,7 @@ function makeControl(map) {
 
       div.querySelector('#wind-refresh').onclick = async () => {
         try {
-          const data = await fetchVelocity();
+          const data = await loadWindLevel(windFactor);
           if (windLayer && typeof windLayer.setData === 'function') {
             windLayer.setData(data);
           } else if (windLayer) {
@@ -59,7 +130,8 @@ export async function enableWind(map) {
 
   if (windLayer) return windLayer;
 
-  const grid = await fetchVelocityJson();
+  windFactor = await factorForZoom(map.getZoom());
+  const grid = await loadWindLevel(windFactor);
 
   // adjust map view to the wind data bounds
   try {
@@ -77,6 +149,17 @@ export async function enableWind(map) {
     opacity: 0.9
   }).addTo(map);
 
+  // swap in a finer/coarser grid when the zoom crosses a pyramid level
+  onWindZoom = async () => {
+    const f = await factorForZoom(map.getZoom());
+    if (!windLayer || f === windFactor) return;
+    windFactor = f;
+    try {
+      windLayer.setData(await loadWindLevel(f));
+    } catch (e) { console.error(e); }
+  };
+  map.on('zoomend', onWindZoom);
+
   //only show the control when wind mode is enabled
   windCtl = makeControl(map);
   map.addControl(windCtl);
@@ -84,6 +167,8 @@ export async function enableWind(map) {
 
 export function disableWind(map) {
   if (!windLayer) return;
+  if (onWindZoom) map.off('zoomend', onWindZoom);
+  onWindZoom = null;
   map.removeLayer(windLayer);
   windLayer = null;
 }
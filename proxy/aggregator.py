@@ -0,0 +1,435 @@
+# proxy/aggregator.py (asyncio)
+"""
+PurpleAir aggregator, a Python/aiohttp drop-in for proxy/index.js.
+
+Same routes and response shapes:
+  GET /api/sensors           PurpleAir /v1/sensors, rows normalized to objects, optional bbox filter
+  GET /api/sensors/geojson   the same records as a FeatureCollection (alias /api/sensors-geojson,
+                             the path js/smoke_mode.js requests)
+  GET /healthz               {"ok": true}
+
+Differences from the Node proxy:
+  - the cache is a bounded LRU with a TTL (CACHE_MAX_ENTRIES) instead of an unbounded Map
+  - identical in-flight upstream requests are coalesced (single flight), so a burst of
+    misses costs one PurpleAir call
+  - an entry older than cache_ttl but within STALE_WHILE_REVALIDATE seconds is served
+    immediately while one background request refreshes it (X-Cache: STALE)
+  - /api/sensors/geojson converts in-process instead of calling /api/sensors over HTTP
+  - one pooled aiohttp session is shared by all upstream requests
+  - cache_ttl is not part of the cache key; it only decides how old a hit may be
+
+On 402/429 the last cached payload is returned with "stale": true, as before.
+
+Env (proxy/.env is read if present): PURPLEAIR_API_KEY, PORT (8787), DEFAULT_CACHE_TTL (600),
+ALLOWED_ORIGINS, CACHE_MAX_ENTRIES (256), STALE_WHILE_REVALIDATE (300), PURPLEAIR_BASE.
+
+Usage:
+  pip install -r proxy/requirements.txt
+  python proxy/aggregator.py [--port 8787]
+  python proxy/aggregator.py --fake-upstream     # local fake PurpleAir, no API key needed
+"""
+import os
+import sys
+import time
+import math
+import random
+import asyncio
+import logging
+import argparse
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from aiohttp import web, ClientSession, ClientTimeout, TCPConnector
+
+PROXY_DIR = os.path.dirname(os.path.abspath(__file__))
+PA_BASE = "https://api.purpleair.com/v1"
+DEFAULT_FIELDS = "latitude,longitude,pm2.5_atm,name,last_seen,humidity,temperature,pressure"
+STALE_ON = (402, 429)  # upstream statuses answered from the old cache
+
+log = logging.getLogger("aggregator")
+
+
+def load_dotenv(path=os.path.join(PROXY_DIR, ".env")):
+    # minimal KEY=VALUE reader, existing environment wins (like dotenv)
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            k, v = line.split("=", 1)
+            os.environ.setdefault(k.strip(), v.strip().strip("'\""))
+
+
+def env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+# %% cache
+class TTLCache:
+    """LRU of {key: (ts, data)}; entries are kept past their TTL so they can be served stale."""
+
+    def __init__(self, max_entries=256, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        """(data, age_s) or None."""
+        hit = self.entries.get(key)
+        if hit is None:
+            return None
+        self.entries.move_to_end(key)
+        return hit[1], self.clock() - hit[0]
+
+    def set(self, key, data):
+        self.entries[key] = (self.clock(), data)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def make_cache_key(path, query, drop=("cache_ttl",)):
+    items = sorted((k, v) for k, v in query.items() if k not in drop)
+    return f"{path}?{urlencode(items)}"
+
+
+# %% records
+def finite(v):
+    return isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v)
+
+
+def first(*values):
+    # JS `a ?? b ?? c`
+    for v in values:
+        if v is not None:
+            return v
+    return None
+
+
+def rec_latlon(rec):
+    sensor = rec.get("sensor") if isinstance(rec.get("sensor"), dict) else {}
+    return first(rec.get("latitude"), sensor.get("latitude")), first(rec.get("longitude"), sensor.get("longitude"))
+
+
+def in_bbox(rec, bbox):
+    w, s, e, n = bbox
+    lat, lon = rec_latlon(rec)
+    return finite(lat) and finite(lon) and w <= lon <= e and s <= lat <= n
+
+
+def normalize_records(payload):
+    """{fields:[], data:[[]]} -> [{...}]; otherwise data as is."""
+    fields = payload.get("fields") if isinstance(payload, dict) else None
+    rows = payload.get("data") if isinstance(payload, dict) else None
+    rows = rows if isinstance(rows, list) else []
+    if isinstance(fields, list) and rows and isinstance(rows[0], list):
+        return [dict(zip(fields, row)) for row in rows]
+    return rows
+
+
+def record_to_feature(rec):
+    lat, lon = rec_latlon(rec)
+    if not (finite(lat) and finite(lon)):
+        return None
+    sensor = rec.get("sensor") if isinstance(rec.get("sensor"), dict) else {}
+    props = {
+        "id": first(rec.get("sensor_index"), rec.get("id"), sensor.get("id")),
+        "name": first(rec.get("name"), sensor.get("name")),
+        "pm2_5": first(rec.get("pm2.5_atm"), rec.get("pm2_5_atm"), rec.get("pm2_5")),
+        "humidity": rec.get("humidity"),
+        "temperature": rec.get("temperature"),
+        "pressure": rec.get("pressure"),
+        "last_seen": rec.get("last_seen"),
+        "raw": rec,
+    }
+    if props["id"] is None:
+        del props["id"]  # JSON.stringify drops undefined
+    return {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": props}
+
+
+def to_feature_collection(payload):
+    features = [f for f in map(record_to_feature, normalize_records(payload)) if f]
+    body = {"type": "FeatureCollection", "features": features}
+    if payload.get("stale"):
+        body["stale"] = True
+    return body
+
+
+def upstream_params(query):
+    """PurpleAir query from the client query; only legal values are passed through to avoid 400."""
+    params = [("fields", query.get("fields") or DEFAULT_FIELDS)]
+    lt = query.get("location_type")
+    if lt in ("0", "1", "both"):
+        params.append(("location_type", lt))
+    for k in ("n", "max_age"):
+        if query.get(k, "").isdigit():
+            params.append((k, query[k]))
+    if query.get("types"):
+        params.append(("types", query["types"]))
+    skip = {"bbox", "cache_ttl", "fields", "location_type", "n", "max_age", "types"}
+    params += [(k, v) for k, v in query.items() if k not in skip and v != ""]
+    return params
+
+
+def parse_bbox(raw):
+    try:
+        parts = [float(p) for p in (raw or "").split(",")]
+    except ValueError:
+        return None
+    return parts if len(parts) == 4 and all(map(math.isfinite, parts)) else None
+
+
+# %% aggregator
+class UpstreamError(Exception):
+    def __init__(self, status, text):
+        super().__init__(f"PurpleAir {status}")
+        self.status = status
+        self.text = text
+
+
+class Aggregator:
+    def __init__(self, session, base=PA_BASE, default_ttl=600, swr_s=300, max_entries=256):
+        self.session = session
+        self.base = base
+        self.default_ttl = default_ttl
+        self.swr_s = swr_s
+        self.cache = TTLCache(max_entries)
+        self.inflight = {}        # key -> Task
+        self.upstream_calls = 0
+
+    def ttl(self, query):
+        try:
+            return max(0, int(query.get("cache_ttl", self.default_ttl)))
+        except ValueError:
+            return self.default_ttl
+
+    async def fetch(self, query):
+        """One upstream call -> the /api/sensors payload (rows normalized, bbox applied)."""
+        self.upstream_calls += 1
+        async with self.session.get(f"{self.base}/sensors", params=upstream_params(query)) as resp:
+            if resp.status >= 400:
+                raise UpstreamError(resp.status, await resp.text())
+            payload = await resp.json(content_type=None)
+        rows = normalize_records(payload)
+        final = {**payload, "data": rows}
+        bbox = parse_bbox(query.get("bbox"))
+        if bbox:
+            final["data"] = [r for r in rows if in_bbox(r, bbox)]
+            final["count"] = len(final["data"])
+        return final
+
+    def single_flight(self, key, query, store):
+        """Shared task for `key`; the first caller starts it, the rest await the same result."""
+        task = self.inflight.get(key)
+        if task is None:
+            async def run():
+                try:
+                    data = await self.fetch(query)
+                    if store:
+                        self.cache.set(key, data)
+                    return data
+                finally:
+                    self.inflight.pop(key, None)
+            task = self.inflight[key] = asyncio.ensure_future(run())
+            # always retrieve the result: every waiter may be gone (client disconnect, background refresh)
+            task.add_done_callback(lambda t: self._report(key, t))
+        return task
+
+    @staticmethod
+    def _report(key, task):
+        if task.cancelled():
+            return
+        e = task.exception()
+        if isinstance(e, UpstreamError):
+            log.warning("PurpleAir error %s for %s: %s", e.status, key, e.text[:200])
+        elif e is not None:
+            log.warning("upstream request %s failed: %r", key, e)
+
+    def revalidate(self, key, query):
+        if key not in self.inflight:
+            self.single_flight(key, query, True)
+
+    async def sensors(self, query):
+        """(payload, cache state) for a client query; state is HIT / STALE / MISS."""
+        key = make_cache_key("/api/sensors", query)
+        ttl = self.ttl(query)
+        hit = self.cache.get(key) if ttl > 0 else None
+        if hit:
+            data, age = hit
+            if age <= ttl:
+                return data, "HIT"
+            if age <= ttl + self.swr_s:
+                self.revalidate(key, query)
+                return data, "STALE"
+        try:
+            # shield: a client disconnect must not cancel the fetch other waiters share
+            return await asyncio.shield(self.single_flight(key, query, ttl > 0)), "MISS"
+        except UpstreamError as e:
+            old = self.cache.get(key)
+            if e.status in STALE_ON and old:
+                return {**old[0], "stale": True}, "STALE"
+            raise
+
+
+# %% http
+AGGREGATOR = web.AppKey("aggregator", Aggregator)
+FAKE_CALLS = web.AppKey("fake_calls", dict)  # {"n": upstream requests served}
+
+
+def cors_middleware(allowed):
+    @web.middleware
+    async def cors(request, handler):
+        origin = request.headers.get("Origin")
+        # no Origin (curl, local script) or empty whitelist -> allow (development-friendly)
+        if origin and allowed and origin not in allowed:
+            return web.json_response({"error": "Not allowed by CORS"}, status=403)
+        if request.method == "OPTIONS":
+            resp = web.Response(status=204, headers={"Access-Control-Allow-Methods": "GET,HEAD,OPTIONS"})
+        else:
+            resp = await handler(request)
+        resp.headers["Access-Control-Allow-Origin"] = origin or "*"
+        if origin:
+            resp.headers["Vary"] = "Origin"
+        return resp
+    return cors
+
+
+async def handle_sensors(request):
+    agg = request.app[AGGREGATOR]
+    try:
+        data, state = await agg.sensors(request.query)
+    except UpstreamError as e:
+        return web.json_response({"error": "PurpleAir error", "detail": e.text}, status=e.status)
+    except Exception as e:
+        log.exception("proxy error on %s", request.path_qs)
+        return web.json_response({"error": "Proxy error", "detail": str(e)}, status=500)
+    return web.json_response(data, headers={"X-Cache": state})
+
+
+async def handle_geojson(request):
+    agg = request.app[AGGREGATOR]
+    try:
+        data, state = await agg.sensors(request.query)
+    except UpstreamError as e:
+        return web.json_response({"error": "Upstream /api/sensors error", "detail": e.text}, status=e.status)
+    except Exception as e:
+        log.exception("proxy error on %s", request.path_qs)
+        return web.json_response({"error": "Proxy error", "detail": str(e)}, status=500)
+    return web.json_response(to_feature_collection(data), headers={"X-Cache": state})
+
+
+async def handle_health(_request):
+    return web.json_response({"ok": True})
+
+
+def make_app(api_key, base=PA_BASE, default_ttl=600, swr_s=300, max_entries=256, allowed_origins=()):
+    app = web.Application(middlewares=[cors_middleware(set(allowed_origins))])
+
+    async def client(app):
+        session = ClientSession(
+            connector=TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=60),
+            timeout=ClientTimeout(total=20),
+            headers={"X-API-Key": api_key},
+        )
+        app[AGGREGATOR] = Aggregator(session, base, default_ttl, swr_s, max_entries)
+        yield
+        for task in list(app[AGGREGATOR].inflight.values()):
+            task.cancel()
+        await session.close()
+
+    app.cleanup_ctx.append(client)
+    app.router.add_get("/api/sensors", handle_sensors)
+    app.router.add_get("/api/sensors/geojson", handle_geojson)
+    app.router.add_get("/api/sensors-geojson", handle_geojson)
+    app.router.add_get("/healthz", handle_health)
+    return app
+
+
+# %% fake upstream
+def fake_upstream_app(n_sensors=200, delay_s=0.2, seed=0):
+    """Local stand-in for PurpleAir /v1/sensors: random California sensors in fields/data form."""
+    rng = random.Random(seed)
+    sensors = [(i, f"sensor-{i}", round(rng.uniform(32.5, 42.0), 5), round(rng.uniform(-124.4, -114.2), 5))
+               for i in range(n_sensors)]
+    app = web.Application()
+    calls = app[FAKE_CALLS] = {"n": 0}  # mutated in place, so no app-state writes after startup
+
+    async def handle(request):
+        calls["n"] += 1
+        if not request.headers.get("X-API-Key"):
+            return web.json_response({"error": "ApiKeyMissingError"}, status=403)
+        await asyncio.sleep(delay_s)
+        fields = ["sensor_index"] + request.query.get("fields", DEFAULT_FIELDS).split(",")
+        now = int(time.time())
+        values = {"pm2.5_atm": lambda: round(rng.uniform(0, 150), 1), "humidity": lambda: rng.randint(10, 90),
+                  "temperature": lambda: rng.randint(50, 100), "pressure": lambda: round(rng.uniform(990, 1020), 1),
+                  "last_seen": lambda: now - rng.randint(0, 3600)}
+        rows = []
+        for idx, name, lat, lon in sensors[:int(request.query.get("n", n_sensors))]:
+            known = {"sensor_index": idx, "name": name, "latitude": lat, "longitude": lon}
+            rows.append([known[f] if f in known else values.get(f, lambda: None)() for f in fields])
+        return web.json_response({"api_version": "fake", "time_stamp": now, "fields": fields, "data": rows})
+
+    app.router.add_get("/v1/sensors", handle)
+    return app
+
+
+async def serve(app, port):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1" if port == 0 else "0.0.0.0", port)
+    await site.start()
+    return runner, runner.addresses[0][1]
+
+
+# %%
+async def amain(args):
+    base = os.environ.get("PURPLEAIR_BASE", PA_BASE)
+    api_key = os.environ.get("PURPLEAIR_API_KEY")
+    fake = None
+    if args.fake_upstream:
+        fake, fake_port = await serve(fake_upstream_app(), 0)
+        base, api_key = f"http://127.0.0.1:{fake_port}/v1", api_key or "fake"
+        log.info("fake PurpleAir upstream on %s", base)
+    if not api_key:
+        log.error("Missing PURPLEAIR_API_KEY in .env")
+        sys.exit(1)
+
+    allowed = [s.strip() for s in os.environ.get("ALLOWED_ORIGINS", "").split(",") if s.strip()]
+    app = make_app(api_key, base, default_ttl=env_int("DEFAULT_CACHE_TTL", 600),
+                   swr_s=env_int("STALE_WHILE_REVALIDATE", 300),
+                   max_entries=env_int("CACHE_MAX_ENTRIES", 256), allowed_origins=allowed)
+    runner, port = await serve(app, args.port)
+    log.info("PurpleAir aggregator running on http://localhost:%s", port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        if fake:
+            await fake.cleanup()
+
+
+def main(argv=None):
+    load_dotenv()
+    ap = argparse.ArgumentParser(description="Async PurpleAir aggregator (same routes as proxy/index.js)")
+    ap.add_argument("--port", type=int, default=env_int("PORT", 8787))
+    ap.add_argument("--fake-upstream", action="store_true", help="serve a local fake PurpleAir instead")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")  # + aiohttp access log, like morgan
+    try:
+        asyncio.run(amain(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
+# %%